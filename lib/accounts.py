@@ -0,0 +1,80 @@
+"""
+多账号配置（xk_daemon.py）。
+
+config/accounts.conf（JSON）列出各账号，每个账号可覆盖 xk.conf 中的共享字段：
+
+{
+    "accounts": [
+        {"USER": "学号1", "PWD": "密码1", "COURSE_CONF": "accounts/学号1.course.conf"},
+        {"USER": "学号2", "PWD": "密码2", "COURSE_CONF": "accounts/学号2.course.conf",
+         "PROXY": "socks5://127.0.0.1:1081"}
+    ]
+}
+
+  - COURSE_CONF 为该账号的课程文件（格式同 course.conf），相对路径以 config/ 为基准
+  - 未填写的字段（PROXY、MAX_RETRIES、SCT_KEY、CAPTCHA 等）沿用 xk.conf
+  - 每个账号的登录缓存与登录锁放在 config/sessions/<学号>.*，互不干扰
+"""
+
+import os
+from typing import Any, Dict, List
+
+from lib.common import (
+    ACCOUNTS_CONF_FILE,
+    CONF_DIR,
+    SESSIONS_DIR,
+    XK_CONF_FILE,
+    build_proxies,
+    load_json,
+)
+
+
+class Account:
+    """单个账号的配置与文件路径。"""
+
+    def __init__(self, conf: Dict[str, Any]):
+        self.conf = conf
+        self.user = str(conf.get("USER") or "").strip()
+        if not self.user:
+            raise ValueError(f"accounts.conf 中有账号缺少 USER: {conf}")
+        if not (conf.get("PWD") or conf.get("PWD_ENCRYPT")):
+            raise ValueError(f"账号 {self.user} 缺少 PWD / PWD_ENCRYPT")
+
+        course_conf = str(conf.get("COURSE_CONF") or "").strip()
+        if not course_conf:
+            raise ValueError(f"账号 {self.user} 缺少 COURSE_CONF")
+        self.course_conf = course_conf if os.path.isabs(course_conf) else os.path.join(CONF_DIR, course_conf)
+
+        self.session_cache = os.path.join(SESSIONS_DIR, f"{self.user}.session_cache.json")
+        self.lock_file = os.path.join(SESSIONS_DIR, f"{self.user}.login.lock")
+
+        self.proxy_url = (conf.get("PROXY") or "").strip() or None
+        self.proxies = build_proxies(self.proxy_url)
+
+    def __repr__(self):
+        return f"Account({self.user})"
+
+
+def load_accounts(path: str | None = None) -> List[Account]:
+    """读取 accounts.conf，合并 xk.conf 的共享字段，返回账号列表。"""
+    raw = load_json(path or ACCOUNTS_CONF_FILE)
+    items = raw.get("accounts") if isinstance(raw, dict) else None
+    if not isinstance(items, list) or not items:
+        raise ValueError("accounts.conf 必须是 JSON 对象，包含非空的 accounts 数组")
+
+    shared: Dict[str, Any] = {}
+    if os.path.exists(XK_CONF_FILE):
+        shared = load_json(XK_CONF_FILE)
+        # 账号凭证不继承
+        for key in ("USER", "PWD", "PWD_ENCRYPT"):
+            shared.pop(key, None)
+
+    accounts = [Account({**shared, **item}) for item in items]
+    seen = set()
+    for acc in accounts:
+        if acc.user in seen:
+            raise ValueError(f"accounts.conf 中账号重复: {acc.user}")
+        seen.add(acc.user)
+
+    os.makedirs(SESSIONS_DIR, exist_ok=True)
+    return accounts
@@ -0,0 +1,358 @@
+"""
+asyncio 抢课引擎（xk_quick.py --engine async）。
+
+与线程池引擎的区别：
+  - 提交、结果轮询都是同一事件循环上的协程，不占线程；登录态由 SessionManager 后台维护
+  - 轮询在后台任务中进行，慢轮询不会拖住下一次提交
+  - 底层使用连接池化的 httpx.AsyncClient，可同时盯上百个教学班
+
+速率控制与线程引擎共用 AIMD 控制器（lib/rate_control.py）：每个响应后调整请求间隔与并发上限；
+每轮的提交名额同样由 StrideScheduler（lib/course_scheduler.py）按优先级分配；
+待抢课程读自 CourseStore（lib/course_store.py），抢到即删除并延迟写回 course.conf。
+依赖可选：没装 httpx 时只能使用线程引擎。
+"""
+
+import asyncio
+import http.cookiejar
+import random
+import time
+from typing import Any, Dict, Tuple
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+from lib.common import (
+    STUDENT_STATUS_URL,
+    WARMUP_URL,
+    encrypt_select_param,
+    is_qos_response,
+    is_session_expired,
+    prepare_select_params,
+)
+from lib.course_scheduler import StrideScheduler
+from lib.course_store import CourseStore
+from lib.event_log import emit
+from lib.metrics import set_rate_limiter
+from lib.rate_control import AimdController, AsyncAdaptiveRateLimiter
+from lib.result_poller import POLL_TIMEOUT, poll_delay
+from lib.session_manager import SessionManager
+from lib.serverchan import send_serverchan_notification
+
+TARGET_URL = "https://xk.nju.edu.cn/xsxkapp/sys/xsxkapp/elective/volunteer.do"
+
+Course = Tuple[str, str, str, str]
+
+
+class AsyncHttpPool:
+    """httpx.AsyncClient 的薄封装：固定连接数上限、不校验证书、不留存服务端 Cookie。"""
+
+    def __init__(self, pool_size: int, proxies: Dict[str, str] | None = None, timeout: float = 15):
+        if httpx is None:
+            raise RuntimeError("async 引擎需要 httpx：pip install httpx（SOCKS 代理另需 httpx[socks]）")
+        self.pool_size = max(1, int(pool_size))
+        self._proxy = (proxies or {}).get("https")
+        self._timeout = timeout
+        self._client = self._build_client()
+        self._inflight: Dict[Any, int] = {}   # 客户端 → 未完成的请求数
+        self._retired: set = set()            # 已被 reset() 换下、等请求结束再关闭的客户端
+
+    def _build_client(self):
+        client = httpx.AsyncClient(
+            verify=False,
+            trust_env=False,
+            proxy=self._proxy,
+            timeout=self._timeout,
+            limits=httpx.Limits(
+                max_connections=self.pool_size,
+                max_keepalive_connections=self.pool_size,
+            ),
+        )
+        # 凭证随请求显式传入，不在客户端中留存服务端下发的 Cookie
+        client.cookies.jar.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+        return client
+
+    async def post(self, url: str, *, cookies: Dict[str, str], headers: Dict[str, str],
+                   data: Dict[str, Any]):
+        headers = dict(headers)
+        headers["Cookie"] = "; ".join(f"{k}={v}" for k, v in cookies.items())
+        return await self._send("POST", url, headers=headers, data=data)
+
+    async def _send(self, method: str, url: str, **kwargs):
+        # 记下请求发在哪个客户端上，reset() 换下的客户端等最后一个请求结束才关闭
+        client = self._client
+        self._inflight[client] = self._inflight.get(client, 0) + 1
+        try:
+            return await client.request(method, url, **kwargs)
+        finally:
+            self._inflight[client] -= 1
+            if not self._inflight[client]:
+                del self._inflight[client]
+                if client in self._retired:
+                    self._retired.discard(client)
+                    await client.aclose()
+
+    async def warm_up(self, url: str = WARMUP_URL) -> int:
+        async def _touch():
+            try:
+                await self._send("HEAD", url, timeout=5)
+                return True
+            except Exception:
+                return False
+
+        results = await asyncio.gather(*(_touch() for _ in range(self.pool_size)))
+        return sum(results)
+
+    async def reset(self) -> None:
+        """换用新客户端；旧客户端上仍在进行的请求（如结果轮询）照常完成后再关闭。"""
+        old, self._client = self._client, self._build_client()
+        if self._inflight.get(old):
+            self._retired.add(old)
+        else:
+            await old.aclose()
+
+    async def aclose(self) -> None:
+        for client in [self._client, *self._retired]:
+            await client.aclose()
+        self._retired.clear()
+
+
+class AsyncGrabEngine:
+    """单事件循环驱动的并发抢课引擎。"""
+
+    def __init__(
+        self,
+        *,
+        student_code: str,
+        store: CourseStore,
+        proxies: Dict[str, str] | None,
+        sessions: SessionManager,
+        rate: AimdController,
+        scheduler: StrideScheduler,
+        round_delay: Tuple[float, float],
+        qos_backoff_base: float,
+        qos_backoff_max: float,
+    ):
+        self.student_code = student_code
+        self.store = store
+        self.proxies = proxies
+        self.sessions = sessions
+        self.rate = rate
+        self.scheduler = scheduler
+        self.round_delay = round_delay
+        self.qos_backoff_base = qos_backoff_base
+        self.qos_backoff_max = qos_backoff_max
+
+        self._pool_gen = 0     # 连接池最近一次为哪一代凭证重建过
+        self._polling: Dict[str, asyncio.Task] = {}
+
+    # ---------- Session ----------
+
+    async def _reload_session(self, seen_gen: int) -> None:
+        # 凭证由 SessionManager 后台刷新；这里只负责通知并等待，然后重建连接
+        async with self._reload_lock:
+            creds = self.sessions.get()
+            if creds.generation == seen_gen:
+                print("    ⚠️ 检测到会话过期，等待后台刷新登录态...")
+                self.sessions.report_expired(seen_gen)
+                if not await asyncio.to_thread(self.sessions.wait_newer, seen_gen):
+                    print("    ❌ 等待新凭证超时")
+                    return
+                creds = self.sessions.get()
+            if self._pool_gen >= creds.generation:
+                return  # 其他协程已经处理过
+            self._pool_gen = creds.generation
+            await self.http.reset()
+            await self.http.warm_up()
+            print(f"    >>> 凭证已刷新，Token: {str(creds.token)[:10]}...")
+
+    # ---------- 提交 ----------
+
+    async def _submit(self, course: Course, state: Dict[str, bool]) -> None:
+        cid = course[0]
+        # 全局闸门：并发与请求间隔由 AIMD 控制器决定，响应一到就反馈
+        token = await self._limiter.acquire()
+        creds = self.sessions.get()
+        cookies, headers, gen = creds.cookies, creds.headers, creds.generation
+        sent = time.time()
+        try:
+            r = await self.http.post(
+                TARGET_URL,
+                cookies=cookies,
+                headers=headers,
+                data={
+                    "addParam": encrypt_select_param(
+                        self.student_code, self.store.elective_batch_code, course),
+                    "studentCode": self.student_code,
+                },
+            )
+        except Exception as e:
+            await self._limiter.release(token, False, time.time() - sent)
+            print(f"    [网络错误] {cid}: {e}")
+            state["qos"] = True
+            self._emit_submit(cid, sent, None, gen, "error", msg=str(e))
+            return
+
+        try:
+            res_json = r.json()
+        except Exception:
+            res_json = None
+        await self._limiter.release(token, not is_qos_response(res_json), time.time() - sent)
+
+        if res_json is None:
+            print(f"    [非JSON响应] {cid}: {r.text[:200]}...")
+            state["qos"] = True
+            self._emit_submit(cid, sent, r.status_code, gen, "nonjson")
+            return
+
+        code = str(res_json.get("code", ""))
+        msg = str(res_json.get("msg", ""))
+
+        if is_session_expired(res_json):
+            print(f"    [会话过期] {cid}: 检测到 loginURL/302")
+            state["expired"] = True
+            state["seen_gen"] = gen
+            outcome = "expired"
+        elif code == "1":
+            # 入队成功：结果在后台轮询，不阻塞后续提交
+            print(f"    ⏳ [{cid}] 请求已提交，后台轮询处理结果...")
+            # 同一轮多次入队（优先级高的课）共用一个轮询任务
+            if cid not in self._polling:
+                task = asyncio.create_task(self._poll(course))
+                self._polling[cid] = task
+                task.add_done_callback(lambda _t, _cid=cid: self._polling.pop(_cid, None))
+            outcome = "queued"
+        elif "NullPointer" in msg:
+            print(f"    [服务器繁忙/QoS] {cid} (NPE)")
+            state["qos"] = True
+            outcome = "qos"
+        else:
+            print(f"    >>> [{cid}] 返回: {res_json}")
+            outcome = "rejected"
+        self._emit_submit(cid, sent, r.status_code, gen, outcome, code=code, msg=msg)
+        self.scheduler.on_submit(cid, outcome, msg)
+
+    def _emit_submit(self, cid: str, sent: float, status: int | None, gen: int, outcome: str,
+                     code: str | None = None, msg: str | None = None) -> None:
+        recv = time.time()
+        emit("submit", user=self.student_code, course=cid, sent=sent, recv=recv,
+             latency_ms=round((recv - sent) * 1000, 1), status=status, code=code, msg=msg,
+             outcome=outcome, generation=gen, engine="async")
+
+    # ---------- 结果轮询 ----------
+
+    async def _poll(self, course: Course) -> None:
+        cid = course[0]
+        data = {"studentCode": self.student_code, "teachingClassId": cid, "type": "1"}
+        created = time.monotonic()
+        deadline = created + POLL_TIMEOUT
+        attempt = 0
+        while True:
+            # 与 ResultPoller 相同的自适应间隔：先短后长
+            await asyncio.sleep(poll_delay(attempt))
+            # 每次都取当前凭证，会话刷新后的轮询不再带着提交时的旧 Cookie
+            creds = self.sessions.get()
+            try:
+                r = await self.http.post(STUDENT_STATUS_URL, cookies=creds.cookies,
+                                         headers=creds.headers, data=data)
+                res = r.json()
+            except Exception as e:
+                result = {"code": "error", "msg": str(e)}
+                attempt += 1
+                break
+            code = str(res.get("code", ""))
+            attempt += 1
+            if is_session_expired(res) and time.monotonic() < deadline:
+                # 登录态失效：通知后台刷新，下次带新凭证接着查
+                self.sessions.report_expired(creds.generation)
+                continue
+            if code != "0":
+                result = {"code": code, "msg": res.get("msg", "")}
+                break
+            if time.monotonic() >= deadline:
+                result = {"code": "timeout", "msg": f"轮询 {attempt} 次仍未完成"}
+                break
+
+        poll_code, poll_msg = result["code"], result["msg"]
+        emit("poll", user=self.student_code, course=cid, code=poll_code, msg=poll_msg,
+             attempts=attempt,
+             elapsed_ms=round((time.monotonic() - created) * 1000, 1))
+        self.scheduler.on_poll(cid, poll_code, poll_msg)
+        if poll_code == "1":
+            now_str = time.strftime("%H:%M:%S")
+            print(f"    🎉 [抢到了!] {cid} @ {now_str}")
+            if poll_msg:
+                print(f"       服务器消息: {poll_msg}")
+            if await asyncio.to_thread(self.store.remove, course):
+                print("    >>> 已从 course.conf 删除该课程")
+            class_id, kind, ctype, remark = course
+            desp = (f"teachingClassId: {class_id}\ncourseKind: {kind}\n"
+                    f"teachingClassType: {ctype}\ntime: {now_str}")
+            if remark:
+                desp += f"\n备注: {remark}"
+            await asyncio.to_thread(send_serverchan_notification, f"选课成功: {cid}", desp)
+        elif poll_code == "-1":
+            print(f"    ❌ [选课失败] {cid}: {poll_msg}")
+        elif poll_code == "timeout":
+            print(f"    ⚠️ [轮询超时] {cid}: {poll_msg}")
+        else:
+            print(f"    ⚠️ [轮询未知状态] {cid}: code={poll_code}, msg={poll_msg}")
+
+    # ---------- 主循环 ----------
+
+    async def run(self) -> None:
+        # asyncio 原语须在事件循环内创建
+        self._limiter = AsyncAdaptiveRateLimiter(self.rate)
+        set_rate_limiter(self._limiter)
+        self._reload_lock = asyncio.Lock()
+        # 提交并发 + 后台轮询共用连接池
+        self.http = AsyncHttpPool(self.rate.max_workers * 2, self.proxies)
+
+        try:
+            self._pool_gen = self.sessions.get().generation
+            warmed = await self.http.warm_up()
+            print(f">>> [async] 连接池预热: {warmed}/{self.http.pool_size} 条连接")
+            await self._loop()
+            if self._polling:
+                await asyncio.gather(*list(self._polling.values()), return_exceptions=True)
+        finally:
+            await self.http.aclose()
+
+    async def _loop(self) -> None:
+        round_no = 0
+        qos_hit_count = 0
+
+        while self.store:
+            if self.store.refresh():
+                prepare_select_params(self.student_code, self.store.elective_batch_code, self.store.courses)
+                self.scheduler.set_priorities(self.store.priorities)
+            round_no += 1
+            # 结果仍在轮询中的课程本轮不重复提交；名额数不变，按优先级分配
+            targets = [c for c in self.store.courses if c[0] not in self._polling]
+            plan = self.scheduler.plan(targets, len(targets))
+            print(f"\n===== 第 {round_no} 轮 ({len(targets)} 门待提交, "
+                  f"{len(self._polling)} 门轮询中) =====")
+
+            state: Dict[str, Any] = {"qos": False, "expired": False}
+            await asyncio.gather(*(self._submit(c, state) for c in plan))
+
+            if state["expired"]:
+                await self._reload_session(state["seen_gen"])
+                await asyncio.sleep(random.uniform(0.5, 1.5))
+                continue
+
+            # 自适应模式下 QoS 已在请求级别减速，只在固定限速时整轮退避
+            round_backoff = state["qos"] and not self.rate.adaptive
+            if round_backoff:
+                qos_hit_count += 1
+                backoff = min(self.qos_backoff_base * (2 ** (qos_hit_count - 1)), self.qos_backoff_max)
+                delay = backoff + random.uniform(0, backoff * 0.3)
+                print(f"    ⚠️ 检测到 QoS/繁忙，退避 {delay:.1f}s (第 {qos_hit_count} 次)")
+            else:
+                qos_hit_count = max(0, qos_hit_count - 1)
+                delay = random.uniform(*self.round_delay)
+            emit("backoff", user=self.student_code, reason="qos" if round_backoff else "round",
+                 delay=round(delay, 3), hits=qos_hit_count)
+
+            await asyncio.sleep(delay)
@@ -5,18 +5,22 @@
   - authenticator.py: 执行登录流程
   - session_manager.py: 管理登录态生命周期（缓存/验证/刷新）
 
-对外接口: perform_login(conf_path=None) -> (cookies_dict, token) or (None, None)
+对外接口: perform_login(conf=None) -> (cookies_dict, token) or (None, None)
 """
 
 import json
+import math
 import os
+import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 import requests
 
-from lib.captcha import solve_captcha_from_base64
+from lib.captcha import preload_solver, solve_captcha_with_confidence
 from lib.common import CONF_DIR, load_xk_config, build_proxies
 from lib.des_encrypt import encrypt_password
+from lib.event_log import emit
 from lib.serverchan import send_serverchan_notification
 
 BASE_URL = "https://xk.nju.edu.cn/xsxkapp/sys/xsxkapp"
@@ -25,32 +29,34 @@ VCODE_API = f"{BASE_URL}/student/4/vcode.do"
 LOGIN_API = f"{BASE_URL}/student/check/login.do"
 
 
-def perform_login() -> tuple:
-    """执行完整登录流程。
+# 默认的并行登录流水线数与单次尝试期限(秒，仅并行时生效)，可在 xk.conf 中用 LOGIN_PARALLEL / LOGIN_ATTEMPT_TIMEOUT 覆盖
+LOGIN_PARALLEL = 1
+LOGIN_ATTEMPT_TIMEOUT = 20.0
 
-    从 config/xk.conf 读取账号密码等配置，完成登录后返回 (cookies_dict, token)。
-    失败返回 (None, None)。
-    """
-    conf = load_xk_config()
-    username = conf.get("USER")
-    max_retries = int(conf.get("MAX_RETRIES", 3))
+# 验证码置信度低于 CAPTCHA.MIN_CONFIDENCE 时不提交，直接换一张（不耗 login.do 往返）；
+# 阈值用 tools/bench_captcha.py --truth 在录制语料上标定，默认 0 不启用。
+# 同一次尝试里最多换图次数，超过后仍提交最后一张
+MAX_LOW_CONFIDENCE_REFETCH = 3
 
-    # 密码：优先明文实时加密，兼容旧的加密文本
-    raw_pwd = conf.get("PWD")
-    password = encrypt_password(raw_pwd) if raw_pwd else conf.get("PWD_ENCRYPT")
 
-    if not username or not password:
-        raise ValueError("配置文件中缺少 USER 或 PWD")
+class _Cancelled(Exception):
+    """其他流水线已登录成功，或本次尝试超过期限。"""
 
-    # 代理
-    proxy_url = (conf.get("PROXY") or "").strip() or None
-    proxies = build_proxies(proxy_url)
-    if proxies:
-        print(f">>> 启用代理: {proxy_url}")
-    else:
-        print(">>> 未配置代理，使用直连模式")
 
-    def _new_session():
+class _Pipeline:
+    """一条登录流水线：独立的 requests.Session 与验证码。"""
+
+    def __init__(self, idx: int, username: str, password: str, proxies, race: "_LoginRace",
+                 min_confidence: float = 0.0):
+        self.tag = f"[#{idx}] " if race.parallel > 1 else ""
+        self.username = username
+        self.password = password
+        self.proxies = proxies
+        self.min_confidence = min_confidence
+        self.race = race
+        self.session = self._new_session()
+
+    def _new_session(self):
         s = requests.Session()
         s.trust_env = False
         s.headers.update({
@@ -61,23 +67,32 @@ def perform_login() -> tuple:
             "Origin": "https://xk.nju.edu.cn",
             "X-Requested-With": "XMLHttpRequest"
         })
-        if proxies:
-            s.proxies = proxies
+        if self.proxies:
+            s.proxies = self.proxies
         return s
 
-    session = _new_session()
+    def _timeout(self, deadline: float, limit: float) -> float:
+        """单个请求的超时：不超过 limit，也不超过本次尝试剩余时间。"""
+        if self.race.won.is_set():
+            raise _Cancelled()
+        left = deadline - time.monotonic()
+        if left <= 0:
+            raise _Cancelled()
+        return min(limit, left)
 
-    for attempt in range(max_retries):
-        try:
-            print(f"\n====== 尝试第 {attempt + 1}/{max_retries} 次登录 ======")
+    def attempt(self, deadline: float) -> tuple | None:
+        """完整走一遍登录流程，成功返回 (cookies_dict, token)。"""
+        session, tag = self.session, self.tag
+        started = time.monotonic()
 
-            # Step 1: 初始化 Session
-            print(">>> 1. 初始化 Session...")
-            session.get(INDEX_URL, timeout=10)
+        # Step 1: 初始化 Session
+        print(f">>> {tag}1. 初始化 Session...")
+        session.get(INDEX_URL, timeout=self._timeout(deadline, 10))
 
+        for refetch in range(MAX_LOW_CONFIDENCE_REFETCH + 1):
             # Step 2: 获取验证码
-            print(">>> 2. 获取验证码...")
-            vcode_resp = session.post(VCODE_API, timeout=10)
+            print(f">>> {tag}2. 获取验证码...")
+            vcode_resp = session.post(VCODE_API, timeout=self._timeout(deadline, 10))
             vcode_json = vcode_resp.json()
 
             data_node = vcode_json.get("data", {})
@@ -85,62 +100,159 @@ def perform_login() -> tuple:
             img_b64_raw = data_node.get("vode") or data_node.get("vcode")
 
             if not server_uuid or not img_b64_raw:
-                print(f"❌ 响应数据不完整: {vcode_json}")
-                continue
+                print(f"❌ {tag}响应数据不完整: {vcode_json}")
+                return None
 
             img_gif_b64_body = img_b64_raw.split(",")[1] if "," in img_b64_raw else img_b64_raw
 
             # Step 3: 识别验证码
-            print(">>> 3. 识别验证码...")
-            points = solve_captcha_from_base64(img_gif_b64_body)
+            print(f">>> {tag}3. 识别验证码...")
+            t0 = time.perf_counter()
+            points, confidence = solve_captcha_with_confidence(img_gif_b64_body)
+            emit("captcha", user=self.username, solve_ms=round((time.perf_counter() - t0) * 1000, 2),
+                 confidence=confidence, refetch=refetch)
             if not points:
-                print("❌ 识别失败")
-                continue
+                print(f"❌ {tag}识别失败")
+                return None
+            if confidence >= self.min_confidence or refetch == MAX_LOW_CONFIDENCE_REFETCH:
+                break
+            print(f"    {tag}置信度 {confidence:.3f} < {self.min_confidence:.3f}，换一张验证码")
 
-            coord_str_list = [f"{int(p[0])}-{int(p[1] * 5 / 6)}" for p in points]
-            verify_code = ",".join(coord_str_list)
-            print(f"    提交坐标: {verify_code}")
-
-            # Step 4: 发送登录请求
-            payload = {
-                "loginName": username,
-                "loginPwd": password,
-                "verifyCode": verify_code,
-                "vtoken": "",
-                "uuid": server_uuid,
-            }
-
-            print(">>> 4. 发送登录请求...")
-            login_resp = session.post(LOGIN_API, data=payload, timeout=15)
+        coord_str_list = [f"{int(p[0])}-{int(p[1] * 5 / 6)}" for p in points]
+        verify_code = ",".join(coord_str_list)
+        print(f"    {tag}提交坐标: {verify_code}")
+
+        # Step 4: 发送登录请求
+        payload = {
+            "loginName": self.username,
+            "loginPwd": self.password,
+            "verifyCode": verify_code,
+            "vtoken": "",
+            "uuid": server_uuid,
+        }
+
+        # login.do 逐条串行：一旦有流水线拿到 token，其余不再提交，
+        # 避免同一账号再登录一次把胜出的会话顶掉
+        with self.race.submit_lock:
+            print(f">>> {tag}4. 发送登录请求...")
+            login_resp = session.post(LOGIN_API, data=payload, timeout=self._timeout(deadline, 15))
             login_json = login_resp.json()
 
             # Step 5: 结果校验
             resp_code = login_json.get("code")
             resp_data = login_json.get("data") or {}
 
-            if str(resp_code) == "1" and str(resp_data.get("number")) == str(username):
-                token = resp_data.get("token")
-                print(f"✅ 登录成功!")
-                return session.cookies.get_dict(), token
-            else:
-                msg = login_json.get("msg", "未知错误")
-                print(f"❌ 登录失败: {msg} (Code: {resp_code})")
+            ok = str(resp_code) == "1" and str(resp_data.get("number")) == str(self.username)
+            emit("login", user=self.username, result="ok" if ok else "fail", code=str(resp_code),
+                 duration_ms=round((time.monotonic() - started) * 1000, 1))
+            if ok:
+                self.race.won.set()
+                print(f"✅ {tag}登录成功!")
+                return session.cookies.get_dict(), resp_data.get("token")
 
-                # 服务端拒绝当前会话时重建 Session
-                if str(resp_code).startswith("#E"):
-                    print("⚠️  服务端拒绝当前会话，正在重建 Session...")
-                    session.close()
-                    session = _new_session()
+        msg = login_json.get("msg", "未知错误")
+        print(f"❌ {tag}登录失败: {msg} (Code: {resp_code})")
 
+        # 服务端拒绝当前会话时重建 Session
+        if str(resp_code).startswith("#E"):
+            print(f"⚠️  {tag}服务端拒绝当前会话，正在重建 Session...")
+            session.close()
+            self.session = self._new_session()
+        return None
+
+    def run(self, deadline: float) -> tuple | None:
+        try:
+            return self.attempt(deadline)
+        except _Cancelled:
+            if not self.race.won.is_set():
+                print(f"⚠️  {self.tag}本次尝试超时")
+                emit("login", user=self.username, result="timeout")
+            return None
         except Exception as e:
-            print(f"❌ 异常: {e}")
+            print(f"❌ {self.tag}异常: {e}")
+            emit("login", user=self.username, result="error", code=type(e).__name__)
             time.sleep(1)
+            return None
+
+
+class _LoginRace:
+    def __init__(self, parallel: int):
+        self.parallel = parallel
+        self.won = threading.Event()
+        self.submit_lock = threading.Lock()
+
 
-    send_serverchan_notification("❌ 登录失败", "🚫 登录失败，已达最大重试次数。")
+def perform_login(conf: dict | None = None) -> tuple:
+    """执行完整登录流程。
+
+    账号密码等配置取自 conf（多账号模式），默认读取 config/xk.conf。
+    LOGIN_PARALLEL > 1 时每轮同时跑多条独立的登录流水线（各自的 Session 与验证码），
+    第一个拿到 token 的胜出，其余取消；并行时每轮尝试不超过 LOGIN_ATTEMPT_TIMEOUT 秒。
+    完成登录后返回 (cookies_dict, token)，失败返回 (None, None)。
+    """
+    if conf is None:
+        conf = load_xk_config()
+    username = conf.get("USER")
+    max_retries = int(conf.get("MAX_RETRIES", 3))
+    parallel = max(1, int(conf.get("LOGIN_PARALLEL", LOGIN_PARALLEL)))
+    min_confidence = float((conf.get("CAPTCHA") or {}).get("MIN_CONFIDENCE", 0.0))
+    attempt_timeout = float(conf.get("LOGIN_ATTEMPT_TIMEOUT", LOGIN_ATTEMPT_TIMEOUT))
+
+    # 密码：优先明文实时加密，兼容旧的加密文本
+    raw_pwd = conf.get("PWD")
+    password = encrypt_password(raw_pwd) if raw_pwd else conf.get("PWD_ENCRYPT")
+
+    if not username or not password:
+        raise ValueError("配置文件中缺少 USER 或 PWD")
+
+    # 代理
+    proxy_url = (conf.get("PROXY") or "").strip() or None
+    proxies = build_proxies(proxy_url)
+    if proxies:
+        print(f">>> 启用代理: {proxy_url}")
+    else:
+        print(">>> 未配置代理，使用直连模式")
+
+    race = _LoginRace(parallel)
+    pipelines = [_Pipeline(i + 1, username, password, proxies, race, min_confidence)
+                 for i in range(parallel)]
+
+    # 验证码模型在后台加载预热，与下面的网络请求重叠
+    preload_solver()
+
+    executor = ThreadPoolExecutor(max_workers=parallel) if parallel > 1 else None
+    running = {}
+    try:
+        for attempt in range(max_retries):
+            suffix = f"（{parallel} 路并行）" if parallel > 1 else ""
+            print(f"\n====== 尝试第 {attempt + 1}/{max_retries} 次登录{suffix} ======")
+            # 期限只用于并行竞速；单路登录与原先一样只受各请求自身的超时限制
+            deadline = time.monotonic() + attempt_timeout if executor is not None else math.inf
+
+            if executor is None:
+                result = pipelines[0].run(deadline)
+                if result:
+                    return result
+                continue
+
+            # 上一轮超时仍卡在某一步的流水线不重复提交，它会在下一步检查时自行退出
+            for p in pipelines:
+                if p not in running:
+                    running[p] = executor.submit(p.run, deadline)
+            while running and (left := deadline - time.monotonic()) > 0:
+                done, _ = wait(running.values(), timeout=left, return_when=FIRST_COMPLETED)
+                for p in [p for p, f in running.items() if f in done]:
+                    result = running.pop(p).result()
+                    if result:
+                        return result
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    send_serverchan_notification("❌ 登录失败", f"🚫 {username} 登录失败，已达最大重试次数。", conf=conf)
     print("🚫 登录失败，已达最大重试次数。")
     return None, None
 
-
 if __name__ == "__main__":
     c, t = perform_login()
     if t:
@@ -1,14 +1,16 @@
 """
 Pure ONNX captcha solver (v2 — color-isolated models + Hungarian matching).
 
-Exports one function:
+Exports:
   solve_captcha_from_base64(img_gif_b64_body) -> [(x, y) * 4] or None
+  solve_captcha_with_confidence(img_gif_b64_body) -> ([(x, y) * 4] or None, confidence)
+  preload_solver(background=True)  — load + warm up models before first use
 
 Changes vs v1:
   - Color-isolated upper char cropping (preserves stroke color/texture)
   - ImageNet normalization (matches new pretrained-backbone models)
   - Corrected title crop positions (centers at 127/150/173/196, y=101-117)
-  - Hungarian matching (optimal, replaces brute-force permutations)
+  - Hungarian matching (Kuhn–Munkres, replaces brute-force permutations)
   - Cleaner segmentation with color-distance filtering
 """
 
@@ -17,8 +19,11 @@ from __future__ import annotations
 import base64
 import io
 import json
+import math
 import os
 import threading
+import time
+from functools import lru_cache
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 
@@ -47,6 +52,32 @@ _LOCK = threading.Lock()
 _SOLVER = None
 _INIT_ERROR = None
 
+# ONNX Runtime settings, overridable via the "CAPTCHA" object in config/xk.conf
+_ORT_DEFAULTS = {
+    "INTRA_OP_THREADS": 1,          # small CNNs run fastest single-threaded
+    "INTER_OP_THREADS": 1,
+    "EXECUTION_MODE": "sequential",  # sequential | parallel
+    "GRAPH_OPT_LEVEL": "all",        # disable | basic | extended | all
+    "OPTIMIZED_MODEL_DIR": "",       # cache dir for optimized graphs ("" = off)
+    "WARMUP": True,                  # run a dummy batch when the solver is built
+}
+
+_GRAPH_OPT_LEVELS = {
+    "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+_EXECUTION_MODES = {
+    "sequential": ort.ExecutionMode.ORT_SEQUENTIAL,
+    "parallel": ort.ExecutionMode.ORT_PARALLEL,
+}
+
+# Typical batch sizes seen by solve(): up to 8 upper crops, 4 title crops
+_WARMUP_UPPER_BATCH = 8
+_WARMUP_TITLE_BATCH = 4
+
 # ---------------------------------------------------------------------------
 # Normalization presets
 # ---------------------------------------------------------------------------
@@ -64,9 +95,10 @@ _NORM_PRESETS = {
 
 
 def _softmax(x: np.ndarray) -> np.ndarray:
-    x = x - np.max(x)
+    """Softmax over the last axis (works for [C] and [N, C])."""
+    x = x - np.max(x, axis=-1, keepdims=True)
     ex = np.exp(x)
-    return ex / max(float(ex.sum()), 1e-9)
+    return ex / np.maximum(ex.sum(axis=-1, keepdims=True), 1e-9)
 
 
 # ---------------------------------------------------------------------------
@@ -85,46 +117,97 @@ def _fg_mask(arr: np.ndarray, sat_thr: float = 0.15) -> np.ndarray:
     return (sat > sat_thr) & (~light_bg)
 
 
-def _connected_components(mask: np.ndarray, min_area: int = 25) -> List[dict]:
-    """Simple flood-fill connected components (no scipy dependency)."""
+def _mask_runs(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Run-length encode a bool mask row by row.
+
+    Returns (row, start, end) arrays of horizontal runs in raster order,
+    each run covering columns [start, end).
+    """
     h, w = mask.shape
-    visited = np.zeros((h, w), dtype=np.uint8)
-    regions = []
+    padded = np.zeros((h, w + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    edges = np.diff(padded, axis=1)
+    rows, starts = np.nonzero(edges == 1)
+    _, ends = np.nonzero(edges == -1)
+    return rows, starts, ends
+
+
+def _connected_components(mask: np.ndarray, min_area: int = 25) -> List[dict]:
+    """8-connected components via union-find over row runs (no scipy dependency).
+
+    Regions are ordered by area (descending), ties by raster order of their
+    first pixel — the same order a top-left-first flood fill produces.
+    """
+    rows, starts, ends = _mask_runs(mask)
+    n = len(rows)
+    if n == 0:
+        return []
+
+    # Runs in row y touch runs in row y-1 when their column spans overlap
+    # after widening by one pixel (diagonal neighbours). Runs are globally
+    # sorted by (row, column), so candidates form a contiguous index range.
+    stride = mask.shape[1] + 2
+    start_keys = rows * stride + starts
+    end_keys = rows * stride + ends
+    lo = np.searchsorted(end_keys, (rows - 1) * stride + starts, side="left")
+    hi = np.searchsorted(start_keys, (rows - 1) * stride + ends, side="right")
+    counts = np.maximum(hi - lo, 0)
+
+    parent = list(range(n))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    if counts.any():
+        a = np.repeat(np.arange(n), counts)
+        offsets = np.arange(len(a)) - np.repeat(np.cumsum(counts) - counts, counts)
+        b = np.repeat(lo, counts) + offsets
+        for i, j in zip(a.tolist(), b.tolist()):
+            ri, rj = find(i), find(j)
+            if ri != rj:
+                # Keep the earlier (raster-first) run as root
+                if ri < rj:
+                    parent[rj] = ri
+                else:
+                    parent[ri] = rj
+
+    labels = np.fromiter((find(i) for i in range(n)), dtype=np.int64, count=n)
+    lengths = ends - starts
+
+    area = np.bincount(labels, weights=lengths, minlength=n)
+    # Sum of columns over a run [s, e) is (s + e - 1) * len / 2 (always integral)
+    sum_x = np.bincount(labels, weights=(starts + ends - 1) * lengths // 2, minlength=n)
+    sum_y = np.bincount(labels, weights=rows * lengths, minlength=n)
+    min_x = np.full(n, np.iinfo(np.int64).max)
+    max_x = np.full(n, -1)
+    max_y = np.full(n, -1)
+    np.minimum.at(min_x, labels, starts)
+    np.maximum.at(max_x, labels, ends - 1)
+    np.maximum.at(max_y, labels, rows)
 
-    for y in range(h):
-        for x in range(w):
-            if not mask[y, x] or visited[y, x]:
-                continue
-            stack = [(x, y)]
-            visited[y, x] = 1
-            pixels = []
-
-            while stack:
-                cx, cy = stack.pop()
-                pixels.append((cx, cy))
-                for ny in range(max(0, cy - 1), min(h, cy + 2)):
-                    for nx in range(max(0, cx - 1), min(w, cx + 2)):
-                        if not visited[ny, nx] and mask[ny, nx]:
-                            visited[ny, nx] = 1
-                            stack.append((nx, ny))
-
-            if len(pixels) < min_area:
-                continue
-
-            xs = [p[0] for p in pixels]
-            ys = [p[1] for p in pixels]
-            bw = max(xs) - min(xs) + 1
-            bh = max(ys) - min(ys) + 1
-            if bw < 6 or bh < 6:
-                continue
-            if bw / max(bh, 1) > 5 or bh / max(bw, 1) > 5:
-                continue
-
-            regions.append({
-                "center": (int(np.mean(xs)), int(np.mean(ys))),
-                "bbox": (min(xs), min(ys), max(xs) + 1, max(ys) + 1),
-                "area": len(pixels),
-            })
+    regions = []
+    for root in np.unique(labels).tolist():  # roots are raster-first runs, so ascending = raster order
+        pixels = int(area[root])
+        if pixels < min_area:
+            continue
+
+        x1, x2 = int(min_x[root]), int(max_x[root])
+        y1, y2 = int(rows[root]), int(max_y[root])
+        bw = x2 - x1 + 1
+        bh = y2 - y1 + 1
+        if bw < 6 or bh < 6:
+            continue
+        if bw / max(bh, 1) > 5 or bh / max(bw, 1) > 5:
+            continue
+
+        regions.append({
+            "center": (int(sum_x[root]) // pixels, int(sum_y[root]) // pixels),
+            "bbox": (x1, y1, x2 + 1, y2 + 1),
+            "area": pixels,
+        })
 
     regions.sort(key=lambda r: -r["area"])
     return regions
@@ -193,144 +276,351 @@ def _segment_upper(img: Image.Image) -> List[dict]:
     return regions[:8] if regions else []
 
 
-def _crop_upper_char_color_isolated(
+def _crop_upper_chars_color_isolated(
     arr: np.ndarray,
-    cx: int, cy: int,
+    centers: List[Point],
     search_half: int = 40,
     color_thresh: float = 80.0,
     pad: int = 4,
-) -> Image.Image:
+) -> List[np.ndarray]:
     """
-    Crop a single upper character using color isolation.
-    Keeps only pixels whose color is similar to the center pixel's color.
+    Crop every upper character using color isolation.
+    For each center, keeps only pixels whose color is similar to the center
+    pixel's color. Masks and the float image are computed once per captcha.
+    Returns square uint8 [side, side, 3] crops on a 220-gray background.
     """
     H, W = min(UPPER_HEIGHT, arr.shape[0]), arr.shape[1]
-    arr_f = arr[:H].astype(np.float32)
+    upper = arr[:H]
+    arr_f = upper.astype(np.float32)
+    fg_strict = _fg_mask(upper)
+    fg_relaxed = None  # only computed if some center needs the fallback
 
-    fg = _fg_mask(arr[:H])
+    crops = []
+    for cx, cy in centers:
+        # Sample dominant color from center
+        sr = 4
+        sy1, sy2 = max(0, cy - sr), min(H, cy + sr)
+        sx1, sx2 = max(0, cx - sr), min(W, cx + sr)
+        fg = fg_strict
+        center_fg = fg[sy1:sy2, sx1:sx2]
 
-    # Sample dominant color from center
-    sr = 4
-    sy1, sy2 = max(0, cy - sr), min(H, cy + sr)
-    sx1, sx2 = max(0, cx - sr), min(W, cx + sr)
-    center_fg = fg[sy1:sy2, sx1:sx2]
+        if center_fg.sum() < 3:
+            # Fallback: relax
+            if fg_relaxed is None:
+                fg_relaxed = _fg_mask(upper, sat_thr=0.08)
+            fg = fg_relaxed
+            center_fg = fg[sy1:sy2, sx1:sx2]
+
+        if center_fg.sum() >= 3:
+            center_color = arr_f[sy1:sy2, sx1:sx2][center_fg].mean(axis=0)
+        else:
+            center_color = arr_f[cy, cx]
+
+        # Search window
+        ax1 = max(0, cx - search_half)
+        ay1 = max(0, cy - search_half)
+        ax2 = min(W, cx + search_half)
+        ay2 = min(H, cy + search_half)
+
+        local = arr_f[ay1:ay2, ax1:ax2]
+        local_fg = fg[ay1:ay2, ax1:ax2]
+
+        color_dist = np.sqrt(((local - center_color) ** 2).sum(axis=-1))
+        char_mask = local_fg & (color_dist < color_thresh)
+
+        if char_mask.sum() < 10:
+            # Fallback: use all fg in tighter window
+            h2 = 25
+            by1 = max(0, cy - h2 - ay1)
+            bx1 = max(0, cx - h2 - ax1)
+            by2 = min(local.shape[0], cy + h2 - ay1)
+            bx2 = min(local.shape[1], cx + h2 - ax1)
+            char_mask = np.zeros_like(char_mask)
+            char_mask[by1:by2, bx1:bx2] = local_fg[by1:by2, bx1:bx2]
+
+        ys, xs = np.where(char_mask)
+        if len(xs) < 5:
+            # Emergency fallback: naive crop
+            half = 25
+            crops.append(_pad_square(
+                upper[max(0, cy-half):min(H, cy+half), max(0, cx-half):min(W, cx+half)], 220))
+            continue
+
+        # Isolated image, tight crop + pad to square
+        tx1 = max(0, int(xs.min()) - pad)
+        ty1 = max(0, int(ys.min()) - pad)
+        tx2 = min(local.shape[1], int(xs.max()) + 1 + pad)
+        ty2 = min(local.shape[0], int(ys.max()) + 1 + pad)
+        tight = np.full((ty2 - ty1, tx2 - tx1, 3), 220, dtype=np.uint8)
+        tight_mask = char_mask[ty1:ty2, tx1:tx2]
+        tight[tight_mask] = upper[ay1 + ty1:ay1 + ty2, ax1 + tx1:ax1 + tx2][tight_mask]
+        crops.append(_pad_square(tight, 220))
 
-    if center_fg.sum() < 3:
-        # Fallback: relax
-        fg = _fg_mask(arr[:H], sat_thr=0.08)
-        center_fg = fg[sy1:sy2, sx1:sx2]
+    return crops
 
-    if center_fg.sum() >= 3:
-        center_color = arr_f[sy1:sy2, sx1:sx2][center_fg].mean(axis=0)
-    else:
-        center_color = arr_f[cy, cx]
-
-    # Search window
-    ax1 = max(0, cx - search_half)
-    ay1 = max(0, cy - search_half)
-    ax2 = min(W, cx + search_half)
-    ay2 = min(H, cy + search_half)
-
-    local = arr_f[ay1:ay2, ax1:ax2]
-    local_fg = fg[ay1:ay2, ax1:ax2]
-
-    color_dist = np.sqrt(((local - center_color) ** 2).sum(axis=-1))
-    char_mask = local_fg & (color_dist < color_thresh)
-
-    if char_mask.sum() < 10:
-        # Fallback: use all fg in tighter window
-        h2 = 25
-        by1 = max(0, cy - h2 - ay1)
-        bx1 = max(0, cx - h2 - ax1)
-        by2 = min(local.shape[0], cy + h2 - ay1)
-        bx2 = min(local.shape[1], cx + h2 - ax1)
-        char_mask = np.zeros_like(char_mask)
-        char_mask[by1:by2, bx1:bx2] = local_fg[by1:by2, bx1:bx2]
-
-    # Build isolated image
-    isolated = np.full_like(local, 220.0)
-    isolated[char_mask] = local[char_mask]
-
-    # Tight crop + pad to square
-    ys, xs = np.where(char_mask)
-    if len(xs) < 5:
-        # Emergency fallback: naive crop
-        half = 25
-        crop = arr[max(0, cy-half):min(H, cy+half), max(0, cx-half):min(W, cx+half)]
-        h, w = crop.shape[:2]
-        side = max(h, w)
-        canvas = np.full((side, side, 3), 220, dtype=np.uint8)
-        canvas[(side-h)//2:(side-h)//2+h, (side-w)//2:(side-w)//2+w] = crop
-        return Image.fromarray(canvas)
-
-    tx1 = max(0, int(xs.min()) - pad)
-    ty1 = max(0, int(ys.min()) - pad)
-    tx2 = min(isolated.shape[1], int(xs.max()) + 1 + pad)
-    ty2 = min(isolated.shape[0], int(ys.max()) + 1 + pad)
-    tight = isolated[ty1:ty2, tx1:tx2]
-
-    h, w = tight.shape[:2]
-    side = max(h, w)
-    canvas = np.full((side, side, 3), 220.0, dtype=np.float32)
-    canvas[(side-h)//2:(side-h)//2+h, (side-w)//2:(side-w)//2+w] = tight
 
-    return Image.fromarray(canvas.astype(np.uint8))
+def _pad_square(crop: np.ndarray, fill: int) -> np.ndarray:
+    """Center `crop` on a square uint8 canvas filled with `fill`."""
+    h, w = crop.shape[:2]
+    side = max(h, w)
+    canvas = np.full((side, side, 3), fill, dtype=np.uint8)
+    canvas[(side-h)//2:(side-h)//2+h, (side-w)//2:(side-w)//2+w] = crop
+    return canvas
 
 
 # ---------------------------------------------------------------------------
 # Title (bottom) char cropping
 # ---------------------------------------------------------------------------
 
-def _crop_title_chars(img: Image.Image) -> List[Image.Image]:
-    """Crop 4 title characters from fixed bottom positions."""
+def _crop_title_chars(arr: np.ndarray) -> List[np.ndarray]:
+    """Crop 4 title characters from fixed bottom positions (black square canvases)."""
     crops = []
     for tx in TITLE_X_CENTERS:
         x1, x2 = tx - TITLE_HALF_X, tx + TITLE_HALF_X
-        crop = img.crop((x1, TITLE_Y_TOP, x2, TITLE_Y_BOTTOM))
-        w, h = crop.size
-        side = max(w, h)
-        canvas = Image.new("RGB", (side, side), (0, 0, 0))
-        canvas.paste(crop, ((side - w) // 2, (side - h) // 2))
-        crops.append(canvas)
+        # Out-of-image parts stay black, like PIL's Image.crop
+        crop = np.zeros((TITLE_Y_BOTTOM - TITLE_Y_TOP, x2 - x1, 3), dtype=np.uint8)
+        src = arr[TITLE_Y_TOP:TITLE_Y_BOTTOM, max(0, x1):x2]
+        crop[:src.shape[0], max(0, -x1):max(0, -x1) + src.shape[1]] = src
+        crops.append(_pad_square(crop, 0))
     return crops
 
 
 # ---------------------------------------------------------------------------
 # Preprocessing for ONNX model
 # ---------------------------------------------------------------------------
+# Resizing reimplements Pillow's LANCZOS (ImagingResample, 8-bit path) exactly:
+# same filter, same coefficient rounding to 22-bit fixed point, horizontal pass
+# then vertical pass, each rounded and clipped to uint8.
+
+_RESAMPLE_BITS = 32 - 8 - 2
+
+
+def _lanczos(x: float) -> float:
+    if -3.0 <= x < 3.0:
+        if x == 0.0:
+            return 1.0
+        a = x * math.pi
+        b = x / 3.0 * math.pi
+        return (math.sin(a) / a) * (math.sin(b) / b)
+    return 0.0
+
+
+@lru_cache(maxsize=256)
+def _lanczos_weights(in_size: int, out_size: int) -> np.ndarray:
+    """Fixed-point resampling matrix [out_size, in_size], as Pillow computes it.
+
+    Stored as float64: pixel * weight sums stay far below 2**53, so a BLAS
+    matmul gives the same integers as Pillow's int32 accumulation.
+    """
+    scale = in_size / out_size
+    filterscale = max(scale, 1.0)
+    support = 3.0 * filterscale
+    ss = 1.0 / filterscale
+    weights = np.zeros((out_size, in_size), dtype=np.float64)
+    for xx in range(out_size):
+        center = (xx + 0.5) * scale
+        xmin = max(int(center - support + 0.5), 0)
+        xmax = min(int(center + support + 0.5), in_size) - xmin
+        k = [_lanczos((x + xmin - center + 0.5) * ss) for x in range(xmax)]
+        ww = 0.0
+        for v in k:  # sequential sum, same rounding as the C loop
+            ww += v
+        for x, v in enumerate(k):
+            if ww != 0.0:
+                v /= ww
+            weights[xx, xmin + x] = int((-0.5 if v < 0 else 0.5) + v * (1 << _RESAMPLE_BITS))
+    weights.flags.writeable = False
+    return weights
+
+
+def _fixed_to_u8(acc: np.ndarray) -> np.ndarray:
+    """Pillow's clip8: (acc + half) >> bits, clipped to [0, 255]."""
+    return np.clip(np.floor((acc + (1 << (_RESAMPLE_BITS - 1))) / (1 << _RESAMPLE_BITS)), 0, 255)
+
+
+def _resize_lanczos_batch(crops: np.ndarray, size: int) -> np.ndarray:
+    """uint8 [N, h, w, 3] → float64 [N, size, size, 3] holding uint8 values,
+    pixel-identical to PIL resize((size, size), LANCZOS) on each crop."""
+    n, h, w, c = crops.shape
+    out = crops.astype(np.float64)
+    if w != size:
+        # [N, h, w, 3] → [N, h, 3, w] @ [w, size] → [N, h, 3, size]
+        out = _fixed_to_u8(out.transpose(0, 1, 3, 2) @ _lanczos_weights(w, size).T)
+        out = out.transpose(0, 1, 3, 2)
+    if h != size:
+        # [size, h] @ [N, h, size*3] → [N, size, size*3]
+        out = _fixed_to_u8(_lanczos_weights(h, size) @ out.reshape(n, h, -1)).reshape(n, size, size, c)
+    return out
+
 
 def _preprocess(img: Image.Image, input_size: int, norm: str) -> np.ndarray:
     """Resize + normalize → [1, 3, H, W] float32 for ONNX."""
-    img = img.resize((input_size, input_size), Image.LANCZOS).convert("RGB")
-    arr = np.asarray(img, dtype=np.float32) / 255.0  # [H, W, 3] in [0, 1]
+    return _preprocess_batch([np.asarray(img.convert("RGB"))], input_size, norm)
+
+
+def _preprocess_batch(crops: List[np.ndarray], input_size: int, norm: str) -> np.ndarray:
+    """Resize uint8 crops straight into one tensor and normalize → [N, 3, H, W] float32.
+    Crops of the same shape are resized together."""
+    arr = np.empty((len(crops), input_size, input_size, 3), dtype=np.float32)
+    by_shape: Dict[tuple, List[int]] = {}
+    for i, crop in enumerate(crops):
+        by_shape.setdefault(crop.shape, []).append(i)
+    for idx in by_shape.values():
+        arr[idx] = _resize_lanczos_batch(np.stack([crops[i] for i in idx]), input_size)
+    arr /= 255.0  # [N, H, W, 3] in [0, 1]
 
     preset = _NORM_PRESETS.get(norm, _NORM_PRESETS["imagenet"])
     arr = (arr - preset["mean"]) / preset["std"]
 
-    return arr.transpose(2, 0, 1)[None, ...].astype(np.float32)  # [1, 3, H, W]
+    return np.ascontiguousarray(arr.transpose(0, 3, 1, 2), dtype=np.float32)  # [N, 3, H, W]
 
 
 # ---------------------------------------------------------------------------
 # Hungarian matching (no scipy dependency)
 # ---------------------------------------------------------------------------
 
-def _hungarian_4x4(cost: np.ndarray) -> List[Tuple[int, int]]:
+# Scale of the tie-break term added to matcher costs (max ~8·9³·eps ≈ 6e-6)
+_TIE_EPS = 1e-9
+
+
+def _hungarian(cost: np.ndarray) -> List[Tuple[int, int]]:
+    """
+    Optimal assignment for an R×N cost matrix (R <= N): each row gets a
+    distinct column, minimizing the total cost. Kuhn–Munkres with row/column
+    potentials, O(R²·N). Plain Python lists: at captcha sizes (4×4..4×40)
+    this beats numpy, whose per-call overhead dominates tiny vectors.
+    Returns [(row, col), ...] in row order.
     """
-    Optimal assignment for a 4×N cost matrix (N >= 4).
-    For small N, brute-force over permutations is fast enough.
+    rows = cost.tolist()
+    n_rows = len(rows)
+    if n_rows == 0:
+        return []
+    n_cols = len(rows[0])
+    if n_rows > n_cols:
+        raise ValueError("more rows than columns")
+
+    # 1-based arrays with a virtual column 0 (standard formulation)
+    inf = float("inf")
+    u = [0.0] * (n_rows + 1)
+    v = [0.0] * (n_cols + 1)
+    owner = [0] * (n_cols + 1)   # owner[j] = row matched to column j
+    way = [0] * (n_cols + 1)
+
+    for i in range(1, n_rows + 1):
+        owner[0] = i
+        j0 = 0
+        minv = [inf] * (n_cols + 1)
+        used = [False] * (n_cols + 1)
+        while True:
+            used[j0] = True
+            i0 = owner[j0]
+            row, ui0 = rows[i0 - 1], u[i0]
+            delta, j1 = inf, 0
+            for j in range(1, n_cols + 1):
+                if not used[j]:
+                    cur = row[j - 1] - ui0 - v[j]
+                    if cur < minv[j]:
+                        minv[j] = cur
+                        way[j] = j0
+                    if minv[j] < delta:
+                        delta, j1 = minv[j], j
+            for j in range(n_cols + 1):
+                if used[j]:
+                    u[owner[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if owner[j0] == 0:
+                break
+        # Augment along the alternating path
+        while j0:
+            j1 = way[j0]
+            owner[j0] = owner[j1]
+            j0 = j1
+
+    row_to_col = {owner[j] - 1: j - 1 for j in range(1, n_cols + 1) if owner[j]}
+    return [(i, row_to_col[i]) for i in range(n_rows)]
+
+
+# ---------------------------------------------------------------------------
+# ONNX Runtime session setup
+# ---------------------------------------------------------------------------
+
+def _load_ort_config() -> dict:
+    """Merge the optional xk.conf "CAPTCHA" section over _ORT_DEFAULTS."""
+    cfg = dict(_ORT_DEFAULTS)
+    try:
+        from lib.common import load_xk_config
+        user_cfg = load_xk_config().get("CAPTCHA") or {}
+        if isinstance(user_cfg, dict):
+            cfg.update({str(k).upper(): v for k, v in user_cfg.items()})
+    except Exception:
+        pass  # missing/invalid xk.conf: keep defaults, login will report it
+    return cfg
+
+
+def _session_options(cfg: dict) -> ort.SessionOptions:
+    opts = ort.SessionOptions()
+    opts.intra_op_num_threads = int(cfg["INTRA_OP_THREADS"])
+    opts.inter_op_num_threads = int(cfg["INTER_OP_THREADS"])
+    opts.execution_mode = _EXECUTION_MODES.get(
+        str(cfg["EXECUTION_MODE"]).lower(), ort.ExecutionMode.ORT_SEQUENTIAL)
+    opts.graph_optimization_level = _GRAPH_OPT_LEVELS.get(
+        str(cfg["GRAPH_OPT_LEVEL"]).lower(), ort.GraphOptimizationLevel.ORT_ENABLE_ALL)
+    return opts
+
+
+def _optimized_model_path(onnx_path: str, cfg: dict) -> Optional[str]:
+    """Cache file for the optimized graph of onnx_path, or None if caching is off.
+
+    The name encodes the source file (size + mtime), the optimization level and
+    the ORT version, so a new model or runtime never picks up a stale graph.
     """
-    from itertools import permutations
-    n = cost.shape[1]
-    best_cost = float("inf")
-    best_perm = None
-    for perm in permutations(range(n), 4):
-        c = sum(cost[i, perm[i]] for i in range(4))
-        if c < best_cost:
-            best_cost = c
-            best_perm = perm
-    if best_perm is None:
-        return [(i, i) for i in range(4)]
-    return [(i, best_perm[i]) for i in range(4)]
+    cache_dir = str(cfg.get("OPTIMIZED_MODEL_DIR") or "").strip()
+    if not cache_dir:
+        return None
+    if not os.path.isabs(cache_dir):
+        cache_dir = os.path.join(_PROJECT_ROOT, cache_dir)
+    st = os.stat(onnx_path)
+    level = str(cfg["GRAPH_OPT_LEVEL"]).lower()
+    stem = Path(onnx_path).stem
+    return os.path.join(
+        cache_dir, f"{stem}.{st.st_size:x}-{st.st_mtime_ns:x}.{level}.ort{ort.__version__}.onnx")
+
+
+def _create_session(onnx_path: str, cfg: dict) -> ort.InferenceSession:
+    """Create a CPU session, reusing (or producing) the optimized-graph cache."""
+    providers = ["CPUExecutionProvider"]
+    cache_path = _optimized_model_path(onnx_path, cfg)
+
+    if cache_path and os.path.exists(cache_path):
+        opts = _session_options(cfg)
+        # Already optimized: skip the graph transformers on load
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+        try:
+            return ort.InferenceSession(cache_path, opts, providers=providers)
+        except Exception as e:
+            print(f"[captcha] optimized model cache unusable, rebuilding: {e}")
+            try:
+                os.remove(cache_path)
+            except OSError:
+                pass
+
+    opts = _session_options(cfg)
+    tmp_path = None
+    if cache_path:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        # Write under a private name and rename, so a concurrent reader never
+        # sees a half-written graph
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        opts.optimized_model_filepath = tmp_path
+        opts.log_severity_level = 3  # silence the "hardware specific" notice
+
+    session = ort.InferenceSession(onnx_path, opts, providers=providers)
+    if tmp_path and os.path.exists(tmp_path):
+        os.replace(tmp_path, cache_path)
+    return session
 
 
 # ---------------------------------------------------------------------------
@@ -338,11 +628,14 @@ def _hungarian_4x4(cost: np.ndarray) -> List[Tuple[int, int]]:
 # ---------------------------------------------------------------------------
 
 class _OnnxCharModel:
-    def __init__(self, onnx_path: str):
-        self.session = ort.InferenceSession(
-            onnx_path, providers=["CPUExecutionProvider"]
-        )
-        self.input_name = self.session.get_inputs()[0].name
+    def __init__(self, onnx_path: str, cfg: Optional[dict] = None):
+        self.session = _create_session(onnx_path, cfg or _load_ort_config())
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # Models exported with a fixed batch dimension (e.g. [1, 3, H, W]) are
+        # fed in chunks of that size; a symbolic dimension takes any batch.
+        batch_dim = model_input.shape[0] if model_input.shape else None
+        self.fixed_batch = batch_dim if isinstance(batch_dim, int) and batch_dim > 0 else None
 
         meta = self.session.get_modelmeta().custom_metadata_map or {}
         self.input_size = int(meta.get("input_size", "80"))
@@ -353,12 +646,43 @@ class _OnnxCharModel:
             raise RuntimeError(f"ONNX missing 'idx_to_cls_json': {onnx_path}")
         self.idx_to_cls = {int(k): v for k, v in json.loads(idx_json).items()}
         self.num_classes = len(self.idx_to_cls)
+        # Class name → index (first index wins if a name repeats)
+        self.cls_to_idx: Dict[str, int] = {}
+        for idx, cls in self.idx_to_cls.items():
+            self.cls_to_idx.setdefault(cls, idx)
+
+    def _run(self, x: np.ndarray) -> np.ndarray:
+        """Run logits for a [N, 3, H, W] batch, honouring a fixed batch dimension."""
+        if self.fixed_batch is None:
+            return self.session.run(None, {self.input_name: x})[0]
+
+        b = self.fixed_batch
+        n = x.shape[0]
+        out = []
+        for i in range(0, n, b):
+            chunk = x[i:i + b]
+            if chunk.shape[0] < b:
+                pad = np.zeros((b - chunk.shape[0],) + chunk.shape[1:], dtype=chunk.dtype)
+                chunk = np.concatenate([chunk, pad])
+            out.append(self.session.run(None, {self.input_name: chunk})[0])
+        return np.concatenate(out)[:n]
+
+    def predict_probs_batch(self, crops: List[np.ndarray]) -> np.ndarray:
+        """Return softmax probabilities [N, num_classes] from one inference pass.
+        `crops` are uint8 [h, w, 3] arrays."""
+        if not crops:
+            return np.zeros((0, self.num_classes), dtype=np.float64)
+        x = _preprocess_batch(crops, self.input_size, self.normalize)
+        return _softmax(self._run(x).astype(np.float64))
+
+    def warm_up(self, batch: int) -> None:
+        """Run one blank batch so ORT allocates buffers before the first real solve."""
+        blank = np.full((self.input_size, self.input_size, 3), 220, dtype=np.uint8)
+        self.predict_probs_batch([blank] * batch)
 
     def predict_probs(self, img: Image.Image) -> np.ndarray:
         """Return softmax probabilities [num_classes]."""
-        x = _preprocess(img, self.input_size, self.normalize)
-        logits = self.session.run(None, {self.input_name: x})[0][0]
-        return _softmax(logits.astype(np.float64))
+        return self.predict_probs_batch([np.asarray(img.convert("RGB"))])[0]
 
     def predict_topk(self, img: Image.Image, k: int = 5) -> List[Tuple[str, float]]:
         probs = self.predict_probs(img)
@@ -371,71 +695,97 @@ class _OnnxCharModel:
 # Solver
 # ---------------------------------------------------------------------------
 
+def _mark(timings: Optional[Dict[str, float]], stage: str, start: float) -> float:
+    """Record time since `start` under `stage` (if timing), return now."""
+    now = time.perf_counter()
+    if timings is not None:
+        timings[stage] = now - start
+    return now
+
+
 class _OnnxCaptchaSolver:
-    def __init__(self, upper_path: str, title_path: Optional[str]):
-        self.upper = _OnnxCharModel(upper_path)
-        self.title = _OnnxCharModel(title_path) if title_path else self.upper
+    def __init__(self, upper_path: str, title_path: Optional[str], cfg: Optional[dict] = None):
+        cfg = cfg or _load_ort_config()
+        self.upper = _OnnxCharModel(upper_path, cfg)
+        self.title = _OnnxCharModel(title_path, cfg) if title_path else self.upper
+        if cfg.get("WARMUP", True):
+            self.upper.warm_up(_WARMUP_UPPER_BATCH)
+            if self.title is not self.upper:
+                self.title.warm_up(_WARMUP_TITLE_BATCH)
+
+    def solve(self, img: Image.Image, timings: Optional[Dict[str, float]] = None) -> Optional[List[Point]]:
+        """Solve one captcha. If `timings` is given, per-stage seconds are stored
+        under "segment", "crop", "infer" and "match" (stages reached only)."""
+        return self.solve_scored(img, timings)[0]
+
+    def solve_scored(
+        self, img: Image.Image, timings: Optional[Dict[str, float]] = None
+    ) -> Tuple[Optional[List[Point]], float]:
+        """Like solve(), but also return a confidence in [0, 1]:
+        prod over the 4 title chars of P(title top-1) * P(matched upper char == it).
+        Unsolvable images score 0."""
+        t = time.perf_counter()
 
-    def solve(self, img: Image.Image) -> Optional[List[Point]]:
         # 1. Segment upper area → find 4 char regions
         regions = _segment_upper(img)
+        t = _mark(timings, "segment", t)
         if len(regions) < 4:
-            return None
+            return None, 0.0
 
         arr = np.array(img.convert("RGB"), dtype=np.uint8)
 
-        # 2. Color-isolate each upper char → get crops and probs
-        upper_crops = []
-        upper_centers = []
-        for r in regions[:min(len(regions), 8)]:
-            cx, cy = r["center"]
-            crop = _crop_upper_char_color_isolated(arr, cx, cy)
-            upper_crops.append(crop)
-            upper_centers.append((cx, cy))
-
-        upper_probs = [self.upper.predict_probs(c) for c in upper_crops]
-
-        # 3. Crop title chars → classify
-        title_crops = _crop_title_chars(img)
-        title_top1 = []
-        for tc in title_crops:
-            preds = self.title.predict_topk(tc, k=1)
-            if not preds:
-                return None
-            title_top1.append(preds[0][0])  # top-1 char
+        # 2. Color-isolate all upper chars in one pass, crop title chars
+        upper_centers = [r["center"] for r in regions[:min(len(regions), 8)]]
+        upper_crops = _crop_upper_chars_color_isolated(arr, upper_centers)
+        title_crops = _crop_title_chars(arr)
+        t = _mark(timings, "crop", t)
+
+        # 3. Classify: upper probs, title top-1 char (one batch per model)
+        upper_probs = self.upper.predict_probs_batch(upper_crops)
+        title_probs = self.title.predict_probs_batch(title_crops)
+        t = _mark(timings, "infer", t)
+        if title_probs.shape[1] == 0:
+            return None, 0.0
+        title_top1_idx = np.argmax(title_probs, axis=1)
+        title_top1 = [self.title.idx_to_cls[int(i)] for i in title_top1_idx]
 
         # 4. Build cost matrix and do Hungarian matching
-        #    cost[t][r] = -log P(upper_r == title_char_t)
+        #    cost[t][r] = -log P(upper_r == title_char_t); title chars the upper
+        #    model doesn't know keep a flat cost of 100
         n_upper = len(upper_crops)
-        cost = np.full((4, n_upper), 100.0, dtype=np.float64)
-
-        for ti, target_char in enumerate(title_top1):
-            # Find target class index in upper model
-            target_idx = None
-            for idx, cls in self.upper.idx_to_cls.items():
-                if cls == target_char:
-                    target_idx = idx
-                    break
-            if target_idx is None:
-                continue
-            for ri in range(n_upper):
-                p = max(upper_probs[ri][target_idx], 1e-10)
-                cost[ti, ri] = -np.log(p)
-
-        # 5. Optimal matching
-        matches = _hungarian_4x4(cost)
+        cost = np.full((len(title_top1), n_upper), 100.0, dtype=np.float64)
+        target_idx = np.array([self.upper.cls_to_idx.get(c, -1) for c in title_top1])
+        known = target_idx >= 0
+        cost[known] = -np.log(np.maximum(upper_probs[:, target_idx[known]].T, 1e-10))
+
+        # 5. Optimal matching. The tiny lexicographic term only decides exact
+        #    ties (clamped probabilities, unknown title chars): earlier title
+        #    chars take lower-index, i.e. larger, regions, as brute force did.
+        rows_n, cols_n = cost.shape
+        tie_break = (np.arange(cols_n)[None, :]
+                     * float(cols_n + 1) ** np.arange(rows_n - 1, -1, -1)[:, None]) * _TIE_EPS
+        matches = _hungarian(cost + tie_break)
 
         # 6. Return click positions in title order
         result = []
         for ti, ri in matches:
             result.append(upper_centers[ri])
 
-        return result
+        # Confidence: joint probability of the title reading and the assignment
+        match_cost = sum(cost[ti, ri] for ti, ri in matches)
+        title_conf = float(np.prod(title_probs[np.arange(len(title_top1_idx)), title_top1_idx]))
+        confidence = float(np.exp(-match_cost)) * title_conf
+
+        _mark(timings, "match", t)
+        return result, confidence
 
     def solve_from_base64(self, b64_body: str) -> Optional[List[Point]]:
+        return self.solve_scored_from_base64(b64_body)[0]
+
+    def solve_scored_from_base64(self, b64_body: str) -> Tuple[Optional[List[Point]], float]:
         raw = base64.b64decode(b64_body)
         img = Image.open(io.BytesIO(raw)).convert("RGB")
-        return self.solve(img)
+        return self.solve_scored(img)
 
 
 # ---------------------------------------------------------------------------
@@ -468,14 +818,37 @@ def _get_solver():
             raise
 
 
+def preload_solver(background: bool = True) -> None:
+    """Build and warm up the solver ahead of the first solve.
+
+    With background=True this returns immediately; a solve that arrives while
+    loading simply waits on the init lock. Errors are kept for solve time.
+    """
+    def _load():
+        try:
+            _get_solver()
+        except Exception as e:
+            print(f"[captcha] preload failed: {e}")
+
+    if background:
+        threading.Thread(target=_load, name="captcha-preload", daemon=True).start()
+    else:
+        _load()
+
+
 def solve_captcha_from_base64(img_gif_b64_body: str) -> Optional[List[Point]]:
     """Main entry point: base64 image → list of 4 (x, y) click coords, or None."""
+    return solve_captcha_with_confidence(img_gif_b64_body)[0]
+
+
+def solve_captcha_with_confidence(img_gif_b64_body: str) -> Tuple[Optional[List[Point]], float]:
+    """base64 image → (4 click coords or None, confidence in [0, 1])."""
     try:
         solver = _get_solver()
-        out = solver.solve_from_base64(img_gif_b64_body)
+        out, confidence = solver.solve_scored_from_base64(img_gif_b64_body)
         if not out or len(out) != 4:
-            return None
-        return [(int(x), int(y)) for x, y in out]
+            return None, 0.0
+        return [(int(x), int(y)) for x, y in out], confidence
     except Exception as e:
         print(f"[captcha] solve failed: {e}")
-        return None
+        return None, 0.0
@@ -3,13 +3,18 @@
 """
 
 import base64
+import http.cookiejar
 import json
 import os
+import threading
 import time
 from typing import Any, Dict, List, Tuple
 
+import requests
+import urllib3
 from Crypto.Cipher import AES
 from Crypto.Util.Padding import pad
+from requests.adapters import HTTPAdapter
 
 # ================= 路径常量 =================
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -18,6 +23,9 @@ XK_CONF_FILE = os.path.join(CONF_DIR, "xk.conf")
 COURSE_CONF_FILE = os.path.join(CONF_DIR, "course.conf")
 SESSION_CACHE_FILE = os.path.join(CONF_DIR, "session_cache.json")
 LOCK_FILE = os.path.join(CONF_DIR, "login.lock")
+# 多账号模式（xk_daemon.py）
+ACCOUNTS_CONF_FILE = os.path.join(CONF_DIR, "accounts.conf")
+SESSIONS_DIR = os.path.join(CONF_DIR, "sessions")
 
 # AES 加密密钥（浏览器调试获取）
 AES_KEY = "wHm1xj3afURghi0c"
@@ -42,17 +50,18 @@ def save_json_atomic(path: str, data: Any) -> None:
 
 # ================= 配置加载 =================
 
-def load_xk_config() -> Dict[str, Any]:
+def load_xk_config(path: str | None = None) -> Dict[str, Any]:
     """加载 xk.conf（JSON）。"""
-    return load_json(XK_CONF_FILE)
+    return load_json(path or XK_CONF_FILE)
 
 
-def load_course_conf() -> Tuple[str, List[Tuple[str, str, str, str]]]:
-    """加载 course.conf。
+# 课程未填优先级时的默认权重
+DEFAULT_PRIORITY = 1.0
 
-    返回 (electiveBatchCode, [(teachingClassId, courseKind, teachingClassType, 备注), ...])
-    """
-    raw = load_json(COURSE_CONF_FILE)
+
+def read_course_conf(path: str | None = None) -> Tuple[str, List[Tuple[str, str, str, str]], Dict[str, float]]:
+    """完整读取 course.conf：返回 (electiveBatchCode, courses, {teachingClassId: 优先级})。"""
+    raw = load_json(path or COURSE_CONF_FILE)
     if not isinstance(raw, dict):
         raise ValueError("course.conf 必须是 JSON 对象，包含 electiveBatchCode 和 courses")
 
@@ -65,8 +74,9 @@ def load_course_conf() -> Tuple[str, List[Tuple[str, str, str, str]]]:
         raise ValueError("course.conf 缺少 courses 数组")
 
     courses: List[Tuple[str, str, str, str]] = []
+    priorities: Dict[str, float] = {}
     for i, item in enumerate(raw_courses):
-        if not (isinstance(item, (list, tuple)) and len(item) in (3, 4)):
+        if not (isinstance(item, (list, tuple)) and len(item) in (3, 4, 5)):
             raise ValueError(
                 f"course.conf courses 第 {i+1} 项格式错误: {item}"
             )
@@ -74,31 +84,64 @@ def load_course_conf() -> Tuple[str, List[Tuple[str, str, str, str]]]:
         remark = str(item[3]).strip() if len(item) >= 4 and item[3] else ""
         if not (class_id and kind and ctype):
             raise ValueError(f"course.conf courses 第 {i+1} 项缺少字段: {item}")
+        if len(item) == 5:
+            try:
+                priority = float(item[4])
+            except (TypeError, ValueError):
+                priority = 0.0
+            if not priority > 0:
+                raise ValueError(f"course.conf courses 第 {i+1} 项优先级须为正数: {item}")
+            priorities[class_id] = priority
         courses.append((class_id, kind, ctype, remark))
 
+    return elective_batch_code, courses, priorities
+
+
+def load_course_conf(path: str | None = None) -> Tuple[str, List[Tuple[str, str, str, str]]]:
+    """加载 course.conf（多账号模式下为各账号自己的课程文件）。
+
+    返回 (electiveBatchCode, [(teachingClassId, courseKind, teachingClassType, 备注), ...])
+    每项可选的第 5 列优先级见 load_course_priorities。
+    """
+    elective_batch_code, courses, _ = read_course_conf(path)
     return elective_batch_code, courses
 
 
-def save_course_conf(elective_batch_code: str, courses: List[Tuple[str, str, str, str]]) -> None:
-    """保存 course.conf，保持每门课一行的紧凑格式。"""
+def load_course_priorities(path: str | None = None) -> Dict[str, float]:
+    """读取 course.conf 各项可选的第 5 列优先级（正数，越大分到的提交名额越多）。
+
+    返回 {teachingClassId: 优先级}，未填的课程不在其中（按 DEFAULT_PRIORITY 计）。
+    """
+    return read_course_conf(path)[2]
+
+
+def save_course_conf(elective_batch_code: str, courses: List[Tuple[str, str, str, str]],
+                     path: str | None = None, priorities: Dict[str, float] | None = None) -> None:
+    """保存 course.conf，保持每门课一行的紧凑格式；priorities 中的课程写出第 5 列优先级。"""
+    path = path or COURSE_CONF_FILE
+    priorities = priorities or {}
     batch = json.dumps(str(elective_batch_code).strip(), ensure_ascii=False)
     lines = ["{", f'  "electiveBatchCode": {batch},', '  "courses": [']
     for i, c in enumerate(courses):
-        row = json.dumps([c[0], c[1], c[2], c[3]], ensure_ascii=False)
+        items = [c[0], c[1], c[2], c[3]]
+        if c[0] in priorities:
+            p = priorities[c[0]]
+            items.append(int(p) if float(p).is_integer() else p)
+        row = json.dumps(items, ensure_ascii=False)
         comma = "," if i < len(courses) - 1 else ""
         lines.append(f"    {row}{comma}")
     lines.extend(["  ]", "}"])
 
-    tmp_path = COURSE_CONF_FILE + ".tmp"
+    tmp_path = path + ".tmp"
     with open(tmp_path, "w", encoding="utf-8") as f:
         f.write("\n".join(lines) + "\n")
-    os.replace(tmp_path, COURSE_CONF_FILE)
+    os.replace(tmp_path, path)
 
 
-def remove_course_from_conf(course: Tuple[str, str, str, str]) -> bool:
+def remove_course_from_conf(course: Tuple[str, str, str, str], path: str | None = None) -> bool:
     """从 course.conf 删除某门课。"""
     try:
-        elective_batch_code, courses = load_course_conf()
+        elective_batch_code, courses, priorities = read_course_conf(path)
     except Exception as e:
         print(f"!!! 删除课程失败：读取 course.conf 异常: {e}")
         return False
@@ -109,19 +152,74 @@ def remove_course_from_conf(course: Tuple[str, str, str, str]) -> bool:
         return False
 
     try:
-        save_course_conf(elective_batch_code, courses)
+        save_course_conf(elective_batch_code, courses, path, priorities)
         return True
     except Exception as e:
         print(f"!!! 删除课程失败：写入 course.conf 异常: {e}")
         return False
 
 
+# ================= 选课请求 =================
+
+def try_int(val):
+    """纯数字字符串转 int，与浏览器前端 JSON 类型保持一致。"""
+    try:
+        return int(val)
+    except (ValueError, TypeError):
+        return val
+
+
+def build_select_payload(
+    student_code: str,
+    elective_batch_code: str,
+    course: Tuple[str, str, str, str],
+) -> Dict[str, Any]:
+    """构建 volunteer.do 的 addParam 明文（加密前）。"""
+    return {
+        "data": {
+            "operationType": "1",
+            "studentCode": student_code,
+            "electiveBatchCode": elective_batch_code,
+            "teachingClassId": course[0],
+            "courseKind": try_int(course[1]),
+            "teachingClassType": course[2],
+        }
+    }
+
+
+def is_session_expired(res_json: Dict[str, Any] | None) -> bool:
+    """与前端 bh_utils.js / grablessons.min.js 保持一致的登录失效检测。
+
+    前端两种判定方式:
+    1. resp.loginURL 存在且非空  (bh_utils.js doAjax)
+    2. resp.code == "302"         (grablessons.min.js)
+    """
+    if not isinstance(res_json, dict):
+        return False
+    # 主要判定：loginURL
+    login_url = res_json.get("loginURL")
+    if login_url:  # not None / not ""
+        return True
+    # 次要判定：code == "302"
+    if str(res_json.get("code", "")) == "302":
+        return True
+    return False
+
+
+def is_qos_response(res_json: Dict[str, Any] | None) -> bool:
+    """服务器限流 / 过载的信号：返回不是 JSON，或 msg 中带 NullPointerException。"""
+    if not isinstance(res_json, dict):
+        return True
+    return "NullPointer" in str(res_json.get("msg", ""))
+
+
 # ================= AES 加密 =================
 
-def encrypt_add_param(payload_dict: Dict[str, Any]) -> str:
-    """AES 加密 addParam。"""
+def encrypt_add_param(payload_dict: Dict[str, Any], timestamp: int | None = None) -> str:
+    """AES 加密 addParam。timestamp 为毫秒时间戳，缺省取当前时间（定时开抢时预先加密用）。"""
     json_str = json.dumps(payload_dict, separators=(",", ":"))
-    timestamp = int(time.time() * 1000)
+    if timestamp is None:
+        timestamp = int(time.time() * 1000)
     text_to_encrypt = f"{json_str}?timestrap={timestamp}"
 
     key_bytes = AES_KEY.encode("utf-8")
@@ -130,6 +228,66 @@ def encrypt_add_param(payload_dict: Dict[str, Any]) -> str:
     return base64.b64encode(cipher.encrypt(padded_data)).decode("utf-8")
 
 
+_ecb = threading.local()
+
+
+def _ecb_cipher():
+    """每个线程复用一个 AES-ECB 对象，避免每次 AES.new。"""
+    cipher = getattr(_ecb, "cipher", None)
+    if cipher is None:
+        cipher = _ecb.cipher = AES.new(AES_KEY.encode("utf-8"), AES.MODE_ECB)
+    return cipher
+
+
+class PreparedAddParam:
+    """预先序列化并加密的 addParam，与 encrypt_add_param 输出逐字节一致。
+
+    明文为 "{json}?timestrap={毫秒}"，同一门课只有结尾时间戳会变。ECB 各块独立加密，
+    所以前缀中完整的 16 字节块只需加密一次，每次只加密含时间戳的尾部块。
+    """
+
+    def __init__(self, payload_dict: Dict[str, Any]):
+        prefix = (json.dumps(payload_dict, separators=(",", ":")) + "?timestrap=").encode("utf-8")
+        split = len(prefix) - len(prefix) % AES.block_size
+        self._head = _ecb_cipher().encrypt(prefix[:split])
+        self._tail = prefix[split:]
+
+    def encrypt(self, timestamp: int | None = None) -> str:
+        if timestamp is None:
+            timestamp = int(time.time() * 1000)
+        tail = pad(self._tail + str(timestamp).encode("ascii"), AES.block_size)
+        return base64.b64encode(self._head + _ecb_cipher().encrypt(tail)).decode("ascii")
+
+
+# (studentCode, electiveBatchCode, course) → PreparedAddParam
+_SELECT_PARAM_CACHE: Dict[Tuple[str, str, Tuple[str, str, str, str]], PreparedAddParam] = {}
+
+
+def encrypt_select_param(
+    student_code: str,
+    elective_batch_code: str,
+    course: Tuple[str, str, str, str],
+    timestamp: int | None = None,
+) -> str:
+    """选课请求的加密 addParam，等价于 encrypt_add_param(build_select_payload(...))。"""
+    key = (student_code, elective_batch_code, course)
+    prepared = _SELECT_PARAM_CACHE.get(key)
+    if prepared is None:
+        prepared = _SELECT_PARAM_CACHE[key] = PreparedAddParam(
+            build_select_payload(student_code, elective_batch_code, course))
+    return prepared.encrypt(timestamp)
+
+
+def prepare_select_params(
+    student_code: str,
+    elective_batch_code: str,
+    courses: List[Tuple[str, str, str, str]],
+) -> None:
+    """启动时为所有课程预先序列化、加密 addParam 前缀。"""
+    for course in courses:
+        encrypt_select_param(student_code, elective_batch_code, course, timestamp=0)
+
+
 # ================= 请求头 / 代理 =================
 
 def build_headers(token: str) -> Dict[str, str]:
@@ -167,11 +325,249 @@ def clear_env_proxies():
         os.environ.pop(var, None)
 
 
+# ================= HTTP 连接池 =================
+
+WARMUP_URL = "https://xk.nju.edu.cn/xsxkapp/sys/xsxkapp/*default/index.do"
+
+# 当前线程最近一次新建连接的耗时，由连接类写入、适配器读取
+_conn_timing = threading.local()
+
+
+class _TimedHTTPConnection(urllib3.connection.HTTPConnection):
+    """记录 TCP 建连耗时的 HTTP 连接。"""
+
+    def _new_conn(self):
+        t0 = time.perf_counter()
+        sock = super()._new_conn()
+        _conn_timing.connect = time.perf_counter() - t0
+        _conn_timing.new = True
+        return sock
+
+
+class _TimedHTTPSConnection(urllib3.connection.HTTPSConnection):
+    """记录 TCP 建连与 TLS 握手耗时的 HTTPS 连接。"""
+
+    def _new_conn(self):
+        t0 = time.perf_counter()
+        sock = super()._new_conn()
+        _conn_timing.connect = time.perf_counter() - t0
+        _conn_timing.new = True
+        return sock
+
+    def connect(self):
+        t0 = time.perf_counter()
+        super().connect()
+        # connect() = _new_conn() + TLS 握手
+        _conn_timing.tls = max(0.0, time.perf_counter() - t0 - _conn_timing.connect)
+
+
+class _TimedHTTPConnectionPool(urllib3.HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(urllib3.HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedAdapter(HTTPAdapter):
+    """直连时在 response.conn_timing 上附带建连/握手/首字节耗时（毫秒）。"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+    def send(self, request, **kwargs):
+        _conn_timing.new = False
+        _conn_timing.connect = 0.0
+        _conn_timing.tls = 0.0
+        t0 = time.perf_counter()
+        resp = super().send(request, **kwargs)
+        resp.conn_timing = {
+            "new": _conn_timing.new,
+            "connect_ms": _conn_timing.connect * 1000,
+            "tls_ms": _conn_timing.tls * 1000,
+            "ttfb_ms": (time.perf_counter() - t0) * 1000,
+        }
+        return resp
+
+
+class _NoStoreCookiePolicy(http.cookiejar.DefaultCookiePolicy):
+    """连接池由多线程共享，凭证随请求显式传入，不在 Session 中留存服务端下发的 Cookie。"""
+
+    def set_ok(self, cookie, request):
+        return False
+
+
+class HttpPool:
+    """共享的长连接 HTTP 客户端。
+
+    所有选课提交、结果轮询、登录态校验都走这里，复用到 xk.nju.edu.cn 的
+    TCP+TLS 连接；连接数按并发线程数设置，开抢前可预热，刷新 Session 后重建。
+    """
+
+    def __init__(self, pool_size: int = 4, timeout: float = 10):
+        self.pool_size = max(1, int(pool_size))
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._session = self._build_session()
+        self._stats = {"requests": 0, "new_conns": 0, "connect_ms": 0.0, "tls_ms": 0.0}
+
+    def _build_session(self) -> requests.Session:
+        s = requests.Session()
+        s.trust_env = False
+        s.verify = False
+        s.cookies.set_policy(_NoStoreCookiePolicy())
+        adapter = _TimedAdapter(pool_connections=4, pool_maxsize=self.pool_size)
+        s.mount("https://", adapter)
+        s.mount("http://", adapter)
+        return s
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        resp = self._session.request(method, url, **kwargs)
+        timing = getattr(resp, "conn_timing", None)
+        with self._lock:
+            self._stats["requests"] += 1
+            if timing and timing["new"]:
+                self._stats["new_conns"] += 1
+                self._stats["connect_ms"] += timing["connect_ms"]
+                self._stats["tls_ms"] += timing["tls_ms"]
+        return resp
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def warm_up(self, proxies: Dict[str, str] | None = None,
+                url: str = WARMUP_URL, connections: int | None = None) -> int:
+        """并发发起轻量请求，预先建立 connections 条长连接。返回成功数。"""
+        n = min(connections or self.pool_size, self.pool_size)
+        ok = []
+
+        def _touch():
+            try:
+                self.request("HEAD", url, proxies=proxies, allow_redirects=False, timeout=5)
+                ok.append(1)
+            except Exception:
+                pass
+
+        threads = [threading.Thread(target=_touch, daemon=True) for _ in range(n)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return len(ok)
+
+    def reset(self) -> None:
+        """丢弃现有连接并重建 Session（登录态刷新后调用）。"""
+        old, self._session = self._session, self._build_session()
+        old.close()
+
+    def close(self) -> None:
+        self._session.close()
+
+    def stats_line(self) -> str:
+        with self._lock:
+            st = dict(self._stats)
+        n = st["new_conns"]
+        if not n:
+            return f"连接池: {st['requests']} 次请求, 全部复用已有连接"
+        return (f"连接池: {st['requests']} 次请求, 新建连接 {n} 次 "
+                f"(平均 TCP {st['connect_ms'] / n:.0f}ms, TLS {st['tls_ms'] / n:.0f}ms)")
+
+
+class RateLimiter:
+    """简易令牌桶：保证全局请求间隔 ≥ min_interval 秒（多线程共享）。"""
+
+    def __init__(self, min_interval: float):
+        self._min_interval = min_interval
+        self._lock = threading.Lock()
+        self._last_time = 0.0
+
+    @property
+    def min_interval(self) -> float:
+        return self._min_interval
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            wait = self._last_time + self._min_interval - now
+            if wait > 0:
+                time.sleep(wait)
+            self._last_time = time.monotonic()
+
+
+_HTTP_POOL: HttpPool | None = None
+_HTTP_POOL_LOCK = threading.Lock()
+
+
+def init_http_pool(pool_size: int, timeout: float = 10) -> HttpPool:
+    """按并发数创建（或替换）全局共享连接池。"""
+    global _HTTP_POOL
+    with _HTTP_POOL_LOCK:
+        old, _HTTP_POOL = _HTTP_POOL, HttpPool(pool_size, timeout=timeout)
+    if old is not None:
+        old.close()
+    return _HTTP_POOL
+
+
+def get_http_pool() -> HttpPool:
+    """获取全局共享连接池，未初始化时按默认大小创建。"""
+    global _HTTP_POOL
+    if _HTTP_POOL is None:
+        with _HTTP_POOL_LOCK:
+            if _HTTP_POOL is None:
+                _HTTP_POOL = HttpPool()
+    return _HTTP_POOL
+
+
 # ================= 选课结果轮询 =================
 
 STUDENT_STATUS_URL = "https://xk.nju.edu.cn/xsxkapp/sys/xsxkapp/elective/studentstatus.do"
 
 
+def query_process_status(
+    student_code: str,
+    teaching_class_id: str,
+    session_cookies: Dict[str, str],
+    headers: Dict[str, str],
+    proxies: Dict[str, str] | None = None,
+    *,
+    op_type: str = "1",
+) -> Dict[str, Any]:
+    """查询一次 studentstatus.do。
+
+    返回 {"code": ..., "msg": ...}，code "0" 表示仍在处理中，
+    登录失效（loginURL / code=302）时 code 为 "302"，请求异常时 code 为 "error"。
+    """
+    payload = {
+        "studentCode": student_code,
+        "teachingClassId": teaching_class_id,
+        "type": op_type,
+    }
+    try:
+        r = get_http_pool().post(
+            STUDENT_STATUS_URL,
+            cookies=session_cookies,
+            headers=headers,
+            data=payload,
+            proxies=proxies,
+            timeout=10,
+        )
+        r.encoding = "utf-8"
+        data = r.json()
+        if is_session_expired(data):
+            return {"code": "302", "msg": data.get("msg", "") or "登录已失效"}
+        return {"code": str(data.get("code", "")), "msg": data.get("msg", "")}
+    except Exception as e:
+        return {"code": "error", "msg": str(e)}
+
+
 def poll_process_result(
     student_code: str,
     teaching_class_id: str,
@@ -189,47 +585,77 @@ def poll_process_result(
     volunteer.do 返回 code="1" 只表示请求已入队，真正的成功/失败
     需要通过此接口轮询获取。
 
+    会阻塞调用方直到出结果；抢课主循环使用 lib.result_poller 在后台轮询。
+
     返回格式: {"code": "1"/"−1"/"timeout", "msg": "..."}
       - code "1"  → 操作成功
       - code "-1" → 操作失败（msg 包含原因）
       - code "timeout" → 轮询超时
       - code "error" → 请求异常
     """
-    import requests as _requests
-
-    payload = {
-        "studentCode": student_code,
-        "teachingClassId": teaching_class_id,
-        "type": op_type,
-    }
-
     for attempt in range(1, max_attempts + 1):
-        try:
-            r = _requests.post(
-                STUDENT_STATUS_URL,
-                cookies=session_cookies,
-                headers=headers,
-                data=payload,
-                proxies=proxies,
-                verify=False,
-                timeout=10,
-            )
-            r.encoding = "utf-8"
-            data = r.json()
-            code = str(data.get("code", ""))
-
-            if code == "0":
-                # 仍在处理中
-                time.sleep(interval)
-                continue
-            elif code in ("1", "-1"):
-                # 完成（成功或失败）
-                return {"code": code, "msg": data.get("msg", "")}
-            else:
-                # 意外 code
-                return {"code": code, "msg": data.get("msg", "")}
-
-        except Exception as e:
-            return {"code": "error", "msg": str(e)}
+        res = query_process_status(
+            student_code, teaching_class_id, session_cookies, headers, proxies,
+            op_type=op_type,
+        )
+        if res["code"] == "0":
+            # 仍在处理中
+            time.sleep(interval)
+            continue
+        # 完成（成功 "1" / 失败 "-1"）、意外 code 或请求异常
+        return res
 
     return {"code": "timeout", "msg": f"轮询 {max_attempts} 次仍未完成"}
+
+
+# ================= 课程查询 =================
+
+QUERY_COURSE_URL = "https://xk.nju.edu.cn/xsxkapp/sys/xsxkapp/elective/queryCourse.do"
+
+
+def query_course_page(
+    student_code: str,
+    elective_batch_code: str,
+    keyword: str,
+    page_number: int,
+    session_cookies: Dict[str, str],
+    headers: Dict[str, str],
+    proxies: Dict[str, str] | None = None,
+    *,
+    page_size: int = 10,
+    class_type: str = "QB",
+) -> Tuple[List[Dict[str, Any]], bool] | None:
+    """按关键字（课程名 / 教师名 / 课程号）查询一页 queryCourse.do，与选课页面的搜索相同。
+
+    返回 (dataList, 是否最后一页)；会话失效（"非法请求" / 跳转登录页）时返回 None，
+    网络异常与无法解析的响应向上抛出。
+    """
+    query_setting = {
+        "data": {
+            "studentCode": student_code,
+            "electiveBatchCode": elective_batch_code,
+            "teachingClassType": class_type,
+            "queryContent": keyword,
+        },
+        "pageSize": str(page_size),
+        "pageNumber": str(page_number),
+        "order": "",
+    }
+    r = get_http_pool().post(
+        QUERY_COURSE_URL,
+        cookies=session_cookies,
+        headers=headers,
+        data={"querySetting": json.dumps(query_setting, ensure_ascii=False)},
+        proxies=proxies,
+        timeout=10,
+    )
+    r.encoding = "utf-8"
+    text = r.text.strip()
+    if not text or "非法请求" in text or "<html" in text[:200].lower():
+        return None
+    data = r.json()
+    if not isinstance(data, dict) or is_session_expired(data):
+        return None
+
+    data_list = data.get("dataList") or []
+    return data_list, len(data_list) < page_size
@@ -0,0 +1,149 @@
+"""
+按优先级分配提交名额：stride 调度。
+
+原先每轮按 course.conf 顺序把每门课各提交一次，必抢的课和可有可无的课占用同样的请求预算。
+现在 course.conf 每项可选第 5 列优先级（默认 1，见 lib/common.py load_course_priorities），
+每轮的提交名额按权重比例分配：
+
+  - 每门课有一个行程 pass，被选中一次前进 STRIDE / 权重，每次总是挑 pass 最小的课；
+    长期看各课分到的名额与权重成正比，且均匀穿插，低优先级的课不会被饿死
+  - 名额总数由调用方决定（通常仍是本轮待提交门数），只是重新分配：
+    权重大的课一轮可能提交多次，权重小的可能隔几轮才轮到一次
+  - 临时加权：同一接口上一门课此前的拒绝消息是"已满"（FULL_MARKERS），之后的响应不再是，
+    说明名额有变动（有人退课 / 扩容）。volunteer.do 与 studentstatus.do 分开判断：
+    提交被拒（已满）→ 入队或因其他原因被拒；轮询失败（已满）→ 失败原因变了或排队超时。
+    此后 BOOST_SECONDS 秒内权重乘以 BOOST_FACTOR，并直接排到下一次
+  - 暂时不在候选中的课（结果轮询中）回来时 pass 追平仍在候选中的课里最小的 pass，
+    不会一次补发积欠的名额，也不会抢在刚前进过的课前面连拿两次
+  - 一轮之内，还有课一个名额都没分到时，其他课不拿第二个名额，除非按权重份额它本就该拿多个
+
+只在提交循环所在的线程（或事件循环）中调用，不加锁。
+"""
+
+import heapq
+import math
+import time
+from typing import Dict, List, Tuple
+
+from lib.common import DEFAULT_PRIORITY
+
+Course = Tuple[str, str, str, str]
+
+STRIDE = 1.0
+BOOST_FACTOR = 3.0     # 临时加权倍数
+BOOST_SECONDS = 30.0   # 临时加权持续时间(秒)
+# 服务器消息中表示名额已满的关键字
+FULL_MARKERS = ("已满", "满员", "容量")
+
+
+def _is_full(msg: str | None) -> bool:
+    return any(m in str(msg or "") for m in FULL_MARKERS)
+
+
+class StrideScheduler:
+    """按 teachingClassId 的优先级做 stride 调度。"""
+
+    def __init__(self, priorities: Dict[str, float] | None = None, *,
+                 boost_factor: float = BOOST_FACTOR, boost_seconds: float = BOOST_SECONDS):
+        self.priorities: Dict[str, float] = dict(priorities or {})
+        self.boost_factor = boost_factor
+        self.boost_seconds = boost_seconds
+        self._pass: Dict[str, float] = {}
+        self._vtime = 0.0                       # 上一轮结束时候选课程的最小 pass，即全局进度
+        self._active: set = set()               # 上一轮的候选课程
+        self._front: set = set()                # 临时加权后排到下一次、回来时不追平进度的课
+        self._boost_until: Dict[str, float] = {}
+        self._full: Dict[Tuple[str, str], bool] = {}   # (teachingClassId, 接口) → 最近一次是否"已满"
+
+    def set_priorities(self, priorities: Dict[str, float]) -> None:
+        """course.conf 重新加载后更新优先级，已有进度保留。"""
+        self.priorities = dict(priorities)
+
+    def weight(self, cid: str, now: float | None = None) -> float:
+        w = self.priorities.get(cid, DEFAULT_PRIORITY)
+        until = self._boost_until.get(cid)
+        if until is not None:
+            if (time.monotonic() if now is None else now) < until:
+                return w * self.boost_factor
+            del self._boost_until[cid]
+        return w
+
+    def plan(self, courses: List[Course], slots: int) -> List[Course]:
+        """从候选课程中按权重挑出 slots 个提交名额（同一门课可出现多次），按发出顺序返回。"""
+        if not courses or slots <= 0:
+            return []
+        now = time.monotonic()
+        cids = {c[0] for c in courses}
+        # 上一轮也在候选中的课的进度；新加入 / 轮询回来的课从这里起步
+        staying = [self._pass[cid] for cid in cids & self._active if cid in self._pass]
+        base = max(min(staying), self._vtime) if staying else self._vtime
+        heap = []
+        for order, course in enumerate(courses):
+            cid = course[0]
+            if cid in self._front:
+                p = min(self._pass.get(cid, base), base)
+            elif cid in self._active:
+                p = max(self._pass.get(cid, base), self._vtime)
+            else:
+                p = max(self._pass.get(cid, base), base)
+            self._pass[cid] = p
+            # 同 pass 时按 course.conf 中的顺序
+            heap.append((p, order, course))
+        heapq.heapify(heap)
+
+        # 每门课按权重份额可拿的名额上限（至少 1），只在还有课没分到名额时生效
+        weights = {cid: self.weight(cid, now) for cid in cids}
+        total = sum(weights.values())
+        quota = {cid: max(1, math.ceil(slots * w / total)) for cid, w in weights.items()}
+        counts: Dict[str, int] = {}
+        unserved = len(cids)
+
+        picked: List[Course] = []
+        for _ in range(slots):
+            deferred = []
+            while True:
+                p, order, course = heapq.heappop(heap)
+                n = counts.get(course[0], 0)
+                if n == 0 or unserved == 0 or n < quota[course[0]]:
+                    break
+                deferred.append((p, order, course))
+            for item in deferred:
+                heapq.heappush(heap, item)
+            cid = course[0]
+            if counts.get(cid, 0) == 0:
+                unserved -= 1
+            counts[cid] = counts.get(cid, 0) + 1
+            picked.append(course)
+            self._front.discard(cid)
+            p += STRIDE / weights[cid]
+            self._pass[cid] = p
+            heapq.heappush(heap, (p, order, course))
+        self._vtime = max(self._vtime, heap[0][0])
+        self._active = cids
+        return picked
+
+    def boost(self, cid: str) -> None:
+        """临时加权，并让这门课排到下一次。"""
+        now = time.monotonic()
+        fresh = self._boost_until.get(cid, 0.0) <= now
+        self._boost_until[cid] = now + self.boost_seconds
+        self._pass[cid] = min(self._pass.get(cid, self._vtime), self._vtime)
+        self._front.add(cid)
+        if fresh:
+            print(f"    📈 [{cid}] 名额有变动迹象，{self.boost_seconds:.0f}s 内权重 ×{self.boost_factor:g}")
+
+    def _observe(self, cid: str, endpoint: str, full: bool) -> None:
+        was_full = self._full.get((cid, endpoint), False)
+        self._full[(cid, endpoint)] = full
+        if was_full and not full:
+            self.boost(cid)
+
+    def on_submit(self, cid: str, outcome: str, msg: str | None = None) -> None:
+        """volunteer.do 的提交结果（event_log submit 事件的 outcome 与服务器 msg）。"""
+        if outcome in ("queued", "rejected"):
+            self._observe(cid, "volunteer", outcome == "rejected" and _is_full(msg))
+
+    def on_poll(self, cid: str, code: str, msg: str | None = None) -> None:
+        """studentstatus.do 的轮询结果 code 与 msg。"""
+        if code in ("-1", "timeout"):
+            self._observe(cid, "studentstatus", code == "-1" and _is_full(msg))
@@ -0,0 +1,154 @@
+"""
+course.conf 的内存副本：启动时读一次，之后的读取、删除都在内存里完成，写盘在后台合并进行。
+
+原先 xk.py 每轮、每次抢到都要 load_course_conf 完整解析校验一遍，remove_course_from_conf 再读一遍、
+整份重写；xk_quick.py 抢到的课则根本不写回文件。现在：
+
+  - 课程按 teachingClassId 建索引（保持文件中的顺序），删除 O(1)，courses 直接返回其中的元组
+  - refresh() 只 stat 一次：文件的 mtime / 大小变了（用户手动编辑）才重新加载，
+    尚未写盘的删除会重新应用到新内容上；文件写到一半无法解析时保留内存中的状态，下轮再试
+  - 抢到课后的删除默认立即写盘（一次运行只有几次，且进程可能随时被 SIGTERM 结束）；
+    remove(defer=True) 时 WRITE_DELAY 秒后再写，期间的多次删除合并为一次。
+    写盘前再检查一次外部修改，用 save_course_conf 原子替换（合并进来的外部修改由下一次
+    refresh() 报告）；写盘失败时 WRITE_DELAY 秒后重试，进程正常退出时把没写完的删除落盘
+"""
+
+import atexit
+import os
+import threading
+from typing import Dict, List, Tuple
+
+from lib.common import COURSE_CONF_FILE, read_course_conf, save_course_conf
+
+Course = Tuple[str, str, str, str]
+
+WRITE_DELAY = 1.0   # 延迟删除 / 写盘失败后多久写盘(秒)
+
+
+class CourseStore:
+    """单个 course.conf 的内存索引与延迟写回。"""
+
+    def __init__(self, path: str | None = None, write_delay: float = WRITE_DELAY):
+        self.path = path or COURSE_CONF_FILE
+        self.write_delay = write_delay
+        self._lock = threading.RLock()
+        self._courses: Dict[str, Course] = {}
+        self._priorities: Dict[str, float] = {}
+        self._removed: Dict[str, Course] = {}   # 已删除、尚未写盘
+        self._stat: Tuple[int, int] | None = None
+        self._timer: threading.Timer | None = None
+        self._bad_stat: Tuple[int, int] | None = None
+        self._merged = False   # flush 时合并过外部修改，下一次 refresh() 要报告
+        self.elective_batch_code = ""
+        self._load()
+        atexit.register(self.flush)
+
+    # ---------- 读取 ----------
+
+    @property
+    def courses(self) -> List[Course]:
+        with self._lock:
+            return list(self._courses.values())
+
+    @property
+    def priorities(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._priorities)
+
+    def __len__(self) -> int:
+        return len(self._courses)
+
+    def __contains__(self, cid: str) -> bool:
+        return cid in self._courses
+
+    def _file_stat(self) -> Tuple[int, int] | None:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _load(self) -> None:
+        stat = self._file_stat()
+        batch, courses, priorities = read_course_conf(self.path)
+        self.elective_batch_code = batch
+        self._courses = {c[0]: c for c in courses}
+        self._priorities = priorities
+        # 外部修改后仍保留尚未写盘的删除
+        for cid, course in list(self._removed.items()):
+            if self._courses.get(cid) == course:
+                del self._courses[cid]
+            else:
+                del self._removed[cid]
+        self._stat = stat
+
+    def refresh(self) -> bool:
+        """文件被外部修改过则重新加载，返回是否重新加载（含写盘时已合并的外部修改）。"""
+        stat = self._file_stat()
+        if stat is None or stat == self._stat or stat == self._bad_stat:
+            with self._lock:
+                merged, self._merged = self._merged, False
+            if merged:
+                print(f">>> course.conf 已修改，重新加载：{len(self._courses)} 门课程")
+            return merged
+        with self._lock:
+            try:
+                self._load()
+            except Exception as e:
+                self._bad_stat = stat
+                print(f"!!! course.conf 已修改但无法读取，继续使用内存中的课程: {e}")
+                return False
+            self._bad_stat = None
+            self._merged = False
+        print(f">>> course.conf 已修改，重新加载：{len(self._courses)} 门课程")
+        return True
+
+    # ---------- 删除 / 写回 ----------
+
+    def remove(self, course: Course, defer: bool = False) -> bool:
+        """删除一门课（须与内存中的记录一致）。
+
+        默认立即写盘，返回是否已写入文件；defer=True 时稍后合并写盘，返回是否已从内存删除。
+        """
+        with self._lock:
+            if self._courses.get(course[0]) != course:
+                return False
+            del self._courses[course[0]]
+            self._removed[course[0]] = course
+            if defer:
+                self._schedule()
+                return True
+            return self.flush()
+
+    def _schedule(self) -> None:
+        if self._timer is None:
+            self._timer = threading.Timer(self.write_delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self) -> bool:
+        """立即写入尚未落盘的删除。成功（或无需写入）返回 True。"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._removed:
+                return True
+            try:
+                # 写盘前文件若被外部修改，先合并再写，避免覆盖用户的编辑
+                if self._file_stat() != self._stat:
+                    self._load()
+                    self._merged = True
+                save_course_conf(self.elective_batch_code, list(self._courses.values()),
+                                 self.path, self._priorities)
+            except Exception as e:
+                print(f"!!! 写入 course.conf 失败，{self.write_delay:g}s 后重试: {e}")
+                self._schedule()
+                return False
+            self._removed.clear()
+            self._stat = self._file_stat()
+        return True
+
+    def close(self) -> None:
+        self.flush()
+        atexit.unregister(self.flush)
@@ -0,0 +1,163 @@
+"""
+结构化事件日志（JSON Lines）。
+
+终端输出只适合人看；为了事后统计提交延迟分布、成功率随时间的变化，
+每次提交、轮询结果、登录态更新、QoS 退避都另外记一条事件，一行一个 JSON 对象：
+
+  {"ts": 1767225600.123, "event": "submit", "course": "2025...", "latency_ms": 84.2, ...}
+
+  - emit() 只把事件放进内存队列，序列化和写盘由后台线程完成，不阻塞提交路径
+  - 写入按批缓冲，每 FLUSH_INTERVAL 秒或积攒 FLUSH_BATCH 条落盘一次
+  - emit() 把同一条事件分发给所有已注册的接收方（add_sink）：本文件的 JSON Lines 日志、
+    lib/metrics.py 的指标端点；一个接收方都没有时 emit() 什么也不做
+
+事件类型与字段：
+  run_start  script, engine, user（守护模式为 users 列表）, courses
+  submit     user, course, sent, recv, latency_ms, status, code, msg, outcome, generation
+             outcome: queued / qos / expired / rejected / error / nonjson；定时开抢第一波带 wave="fire"
+  poll       user, course, code, msg, attempts, elapsed_ms（从登记票据到拿到结果）
+  session    user, action=install/expired, generation
+  backoff    user, reason=qos/round, delay, hits
+  captcha    user, solve_ms, confidence, refetch（第几次换图）
+  login      user, result=ok/fail/timeout/error, code, duration_ms
+  seats      course, selected, capacity, open（xk_quick --watch 人数变化）
+  rate       action=decrease, interval, concurrency, reason=error/latency, latency_ms（AIMD 减速）
+  run_end    script（进程退出时自动记录）
+
+日志默认写到 logs/<脚本>-<时间>-<pid>.jsonl，用 tools/analyze_run.py 汇总。
+"""
+
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+from lib.common import BASE_DIR
+
+DEFAULT_LOG_DIR = "logs"   # 相对项目根目录
+FLUSH_INTERVAL = 1.0       # 最长落盘间隔(秒)
+FLUSH_BATCH = 256          # 积攒这么多条立即落盘
+
+_STOP = object()
+
+
+class EventLog:
+    """后台线程写盘的 JSON Lines 事件日志。"""
+
+    def __init__(self, path: str, script: str = ""):
+        self.path = path
+        self.script = script
+        self.dropped = 0           # 序列化失败而丢弃的事件数
+        self._queue: "queue.SimpleQueue[Any]" = queue.SimpleQueue()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._run, name="event-log", daemon=True)
+        self._thread.start()
+
+    def write(self, record: Dict[str, Any]) -> None:
+        """记录一条事件。只做一次入队，可在任意线程 / 协程中调用。"""
+        self._queue.put(record)
+
+    def close(self, timeout: float = 5.0) -> None:
+        """写完队列中剩余的事件后关闭文件。"""
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def _write(self, batch) -> None:
+        lines = []
+        for rec in batch:
+            try:
+                lines.append(json.dumps(rec, ensure_ascii=False, default=str))
+            except (TypeError, ValueError):
+                self.dropped += 1
+        if lines:
+            self._file.write("\n".join(lines) + "\n")
+            self._file.flush()
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch = []
+            try:
+                item = self._queue.get(timeout=FLUSH_INTERVAL)
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + FLUSH_INTERVAL
+            while True:
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+                if len(batch) >= FLUSH_BATCH:
+                    break
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=left)
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except OSError as e:
+                print(f">>> ⚠️ 事件日志写入失败: {e}")
+        self._file.close()
+
+
+_EVENT_LOG: EventLog | None = None
+_SINKS: List[Callable[[Dict[str, Any]], None]] = []
+
+
+def add_sink(sink: Callable[[Dict[str, Any]], None]) -> None:
+    """注册事件接收方；sink 在 emit() 的调用线程中执行，必须足够快且不抛异常。"""
+    _SINKS.append(sink)
+
+
+def remove_sink(sink: Callable[[Dict[str, Any]], None]) -> None:
+    if sink in _SINKS:
+        _SINKS.remove(sink)
+
+
+def init_event_log(conf: Dict[str, Any], script: str) -> EventLog | None:
+    """按 xk.conf 的 EVENT_LOG（日志目录，默认 logs/，空字符串关闭）打开本次运行的事件日志。"""
+    global _EVENT_LOG
+    log_dir = conf.get("EVENT_LOG", DEFAULT_LOG_DIR)
+    if not log_dir:
+        return None
+    log_dir = str(log_dir)
+    if not os.path.isabs(log_dir):
+        log_dir = os.path.join(BASE_DIR, log_dir)
+    name = f"{script}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.jsonl"
+    try:
+        _EVENT_LOG = EventLog(os.path.join(log_dir, name), script)
+    except OSError as e:
+        print(f">>> ⚠️ 无法创建事件日志: {e}")
+        return None
+    add_sink(_EVENT_LOG.write)
+    # Ctrl+C 退出时也要把队列里剩下的事件写完
+    atexit.register(close_event_log)
+    print(f">>> 事件日志: {_EVENT_LOG.path}")
+    return _EVENT_LOG
+
+
+def emit(event: str, **fields: Any) -> None:
+    """记录一条事件；没有接收方（事件日志与指标端点都未启用）时直接返回。"""
+    if not _SINKS:
+        return
+    fields["ts"] = time.time()
+    fields["event"] = event
+    for sink in list(_SINKS):
+        sink(fields)
+
+
+def close_event_log() -> None:
+    """记录 run_end 并写完剩余事件；可重复调用。"""
+    global _EVENT_LOG
+    log, _EVENT_LOG = _EVENT_LOG, None
+    if log is not None:
+        emit("run_end", script=log.script)
+        remove_sink(log.write)
+        log.close()
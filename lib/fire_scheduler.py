@@ -0,0 +1,143 @@
+"""
+定时开抢：估算本机与 xk.nju.edu.cn 的时钟偏差，让第一波 volunteer.do 恰好在开放时刻到达。
+
+时钟偏差估算（类 NTP）：
+  HTTP Date 头只有秒级精度，但每个样本都给出一个约束——服务器在本机 [t0, t1] 之间
+  某一时刻盖下秒数 D，因此 offset = 服务器时间 - 本机时间 ∈ (D - t1, D + 1 - t0)。
+  多个样本的区间取交集；后续样本刻意在"服务器整秒跳变"附近发出，
+  每个样本大约把区间减半，几秒内即可收敛到 RTT 量级。
+
+对外接口:
+  parse_fire_at(text) -> 服务器时间戳（秒）
+  estimate_clock_offset(http, ...) -> {"offset", "error", "rtt", "samples"}
+  wait_until(local_ts)
+  fire_wave(http, url, bodies, send_at, ...) -> [{"sent", "recv", "response"/"error"}, ...]
+"""
+
+import math
+import threading
+import time
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, List
+
+from lib.common import HttpPool, WARMUP_URL
+
+# wait_until 在最后这段时间内忙等，避免 sleep 的唤醒误差
+SPIN_WINDOW = 0.02
+
+
+def parse_fire_at(text: str) -> float:
+    """解析开抢时间，返回 Unix 时间戳。
+
+    支持 "2026-02-20 12:30:00" / "2026-02-20T12:30:00.5" / 带时区 "...+08:00"；
+    不带时区时按本机时区理解。
+    """
+    dt = datetime.fromisoformat(text.strip())
+    return dt.timestamp()
+
+
+def wait_until(local_ts: float) -> None:
+    """睡到 local_ts（本机 time.time() 时间）为止，最后 SPIN_WINDOW 秒忙等。"""
+    while True:
+        left = local_ts - time.time()
+        if left <= 0:
+            return
+        if left > SPIN_WINDOW:
+            time.sleep(min(left - SPIN_WINDOW, 30))
+
+
+def _server_date(resp) -> float:
+    date = resp.headers.get("Date")
+    if not date:
+        raise ValueError("响应缺少 Date 头")
+    return parsedate_to_datetime(date).timestamp()
+
+
+def estimate_clock_offset(
+    http: HttpPool,
+    url: str = WARMUP_URL,
+    proxies: Dict[str, str] | None = None,
+    samples: int = 8,
+) -> Dict[str, float]:
+    """估算 offset = 服务器时钟 - 本机时钟（秒）。
+
+    返回 {"offset": 估计值, "error": 半区间宽度, "rtt": 最小往返时延, "samples": 有效样本数}
+    """
+    lo, hi = -math.inf, math.inf
+    rtts: List[float] = []
+
+    for _ in range(samples):
+        if rtts and math.isfinite(hi - lo):
+            # 按当前估计，让请求中点落在下一个服务器整秒跳变处
+            mid, half_rtt = (lo + hi) / 2, min(rtts) / 2
+            boundary = math.floor(time.time() + mid) + 1
+            if boundary - mid - half_rtt - time.time() < 0.05:
+                boundary += 1
+            wait_until(boundary - mid - half_rtt)
+
+        t0 = time.time()
+        try:
+            resp = http.request("HEAD", url, proxies=proxies, allow_redirects=False, timeout=5)
+            t1 = time.time()
+            d = _server_date(resp)
+        except Exception as e:
+            print(f"    ⚠️ 对时样本失败: {e}")
+            continue
+
+        rtts.append(t1 - t0)
+        s_lo, s_hi = d - t1, d + 1 - t0
+        if max(lo, s_lo) > min(hi, s_hi):
+            # 网络抖动导致区间矛盾：以新样本为准重新收敛
+            lo, hi = s_lo, s_hi
+        else:
+            lo, hi = max(lo, s_lo), min(hi, s_hi)
+
+    if not rtts:
+        raise RuntimeError("对时失败：没有一个有效样本")
+    return {
+        "offset": (lo + hi) / 2,
+        "error": (hi - lo) / 2,
+        "rtt": min(rtts),
+        "samples": len(rtts),
+    }
+
+
+def fire_wave(
+    http: HttpPool,
+    url: str,
+    bodies: List[Dict[str, Any]],
+    send_at: float,
+    *,
+    cookies: Dict[str, str],
+    headers: Dict[str, str],
+    proxies: Dict[str, str] | None = None,
+    timeout: float = 15,
+) -> List[Dict[str, Any]]:
+    """在本机时间 send_at 同时发出 bodies 中的每个 POST（每个一条预先启动的线程）。
+
+    返回与 bodies 一一对应的 {"sent": 实际发出时间, "recv": 收到响应时间, "response": resp}
+    或 {"sent", "recv", "error"}。
+    """
+    go = threading.Event()
+    results: List[Dict[str, Any]] = [{} for _ in bodies]
+
+    def _worker(i: int, data: Dict[str, Any]):
+        go.wait()
+        sent = time.time()
+        try:
+            resp = http.post(url, cookies=cookies, headers=headers, data=data,
+                             proxies=proxies, timeout=timeout)
+            results[i] = {"sent": sent, "recv": time.time(), "response": resp}
+        except Exception as e:
+            results[i] = {"sent": sent, "recv": time.time(), "error": e}
+
+    threads = [threading.Thread(target=_worker, args=(i, b), daemon=True)
+               for i, b in enumerate(bodies)]
+    for t in threads:
+        t.start()
+    wait_until(send_at)
+    go.set()
+    for t in threads:
+        t.join()
+    return results
@@ -0,0 +1,273 @@
+"""
+可选的 Prometheus 指标端点。
+
+xk.conf 中设置 METRICS_PORT（如 9108）后，脚本启动时在后台线程起一个本地 HTTP 服务，
+GET /metrics 返回 Prometheus 文本格式（0.0.4），可直接被 Prometheus 抓取、配告警和容量规划。
+不依赖 prometheus_client：计数器 / 仪表 / 直方图都在本模块内实现，标准库即可运行。
+
+指标由 lib/event_log.py 的事件驱动（注册为事件接收方），埋点与事件日志共用一处：
+  xk_submit_total{outcome}                 volunteer.do 提交次数（queued/qos/expired/rejected/error/nonjson）
+  xk_submit_latency_seconds                volunteer.do 发出 → 收到响应
+  xk_response_codes_total{endpoint,code}   服务器返回码分布：volunteer 的 1 / NPE / 302 / 其他，studentstatus 的 1 / -1 / ...
+  xk_poll_requests_total                   studentstatus.do 查询次数
+  xk_poll_duration_seconds                 登记票据 → 拿到结果
+  xk_backoff_seconds_total{reason}         QoS 退避 / 轮间等待累计时长
+  xk_qos_backoff_level                     当前连续 QoS 次数（指数退避的档位）
+  xk_rate_limit_interval_seconds           当前限速闸门的最小请求间隔
+  xk_concurrency_limit                     当前并发上限（AIMD 窗口）
+  xk_rate_decreases_total{reason}          AIMD 减速次数（error: NPE/非 JSON/网络错误, latency: 延迟飙升）
+  xk_session_events_total{action}          凭证就绪（install）/ 报告失效（expired）/ 后台校验（check）次数
+  xk_login_attempts_total{result}          登录尝试结果
+  xk_captcha_solve_seconds                 验证码识别耗时
+  xk_captcha_confidence                    验证码识别置信度
+
+对外接口:
+  start_metrics_server(conf) -> 端口或 None
+  set_rate_limiter(limiter)                间隔 / 并发仪表跟随该限速闸门
+"""
+
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+from lib.event_log import add_sink
+
+METRICS_HOST = "127.0.0.1"   # 默认只监听本机，可用 METRICS_HOST 覆盖
+METRICS_PATH = "/metrics"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 15.0)
+POLL_BUCKETS = (0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 10.0, 15.0)
+CAPTCHA_BUCKETS = (0.005, 0.01, 0.02, 0.05, 0.1, 0.25, 0.5, 1.0)
+CONFIDENCE_BUCKETS = (0.001, 0.01, 0.05, 0.1, 0.2, 0.4, 0.6, 0.8, 0.9)
+
+LabelValues = Tuple[str, ...]
+
+
+def _fmt(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def _labels(self, key: LabelValues) -> str:
+        parts = [f'{n}="{_escape(v)}"' for n, v in zip(self.labelnames, key)]
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, doc, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{self._labels(k)} {_fmt(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, doc: str):
+        super().__init__(name, doc)
+        self._value: float | None = None
+        self._func: Callable[[], float] | None = None
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self._value = float(value)
+
+    def set_function(self, func: Callable[[], float]) -> None:
+        """抓取时调用 func 取值（如令牌桶的当前间隔）。"""
+        with self._lock:
+            self._func = func
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            func, value = self._func, self._value
+        if func is not None:
+            try:
+                value = float(func())
+            except Exception:
+                value = None
+        return [] if value is None else [f"{self.name} {_fmt(value)}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, buckets: Sequence[float]):
+        super().__init__(name, doc)
+        self.bounds = tuple(sorted(buckets)) + (math.inf,)
+        self._counts = [0] * len(self.bounds)
+        self._sum = 0.0
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            for i, bound in enumerate(self.bounds):
+                if value <= bound:
+                    self._counts[i] += 1
+                    break
+            self._sum += value
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        lines, cum = [], 0
+        for bound, n in zip(self.bounds, counts):
+            cum += n
+            lines.append(f'{self.name}_bucket{{le="{_fmt(bound)}"}} {cum}')
+        lines.append(f"{self.name}_sum {_fmt(total)}")
+        lines.append(f"{self.name}_count {cum}")
+        return lines
+
+
+SUBMITS = Counter("xk_submit_total", "volunteer.do submissions by outcome.", ["outcome"])
+SUBMIT_LATENCY = Histogram("xk_submit_latency_seconds", "volunteer.do request latency.", LATENCY_BUCKETS)
+RESPONSE_CODES = Counter("xk_response_codes_total", "Server response codes.", ["endpoint", "code"])
+POLL_REQUESTS = Counter("xk_poll_requests_total", "studentstatus.do requests.")
+POLL_DURATION = Histogram("xk_poll_duration_seconds",
+                          "Time from queued submission to final poll result.", POLL_BUCKETS)
+BACKOFF_SECONDS = Counter("xk_backoff_seconds_total", "Seconds spent waiting between rounds.", ["reason"])
+QOS_LEVEL = Gauge("xk_qos_backoff_level", "Consecutive QoS hits driving the exponential backoff.")
+RATE_LIMIT_INTERVAL = Gauge("xk_rate_limit_interval_seconds", "Current minimum interval between requests.")
+CONCURRENCY_LIMIT = Gauge("xk_concurrency_limit", "Current concurrent request limit.")
+RATE_DECREASES = Counter("xk_rate_decreases_total", "AIMD multiplicative decreases.", ["reason"])
+SESSION_EVENTS = Counter("xk_session_events_total", "Credential installs and expiry reports.", ["action"])
+LOGIN_ATTEMPTS = Counter("xk_login_attempts_total", "Login attempts by result.", ["result"])
+CAPTCHA_SOLVE = Histogram("xk_captcha_solve_seconds", "Captcha solve time.", CAPTCHA_BUCKETS)
+CAPTCHA_CONFIDENCE = Histogram("xk_captcha_confidence", "Captcha solve confidence.", CONFIDENCE_BUCKETS)
+
+REGISTRY: List[_Metric] = [
+    SUBMITS, SUBMIT_LATENCY, RESPONSE_CODES, POLL_REQUESTS, POLL_DURATION, BACKOFF_SECONDS,
+    QOS_LEVEL, RATE_LIMIT_INTERVAL, CONCURRENCY_LIMIT, RATE_DECREASES, SESSION_EVENTS,
+    LOGIN_ATTEMPTS, CAPTCHA_SOLVE, CAPTCHA_CONFIDENCE,
+]
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def _submit_code(record: Dict[str, Any]) -> str:
+    """volunteer.do 的返回码归类：NPE 与 302（会话失效）单列，便于告警。"""
+    outcome = record.get("outcome")
+    if outcome == "qos":
+        return "NPE"
+    if outcome == "expired":
+        return "302"
+    if outcome in ("error", "nonjson"):
+        return outcome
+    return str(record.get("code") or "")
+
+
+def _observe(record: Dict[str, Any]) -> None:
+    """事件接收方：把一条事件折算进各项指标。"""
+    event = record["event"]
+    if event == "submit":
+        SUBMITS.inc(outcome=record.get("outcome", ""))
+        RESPONSE_CODES.inc(endpoint="volunteer", code=_submit_code(record))
+        if record.get("latency_ms") is not None:
+            SUBMIT_LATENCY.observe(record["latency_ms"] / 1000)
+    elif event == "poll":
+        POLL_REQUESTS.inc(record.get("attempts", 1))
+        RESPONSE_CODES.inc(endpoint="studentstatus", code=str(record.get("code", "")))
+        POLL_DURATION.observe(record.get("elapsed_ms", 0) / 1000)
+    elif event == "backoff":
+        BACKOFF_SECONDS.inc(float(record.get("delay", 0)), reason=record.get("reason", ""))
+        QOS_LEVEL.set(record.get("hits", 0))
+    elif event == "rate":
+        RATE_DECREASES.inc(reason=record.get("reason", ""))
+    elif event == "session":
+        SESSION_EVENTS.inc(action=record.get("action", ""))
+    elif event == "login":
+        LOGIN_ATTEMPTS.inc(result=record.get("result", ""))
+    elif event == "captcha":
+        CAPTCHA_SOLVE.observe(record.get("solve_ms", 0) / 1000)
+        if record.get("confidence") is not None:
+            CAPTCHA_CONFIDENCE.observe(record["confidence"])
+
+
+def _safe_observe(record: Dict[str, Any]) -> None:
+    try:
+        _observe(record)
+    except Exception:
+        pass  # 指标出错不能影响提交路径
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != METRICS_PATH:
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+_SERVER: ThreadingHTTPServer | None = None
+
+
+def set_rate_limiter(limiter) -> None:
+    """间隔 / 并发仪表在抓取时读取该限速闸门的当前值。"""
+    RATE_LIMIT_INTERVAL.set_function(lambda: limiter.min_interval)
+    CONCURRENCY_LIMIT.set_function(lambda: limiter.concurrency)
+
+
+def start_metrics_server(conf: Dict[str, Any]) -> int | None:
+    """按 xk.conf 的 METRICS_PORT / METRICS_HOST 在后台线程启动指标端点；未配置端口时返回 None。"""
+    global _SERVER
+    port = int(conf.get("METRICS_PORT") or 0)
+    if not port or _SERVER is not None:
+        return None
+    host = str(conf.get("METRICS_HOST") or METRICS_HOST)
+    try:
+        _SERVER = ThreadingHTTPServer((host, port), _Handler)
+    except OSError as e:
+        print(f">>> ⚠️ 指标端点启动失败 ({host}:{port}): {e}")
+        return None
+    _SERVER.daemon_threads = True
+    threading.Thread(target=_SERVER.serve_forever, name="metrics", daemon=True).start()
+    add_sink(_safe_observe)
+    print(f">>> 指标端点: http://{host}:{port}{METRICS_PATH}")
+    return port
@@ -0,0 +1,214 @@
+"""
+自适应限速：AIMD（加性增、乘性减）控制请求间隔与并发数。
+
+原先固定 MIN_INTERVAL = 0.35s、3 并发，QoS 只在轮与轮之间指数退避：
+保守常数白白浪费了服务器允许的余量，真触发 QoS 时又要等整轮结束才退。
+现在每个请求结束都向控制器反馈一次：
+
+  - 正常响应（JSON、非 NPE、延迟不超过基线的 LATENCY_FACTOR 倍）：
+    速率 += RATE_STEP / 速率（约每秒 +RATE_STEP req/s），并发窗口 += 1/窗口（约每轮 +1）
+  - 拥塞信号（NPE / 非 JSON / 网络错误 / 延迟飙升）：速率与并发窗口都乘以 DECREASE_FACTOR；
+    在减速之前就已发出的请求再报拥塞不重复减速（同 TCP 每个 RTT 最多减一次）
+  - 间隔限制在 [MIN_INTERVAL, MAX_INTERVAL]，并发限制在 [1, MAX_WORKERS]；
+    上限默认就是原先的 0.35s / 3 并发，不会比原来更快，只在拥塞时自动降速、恢复后回到上限。
+    想更快须在 xk.conf 中显式调低 MIN_INTERVAL / 调高 MAX_WORKERS
+
+xk.conf 中的 "RATE_CONTROL" 对象可覆盖 _DEFAULTS（键名同下）；ADAPTIVE 为 false 时
+退化为固定间隔 + 固定并发，与原先行为一致。
+
+对外接口:
+  AimdController      控制器状态（线程安全），interval / concurrency 为当前值
+  AdaptiveRateLimiter 线程版闸门：token = acquire()；请求结束后 release(token, ok, latency)
+  AsyncAdaptiveRateLimiter  asyncio 版闸门，接口相同（acquire / release 均为协程）
+  build_controller(conf, interval, workers) -> AimdController
+"""
+
+import asyncio
+import threading
+import time
+from typing import Any, Dict
+
+from lib.event_log import emit
+
+_DEFAULTS = {
+    "ADAPTIVE": True,
+    "MIN_INTERVAL": 0.35,      # 间隔下限，即速率上限(秒)
+    "MAX_INTERVAL": 5.0,       # 间隔上限(秒)
+    "MAX_WORKERS": 3,          # 并发上限
+    "RATE_STEP": 0.1,          # 加性增步长(req/s，约每秒)
+    "DECREASE_FACTOR": 0.5,    # 乘性减系数
+    "LATENCY_FACTOR": 3.0,     # 延迟超过基线这么多倍视为拥塞
+    "LATENCY_SLACK": 0.3,      # 且至少比基线多这么多秒，避免基线很小时误判
+}
+
+# 延迟基线：取观测到的最小延迟，每个请求向上漂移一点，网络变化后能重新收敛
+BASELINE_DRIFT = 1.01
+
+
+class AimdController:
+    """请求间隔与并发窗口的 AIMD 控制器。"""
+
+    def __init__(self, *, interval: float, workers: int, adaptive: bool = True,
+                 min_interval: float = _DEFAULTS["MIN_INTERVAL"],
+                 max_interval: float = _DEFAULTS["MAX_INTERVAL"],
+                 max_workers: int = _DEFAULTS["MAX_WORKERS"],
+                 rate_step: float = _DEFAULTS["RATE_STEP"],
+                 decrease_factor: float = _DEFAULTS["DECREASE_FACTOR"],
+                 latency_factor: float = _DEFAULTS["LATENCY_FACTOR"],
+                 latency_slack: float = _DEFAULTS["LATENCY_SLACK"]):
+        self.adaptive = adaptive
+        self.min_interval = min(min_interval, interval)
+        self.max_interval = max(max_interval, interval)
+        self.max_workers = max(max_workers, workers) if adaptive else workers
+        self.rate_step = rate_step
+        self.decrease_factor = decrease_factor
+        self.latency_factor = latency_factor
+        self.latency_slack = latency_slack
+        self._lock = threading.Lock()
+        self._rate = 1.0 / interval
+        self._window = float(workers)
+        self._baseline: float | None = None
+        self._decreased_at = 0.0       # 最近一次减速的时刻（monotonic）
+        self.decreases = 0
+
+    @property
+    def interval(self) -> float:
+        with self._lock:
+            return 1.0 / self._rate
+
+    @property
+    def concurrency(self) -> int:
+        with self._lock:
+            return max(1, int(self._window))
+
+    def _congested(self, latency: float) -> bool:
+        base = self._baseline
+        self._baseline = latency if base is None else min(latency, base * BASELINE_DRIFT)
+        if base is None:
+            return False
+        return latency > base * self.latency_factor and latency > base + self.latency_slack
+
+    def on_result(self, sent: float, ok: bool, latency: float) -> None:
+        """一个请求结束：sent 为 acquire 返回的发出时刻，ok=False 表示 NPE / 非 JSON / 网络错误。"""
+        if not self.adaptive:
+            return
+        with self._lock:
+            congested = not ok or self._congested(latency)
+            if not congested:
+                self._rate = min(1.0 / self.min_interval, self._rate + self.rate_step / self._rate)
+                self._window = min(float(self.max_workers), self._window + 1.0 / self._window)
+                return
+            if sent < self._decreased_at:
+                return  # 减速前发出的请求，拥塞已经算过
+            self._rate = max(1.0 / self.max_interval, self._rate * self.decrease_factor)
+            self._window = max(1.0, self._window * self.decrease_factor)
+            self._decreased_at = time.monotonic()
+            self.decreases += 1
+            interval, window = 1.0 / self._rate, int(self._window)
+        emit("rate", action="decrease", interval=round(interval, 4), concurrency=max(1, window),
+             reason="error" if not ok else "latency", latency_ms=round(latency * 1000, 1))
+        print(f"    ⚠️ 限速: 间隔 → {interval:.2f}s, 并发 → {max(1, window)}")
+
+
+class AdaptiveRateLimiter:
+    """线程版闸门：同时满足当前并发上限与最小请求间隔才放行。"""
+
+    def __init__(self, controller: AimdController):
+        self.controller = controller
+        self._cond = threading.Condition()
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._last_time = 0.0
+
+    @property
+    def min_interval(self) -> float:
+        return self.controller.interval
+
+    @property
+    def concurrency(self) -> int:
+        return self.controller.concurrency
+
+    def acquire(self) -> float:
+        """阻塞到可以发出下一个请求，返回发出时刻（交给 release）。"""
+        with self._cond:
+            while self._in_flight >= self.controller.concurrency:
+                self._cond.wait()
+            self._in_flight += 1
+        with self._lock:
+            # 持锁等待间隔：后来者排在后面，保证全局间隔
+            wait = self._last_time + self.controller.interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            self._last_time = time.monotonic()
+            return self._last_time
+
+    def release(self, sent: float, ok: bool, latency: float) -> None:
+        self.controller.on_result(sent, ok, latency)
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+
+class AsyncAdaptiveRateLimiter:
+    """asyncio 版闸门，语义同 AdaptiveRateLimiter；须在事件循环内创建。"""
+
+    def __init__(self, controller: AimdController):
+        self.controller = controller
+        self._cond = asyncio.Condition()
+        self._lock = asyncio.Lock()
+        self._in_flight = 0
+        self._last_time = 0.0
+
+    @property
+    def min_interval(self) -> float:
+        return self.controller.interval
+
+    @property
+    def concurrency(self) -> int:
+        return self.controller.concurrency
+
+    async def acquire(self) -> float:
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._in_flight < self.controller.concurrency)
+            self._in_flight += 1
+        async with self._lock:
+            wait = self._last_time + self.controller.interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._last_time = time.monotonic()
+            return self._last_time
+
+    async def release(self, sent: float, ok: bool, latency: float) -> None:
+        self.controller.on_result(sent, ok, latency)
+        async with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+
+def _load_config(conf: Dict[str, Any]) -> Dict[str, Any]:
+    """合并 xk.conf 的 "RATE_CONTROL" 对象与 _DEFAULTS。"""
+    cfg = dict(_DEFAULTS)
+    user_cfg = conf.get("RATE_CONTROL") or {}
+    if isinstance(user_cfg, dict):
+        cfg.update({str(k).upper(): v for k, v in user_cfg.items()})
+    return cfg
+
+
+def build_controller(conf: Dict[str, Any], interval: float, workers: int) -> AimdController:
+    """以脚本原有的 interval / workers 为起点，按 xk.conf 的 RATE_CONTROL 构造控制器。"""
+    cfg = _load_config(conf)
+    adaptive = cfg["ADAPTIVE"]
+    if isinstance(adaptive, str):
+        adaptive = adaptive.strip().lower() not in ("0", "false", "no", "off")
+    return AimdController(
+        interval=interval,
+        workers=workers,
+        adaptive=bool(adaptive),
+        min_interval=float(cfg["MIN_INTERVAL"]),
+        max_interval=float(cfg["MAX_INTERVAL"]),
+        max_workers=int(cfg["MAX_WORKERS"]),
+        rate_step=float(cfg["RATE_STEP"]),
+        decrease_factor=float(cfg["DECREASE_FACTOR"]),
+        latency_factor=float(cfg["LATENCY_FACTOR"]),
+        latency_slack=float(cfg["LATENCY_SLACK"]),
+    )
@@ -0,0 +1,168 @@
+"""
+选课结果后台轮询器。
+
+volunteer.do 返回 code="1" 只表示请求已入队，真正结果要轮询 studentstatus.do。
+原先在提交循环里同步调用 poll_process_result，一个排队中的请求最多会卡住整轮 10 秒；
+现在提交方只需 submit() 一张票据，由后台线程轮询，结果通过 drain() 取回。
+
+  - 同一教学班重复入队时合并为一张票据，每个节拍只查询一次
+  - 轮询间隔自适应：先短后长（POLL_SCHEDULE），超过 POLL_TIMEOUT 视为超时
+  - 传入 SessionManager 时每次查询都取当前凭证；否则凭证刷新后调用 update_credentials()
+  - 登录失效（loginURL / code=302）或网络错误不算结果：失效时通知 SessionManager 后台刷新，
+    票据留在队列中照常重试，直到 POLL_TIMEOUT
+  - 每个结果记一条 poll 事件（lib/event_log.py），含查询次数和从登记到出结果的耗时
+"""
+
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+from lib.common import is_session_expired, query_process_status
+from lib.event_log import emit
+
+# 第 n 次查询前的等待间隔（秒），超出部分沿用最后一项
+POLL_SCHEDULE = (0.3, 0.5, 0.8, 1.2, 2.0, 3.0)
+# 单张票据最长轮询时间（秒）
+POLL_TIMEOUT = 15.0
+
+Course = Tuple[str, str, str, str]
+
+
+def poll_delay(attempt: int) -> float:
+    """第 attempt 次（从 0 计）查询前的等待秒数。"""
+    return POLL_SCHEDULE[min(attempt, len(POLL_SCHEDULE) - 1)]
+
+
+class ResultPoller:
+    """后台轮询线程：接收 (studentCode, teachingClassId) 票据，产出 (course, result)。
+
+    result 与 poll_process_result 的返回格式一致：
+      {"code": "1"/"-1"/"timeout"/"error"/其他, "msg": "..."}
+    """
+
+    def __init__(self, student_code: str, proxies: Dict[str, str] | None = None, sessions=None):
+        self.student_code = student_code
+        self.proxies = proxies
+        self.sessions = sessions    # lib.session_manager.SessionManager，可选
+        self._creds: Tuple[Dict[str, str], Dict[str, str]] = ({}, {})
+        # teachingClassId → 票据 {"course", "attempt", "created", "due", "deadline"}
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._cond = threading.Condition()
+        self._results: "queue.Queue[Tuple[Course, Dict[str, Any]]]" = queue.Queue()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="result-poller", daemon=True)
+
+    def start(self) -> "ResultPoller":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def update_credentials(self, cookies: Dict[str, str], headers: Dict[str, str]) -> None:
+        with self._cond:
+            self._creds = (cookies, headers)
+
+    def submit(self, course: Course) -> None:
+        """登记一张待轮询票据；同一教学班已在轮询中则只刷新截止时间。"""
+        now = time.monotonic()
+        with self._cond:
+            ticket = self._pending.get(course[0])
+            if ticket is None:
+                self._pending[course[0]] = {
+                    "course": course,
+                    "attempt": 0,
+                    "created": now,
+                    "due": now + poll_delay(0),
+                    "deadline": now + POLL_TIMEOUT,
+                }
+            else:
+                ticket["deadline"] = now + POLL_TIMEOUT
+            self._cond.notify()
+
+    def is_pending(self, class_id: str) -> bool:
+        with self._cond:
+            return class_id in self._pending
+
+    @property
+    def pending_count(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def drain(self, timeout: float = 0.0) -> List[Tuple[Course, Dict[str, Any]]]:
+        """取出已有结果；timeout > 0 时最多等待这么久直到至少有一条结果。"""
+        out = []
+        try:
+            out.append(self._results.get(timeout=timeout) if timeout > 0 else self._results.get_nowait())
+        except queue.Empty:
+            return out
+        while True:
+            try:
+                out.append(self._results.get_nowait())
+            except queue.Empty:
+                return out
+
+    # ---------- 后台线程 ----------
+
+    def _next_due(self) -> List[Dict[str, Any]]:
+        """阻塞到至少一张票据到期，返回所有到期票据。"""
+        with self._cond:
+            while not self._stopped:
+                now = time.monotonic()
+                due = [t for t in self._pending.values() if t["due"] <= now]
+                if due:
+                    return due
+                wait = min((t["due"] for t in self._pending.values()), default=None)
+                self._cond.wait(None if wait is None else wait - now)
+            return []
+
+    def _finish(self, ticket: Dict[str, Any], result: Dict[str, Any]) -> None:
+        with self._cond:
+            self._pending.pop(ticket["course"][0], None)
+        emit("poll", user=self.student_code, course=ticket["course"][0],
+             code=str(result.get("code", "")), msg=result.get("msg", ""),
+             attempts=ticket["attempt"] + 1,
+             elapsed_ms=round((time.monotonic() - ticket["created"]) * 1000, 1))
+        self._results.put((ticket["course"], result))
+
+    def _current_creds(self) -> Tuple[Dict[str, str], Dict[str, str], int | None]:
+        creds = self.sessions.get() if self.sessions is not None else None
+        if creds is not None:
+            return creds.cookies, creds.headers, creds.generation
+        with self._cond:
+            return (*self._creds, None)
+
+    def _run(self) -> None:
+        while True:
+            due = self._next_due()
+            if not due:
+                return
+            for ticket in due:
+                cookies, headers, generation = self._current_creds()
+                res = query_process_status(
+                    self.student_code, ticket["course"][0], cookies, headers, self.proxies,
+                )
+                now = time.monotonic()
+                expired = is_session_expired(res)
+                if expired and generation is not None:
+                    # 通知后台刷新登录态；下次查询时取新凭证
+                    self.sessions.report_expired(generation)
+                if (expired or res["code"] == "error") and now < ticket["deadline"]:
+                    # 不是服务器给出的结果，票据留在队列中继续查询
+                    with self._cond:
+                        ticket["attempt"] += 1
+                        ticket["due"] = now + poll_delay(ticket["attempt"])
+                elif res["code"] != "0":
+                    self._finish(ticket, res)
+                elif now >= ticket["deadline"]:
+                    self._finish(ticket, {
+                        "code": "timeout",
+                        "msg": f"轮询 {ticket['attempt'] + 1} 次仍未完成",
+                    })
+                else:
+                    with self._cond:
+                        ticket["attempt"] += 1
+                        ticket["due"] = now + poll_delay(ticket["attempt"])
@@ -0,0 +1,188 @@
+"""
+余量监视（xk_quick.py --watch）：只在教学班出现空位时提交。
+
+对已满的课反复调用 volunteer.do 只会耗掉请求预算、触发 QoS。监视模式改为用选课页面同款的
+queryCourse.do 搜索批量读取已选人数 / 容量：
+
+  - 按关键字分组：同一关键字（默认取备注中 "/" 前的课程名，可用 xk.conf WATCH.KEYWORDS 覆盖）
+    的多个教学班共用一次搜索，翻页直到全部找到或到最后一页（最多 MAX_PAGES 页）
+  - 内存中保留上一次快照，只有变化的教学班才触发后续动作：
+    变为有空位（已选 < 容量）时"装填"一次提交，变满时撤下
+  - 装填的提交发出后即消耗；QoS / 网络错误 / 会话过期 / 轮询超时等非服务器结论的结果重新装填，
+    被服务器明确拒绝或排队失败的，要等人数再次变化才会再提交
+  - 查询失败（网络错误）时，这一轮状态未知的教学班全部装填；搜索结果中找不到、
+    或没有人数字段的教学班退化为常规模式，每轮都提交
+  - 查询请求同样经过 AIMD 限速闸门，与提交共用请求预算
+
+xk.conf 中 "WATCH" 对象可覆盖 _DEFAULTS；每次人数变化记一条 seats 事件（lib/event_log.py）。
+"""
+
+import time
+from typing import Any, Dict, List, NamedTuple, Set, Tuple
+
+from lib.common import query_course_page
+from lib.event_log import emit
+from lib.rate_control import AdaptiveRateLimiter
+from lib.session_manager import Credentials
+
+Course = Tuple[str, str, str, str]
+
+_DEFAULTS = {
+    "INTERVAL": 2.0,    # 两次快照之间的间隔(秒)
+    "PAGE_SIZE": 50,    # 每页条数，越大一次查询覆盖的教学班越多
+    "MAX_PAGES": 5,     # 每个关键字最多翻几页
+    "KEYWORDS": {},     # {teachingClassId: 搜索关键字}
+}
+
+# queryCourse.do dataList 中已选人数 / 容量的字段名，按顺序取第一个存在的
+SELECTED_FIELDS = ("numberOfSelected", "selectedNum", "numberOfFirstVolunteer")
+CAPACITY_FIELDS = ("classCapacity", "capacity")
+
+
+class Seats(NamedTuple):
+    selected: int
+    capacity: int
+
+    @property
+    def open(self) -> bool:
+        return self.selected < self.capacity
+
+
+def parse_seats(item: Dict[str, Any]) -> Seats | None:
+    """从 queryCourse.do 的一条记录取出 (已选, 容量)，字段缺失或无法解析时返回 None。"""
+    values = []
+    for fields in (SELECTED_FIELDS, CAPACITY_FIELDS):
+        raw = next((item[f] for f in fields if item.get(f) not in (None, "")), None)
+        try:
+            values.append(int(raw))
+        except (TypeError, ValueError):
+            return None
+    return Seats(*values)
+
+
+class SessionExpired(Exception):
+    """queryCourse.do 返回"非法请求"或登录跳转。"""
+
+
+class SeatWatcher:
+    """按关键字批量查询余量，对比上次快照，只为新出现空位的教学班装填提交。"""
+
+    def __init__(self, student_code: str, elective_batch_code: str, proxies: Dict[str, str] | None,
+                 limiter: AdaptiveRateLimiter, conf: Dict[str, Any]):
+        cfg = dict(_DEFAULTS)
+        user_cfg = conf.get("WATCH") or {}
+        if isinstance(user_cfg, dict):
+            cfg.update({str(k).upper(): v for k, v in user_cfg.items()})
+        self.interval = float(cfg["INTERVAL"])
+        self.page_size = int(cfg["PAGE_SIZE"])
+        self.max_pages = int(cfg["MAX_PAGES"])
+        self.keywords: Dict[str, str] = {str(k): str(v) for k, v in (cfg["KEYWORDS"] or {}).items()}
+
+        self.student_code = student_code
+        self.elective_batch_code = elective_batch_code
+        self.proxies = proxies
+        self.limiter = limiter
+        self._last: Dict[str, Seats] = {}   # 上次快照
+        self._armed: Set[str] = set()
+        self._warned: Set[str] = set()
+
+    def keyword(self, course: Course) -> str:
+        cid, remark = course[0], course[3]
+        return self.keywords.get(cid) or remark.split("/")[0].strip() or cid
+
+    def _query(self, keyword: str, page: int, creds: Credentials):
+        """查询一页，返回 (items, is_last)；网络错误返回 None，会话失效抛出 SessionExpired。"""
+        token = self.limiter.acquire()
+        sent = time.time()
+        try:
+            result = query_course_page(
+                self.student_code, self.elective_batch_code, keyword, page,
+                creds.cookies, creds.headers, self.proxies, page_size=self.page_size,
+            )
+        except Exception as e:
+            self.limiter.release(token, False, time.time() - sent)
+            print(f"    [余量查询失败] {keyword}: {e}")
+            return None
+        self.limiter.release(token, True, time.time() - sent)
+        if result is None:
+            raise SessionExpired(keyword)
+        return result
+
+    def snapshot(self, courses: List[Course],
+                 creds: Credentials) -> Tuple[Dict[str, Seats | None], Set[str]]:
+        """查询一轮，返回 ({teachingClassId: Seats}, 状态未知的 teachingClassId)。
+
+        找到但字段无法解析的为 None；查询失败、没能确认在不在搜索结果中的归入状态未知；
+        查询成功但没找到的两者都不在。
+        """
+        groups: Dict[str, Set[str]] = {}
+        for c in courses:
+            groups.setdefault(self.keyword(c), set()).add(c[0])
+
+        found: Dict[str, Seats | None] = {}
+        unknown: Set[str] = set()
+        for keyword, cids in groups.items():
+            for page in range(self.max_pages):
+                result = self._query(keyword, page, creds)
+                if result is None:
+                    unknown |= cids - found.keys()
+                    break
+                items, is_last = result
+                for item in items:
+                    cid = str(item.get("teachingClassID") or "")
+                    if cid in cids:
+                        found[cid] = parse_seats(item)
+                if is_last or cids.issubset(found):
+                    break
+        return found, unknown
+
+    def sweep(self, courses: List[Course], creds: Credentials) -> List[Course]:
+        """刷新快照并应用变化，返回本次装填、应当提交的课程（取出即消耗）。
+
+        会话失效时抛出 SessionExpired。
+        """
+        found, unknown = self.snapshot(courses, creds)
+        for c in courses:
+            cid = c[0]
+            if cid in unknown:
+                # 查询失败，本轮余量未知：照常提交，不漏掉可能出现的空位
+                self._armed.add(cid)
+                continue
+            if cid not in found:
+                # 搜索不到时退化为常规模式：每轮都提交
+                self._warn(cid, f"    ⚠️ [{cid}] 未在关键字 \"{self.keyword(c)}\" 的搜索结果中找到，"
+                                "按常规模式提交，可在 xk.conf WATCH.KEYWORDS 中指定关键字")
+                self._armed.add(cid)
+                continue
+            seats = found[cid]
+            if seats is None:
+                # 拿不到人数时退化为常规模式：每轮都提交
+                self._warn(cid, f"    ⚠️ [{cid}] 搜索结果中没有已选人数 / 容量字段，按常规模式提交")
+                self._armed.add(cid)
+                continue
+            if cid in self._last and self._last[cid] == seats:
+                continue
+            old = self._last.get(cid)
+            self._last[cid] = seats
+            emit("seats", user=self.student_code, course=cid, selected=seats.selected,
+                 capacity=seats.capacity, open=seats.open)
+            before = f"{old.selected}/{old.capacity} → " if old else ""
+            if seats.open:
+                print(f"    👀 [{cid}] 已选 {before}{seats.selected}/{seats.capacity}，有空位")
+                self._armed.add(cid)
+            else:
+                print(f"    👀 [{cid}] 已选 {before}{seats.selected}/{seats.capacity}")
+                self._armed.discard(cid)
+
+        armed = [c for c in courses if c[0] in self._armed]
+        self._armed.clear()
+        return armed
+
+    def rearm(self, course: Course) -> None:
+        """提交或轮询没有得到服务器结论（QoS / 网络错误 / 会话过期 / 轮询超时），下次照常提交。"""
+        self._armed.add(course[0])
+
+    def _warn(self, cid: str, message: str) -> None:
+        if cid not in self._warned:
+            self._warned.add(cid)
+            print(message)
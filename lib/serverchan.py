@@ -24,12 +24,15 @@ def _safe_load_config():
         return {}
 
 
-def send_serverchan_notification(title: str, desp: str = "") -> bool:
-    """通知是附加功能：任何错误都吞掉，不抛异常。"""
+def send_serverchan_notification(title: str, desp: str = "", conf: dict | None = None) -> bool:
+    """通知是附加功能：任何错误都吞掉，不抛异常。
+
+    SCT_KEY / SCT_OPTIONS 取自 conf（多账号模式下为该账号合并后的配置），默认读取 config/xk.conf。
+    """
     if not sc_send:
         return False
 
-    config = _safe_load_config()
+    config = conf if conf is not None else _safe_load_config()
     sendkey = (config.get("SCT_KEY") or "").strip()
     if not sendkey:
         return False
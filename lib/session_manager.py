@@ -5,33 +5,59 @@
   - session_manager.py: 管理登录态生命周期（缓存/验证/刷新）
   - authenticator.py: 执行登录流程
 
-对外接口: acquire_session(force_refresh=False) -> (cookies_dict, token) or (None, None)
+对外接口:
+  acquire_session(force_refresh=False, *, conf=None, cache_file=None, lock_file=None)
+      -> (cookies_dict, token) or (None, None)
+  SessionManager(conf=None, cache_file=None, lock_file=None)
+      内存中的登录态：后台定时校验、失效才重登，抢课循环只读内存
+多账号模式（xk_daemon.py）为每个账号传入各自的配置、缓存文件与锁文件。
 """
 
 import json
 import os
+import threading
 import time
+from typing import Callable, Dict, List, NamedTuple
 
-import requests
 import urllib3
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
 from lib.common import (
     SESSION_CACHE_FILE,
     LOCK_FILE,
     load_xk_config,
     build_proxies,
+    get_http_pool,
+    build_headers,
 )
+from lib.event_log import emit
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 # Session 本地缓存时间（秒），超过后强制联网检查
 CACHE_TTL = 1800
 
+# SessionManager：后台校验间隔、失败后重试间隔（秒）
+CHECK_INTERVAL = 300
+RETRY_DELAY = 15
+SESSION_WAIT = 60      # 会话失效后，抢课循环最多等待新凭证的时长（秒）
+
+STUDENT_INFO_URL = "https://xk.nju.edu.cn/xsxkapp/sys/xsxkapp/student/{}.do"
+
+
+def _is_session_active(cookies, token, student_id, proxies=None, quiet=False):
+    """通过请求学生信息接口验证 Session 是否有效。
 
-def _is_session_active(cookies, token, student_id, proxies=None):
-    """通过请求学生信息接口验证 Session 是否有效。"""
-    url = f"https://xk.nju.edu.cn/xsxkapp/sys/xsxkapp/student/{student_id}.do"
-    print(f">>> 正在验证登录状态...")
+    quiet=True（SessionManager 的后台定时校验）时不打印，结果记一条 session 事件。
+    """
+    url = STUDENT_INFO_URL.format(student_id)
+    log = (lambda _msg: None) if quiet else print
+    log(f">>> 正在验证登录状态...")
 
     headers = {
         "token": token,
@@ -41,34 +67,110 @@ def _is_session_active(cookies, token, student_id, proxies=None):
     }
 
     try:
-        res = requests.post(url, cookies=cookies, headers=headers,
-                            timeout=5, verify=False, proxies=proxies)
+        res = get_http_pool().post(url, cookies=cookies, headers=headers,
+                                   timeout=5, proxies=proxies)
         if res.status_code == 200:
             res_json = res.json()
             if res_json.get("msg") == "查询学生基础信息成功":
-                print(">>> ✅ 登录状态有效")
+                log(">>> ✅ 登录状态有效")
+                if quiet:
+                    emit("session", user=str(student_id), action="check", ok=True)
                 return True
-            else:
-                print(f">>> ❌ 验证失败，业务返回: {res_json.get('msg')}")
+            reason = f"业务返回: {res_json.get('msg')}"
         else:
-            print(f">>> ❌ 验证失败，HTTP状态码: {res.status_code}")
+            reason = f"HTTP状态码: {res.status_code}"
+        log(f">>> ❌ 验证失败，{reason}")
     except Exception as e:
-        print(f">>> ⚠️ 验证请求异常: {e}")
+        reason = f"请求异常: {e}"
+        log(f">>> ⚠️ 验证{reason}")
 
+    if quiet:
+        emit("session", user=str(student_id), action="check", ok=False, msg=reason)
     return False
 
 
-def acquire_session(force_refresh=False):
+class _LoginLock:
+    """跨进程登录锁：fcntl.flock（Windows 下 msvcrt.locking）。
+
+    锁随文件描述符存在，进程退出（包括崩溃）时由操作系统释放，不需要死锁超时；
+    等待方阻塞在加锁调用上，持有方一释放就立即被唤醒。锁文件本身不删除。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+
+    def _try_lock(self, blocking: bool) -> bool:
+        if fcntl is not None:
+            flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+            try:
+                fcntl.flock(self._fd, flags)
+                return True
+            except BlockingIOError:
+                return False
+        while True:
+            try:
+                # LK_LOCK 自身会重试 10 秒后报错，阻塞模式下继续等
+                msvcrt.locking(self._fd, msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+                return True
+            except OSError:
+                if not blocking:
+                    return False
+
+    def __enter__(self):
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        if not self._try_lock(blocking=False):
+            print(">>> 等待其他进程登录中...")
+            t0 = time.monotonic()
+            self._try_lock(blocking=True)
+            print(f">>> 其他进程登录结束 ({time.monotonic() - t0:.1f}s)")
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+
+def _read_cache(cache_file: str) -> dict | None:
+    try:
+        with open(cache_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if data.get("token") else None
+    except Exception:
+        return None
+
+
+def _write_cache(cache_file: str, cookies: Dict[str, str], token: str) -> None:
+    # 先写临时文件再替换，读方不会读到半个 JSON
+    tmp = f"{cache_file}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"cookies": cookies, "token": token, "timestamp": time.time()}, f)
+    os.replace(tmp, cache_file)
+
+
+def acquire_session(force_refresh=False, *, conf=None, cache_file=None, lock_file=None):
     """获取可用的 Session 和 Token。
 
     1. 优先读取缓存并验证
-    2. 缓存无效时加锁并调用 authenticator 重新登录
+    2. 缓存无效时加锁并调用 authenticator 重新登录；
+       等锁期间若其他进程已写入新缓存（timestamp 变化），直接使用，不重复登录
+
+    conf / cache_file / lock_file 默认为 config/xk.conf、session_cache.json、login.lock。
 
     Returns:
         (cookies_dict, token) 或 (None, None)
     """
+    cache_file = cache_file or SESSION_CACHE_FILE
+    lock_file = lock_file or LOCK_FILE
     try:
-        config = load_xk_config()
+        config = conf if conf is not None else load_xk_config()
         student_id = config["USER"]
         proxies = build_proxies(config.get("PROXY"))
     except Exception as e:
@@ -76,69 +178,216 @@ def acquire_session(force_refresh=False):
         return None, None
 
     # --- 1. 尝试读取并验证缓存 ---
-    if not force_refresh and os.path.exists(SESSION_CACHE_FILE):
-        try:
-            with open(SESSION_CACHE_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
-
-            if time.time() - data.get("timestamp", 0) < CACHE_TTL:
-                if _is_session_active(data["cookies"], data["token"], student_id, proxies=proxies):
-                    return data["cookies"], data["token"]
-                else:
-                    print(">>> 缓存校验未通过，准备重登...")
-            else:
-                print(">>> 缓存时间已超时，准备重登...")
-        except Exception:
+    data = _read_cache(cache_file)
+    if not force_refresh and os.path.exists(cache_file):
+        if data is None:
             print(">>> 缓存文件读取出错，准备重登...")
+        elif time.time() - data.get("timestamp", 0) < CACHE_TTL:
+            if _is_session_active(data["cookies"], data["token"], student_id, proxies=proxies):
+                return data["cookies"], data["token"]
+            print(">>> 缓存校验未通过，准备重登...")
+        else:
+            print(">>> 缓存时间已超时，准备重登...")
+    seen = data.get("timestamp", 0) if data else 0
 
     # --- 2. 加锁登录 ---
-    wait_count = 0
-    while os.path.exists(LOCK_FILE):
-        # 死锁保护
-        if time.time() - os.path.getmtime(LOCK_FILE) > 180:
-            print(">>> ⚠️ 检测到死锁，强制重置...")
-            os.remove(LOCK_FILE)
-            break
-
-        print(f">>> 等待其他进程登录中... ({wait_count}s)")
-        time.sleep(1)
-        wait_count += 1
-
-        # 等待期间若别人登好了，直接用
-        if os.path.exists(SESSION_CACHE_FILE) and wait_count % 2 == 0:
-            return acquire_session(force_refresh=False)
-
-    # 创建锁
-    with open(LOCK_FILE, "w") as f:
-        f.write("LOCKED")
-
     try:
-        print(">>> 🔄 调用认证器执行登录...")
+        with _LoginLock(lock_file):
+            # 排队期间别人已经登好了：新缓存刚写入，无需再验证
+            data = _read_cache(cache_file)
+            if data and data.get("timestamp", 0) > seen:
+                print(">>> ✅ 使用其他进程刚写入的 Session")
+                return data["cookies"], data["token"]
 
-        # 延迟导入避免循环依赖
-        from lib.authenticator import perform_login
+            print(">>> 🔄 调用认证器执行登录...")
 
-        cookies, token = perform_login()
-        if cookies and token:
-            with open(SESSION_CACHE_FILE, "w", encoding="utf-8") as f:
-                json.dump({
-                    "cookies": cookies,
-                    "token": token,
-                    "timestamp": time.time(),
-                }, f)
+            # 延迟导入避免循环依赖
+            from lib.authenticator import perform_login
+
+            cookies, token = perform_login(conf)
+            if not (cookies and token):
+                raise Exception("登录失败，未获取到凭证")
+            _write_cache(cache_file, cookies, token)
             print(">>> ✅ 新 Session 已保存")
             return cookies, token
-        else:
-            raise Exception("登录失败，未获取到凭证")
 
     except Exception as e:
         print(f"❌ 登录过程发生错误: {e}")
         return None, None
 
-    finally:
-        if os.path.exists(LOCK_FILE):
-            os.remove(LOCK_FILE)
+def _read_cache_timestamp(cache_file: str) -> float:
+    data = _read_cache(cache_file)
+    return float(data.get("timestamp", 0)) if data else 0.0
+
+
+class Credentials(NamedTuple):
+    cookies: Dict[str, str]
+    token: str
+    headers: Dict[str, str]
+    generation: int      # 每次换新凭证 +1，用于判断"是否已经有人刷新过"
+
+
+class SessionManager:
+    """内存中的登录态，由后台线程维护。
+
+    - get() 只读内存，从不阻塞在网络上
+    - 每 CHECK_INTERVAL 秒后台校验一次；其他进程写了更新的缓存文件则直接采用
+    - 只在校验未通过或抢课循环报告过期时重新登录：同一账号再登录一次会把现有会话顶掉
+      （见 lib/authenticator.py），不做到期前的提前重登
+    - 抢课循环发现会话过期时调用 report_expired(generation)，后台立即刷新；
+      需要等新凭证时用 wait_newer(generation, timeout)
+    """
+
+    def __init__(self, conf: dict | None = None, cache_file: str | None = None,
+                 lock_file: str | None = None, name: str = ""):
+        self.conf = conf
+        self.cache_file = cache_file or SESSION_CACHE_FILE
+        self.lock_file = lock_file or LOCK_FILE
+        self.name = name
+        self._creds: Credentials | None = None
+        self._issued_at = 0.0          # 当前凭证的登录时间（缓存文件 timestamp）
+        self._expired_gen = -1         # 被报告过期的 generation
+        self._cond = threading.Condition()
+        self._listeners: List[Callable[[Credentials], None]] = []
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name=f"session-{name or 'main'}")
+
+    # ---------- 对外 ----------
+
+    def start(self, wait: bool = True) -> bool:
+        """获取首份凭证并启动后台线程。wait=False 时首份凭证也在后台获取。"""
+        ok = self._load(force=False) if wait else True
+        self._thread.start()
+        return ok
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def add_listener(self, callback: Callable[[Credentials], None]) -> None:
+        """凭证更新后回调（在后台线程中调用）；已有凭证时立即回调一次。"""
+        with self._cond:
+            self._listeners.append(callback)
+            creds = self._creds
+        if creds is not None:
+            callback(creds)
+
+    def get(self) -> Credentials | None:
+        with self._cond:
+            return self._creds
+
+    def report_expired(self, generation: int) -> None:
+        """报告某一代凭证已被服务端判定失效；同一代只触发一次刷新。"""
+        with self._cond:
+            if self._creds is None or generation != self._creds.generation:
+                return
+            self._expired_gen = max(self._expired_gen, generation)
+            self._cond.notify_all()
+        emit("session", user=self.name or None, action="expired", generation=generation)
+
+    def wait_newer(self, generation: int, timeout: float = SESSION_WAIT) -> bool:
+        """等待出现比 generation 更新的凭证，超时返回 False。"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._creds is None or self._creds.generation <= generation:
+                left = deadline - time.monotonic()
+                if left <= 0 or self._stopped:
+                    return False
+                self._cond.wait(left)
+            return True
+
+    # ---------- 后台 ----------
+
+    def _tag(self) -> str:
+        return f"[{self.name}] " if self.name else ""
+
+    def _install(self, cookies: Dict[str, str], token: str) -> None:
+        issued = _read_cache_timestamp(self.cache_file) or time.time()
+        with self._cond:
+            gen = self._creds.generation + 1 if self._creds else 1
+            creds = self._creds = Credentials(cookies, token, build_headers(token), gen)
+            self._issued_at = issued
+            listeners = list(self._listeners)
+            self._cond.notify_all()
+        emit("session", user=self.name or None, action="install", generation=gen)
+        for cb in listeners:
+            try:
+                cb(creds)
+            except Exception as e:
+                print(f">>> ⚠️ {self._tag()}凭证更新回调异常: {e}")
+
+    def _load(self, force: bool) -> bool:
+        cookies, token = acquire_session(force_refresh=force, conf=self.conf,
+                                         cache_file=self.cache_file, lock_file=self.lock_file)
+        if cookies and token:
+            self._install(cookies, token)
+            return True
+        return False
+
+    def _adopt_newer_cache(self, conf: dict) -> bool | None:
+        """其他进程已写入更新的缓存：校验后直接采用，免去一次登录。
+
+        没有更新的缓存返回 None；有但校验未通过返回 False，此时不在这里登录，
+        由调用方强制登录一次，保证每个周期最多一次 login.do。
+        """
+        data = _read_cache(self.cache_file)
+        if not data or float(data.get("timestamp", 0)) <= self._issued_at:
+            return None
+        if not _is_session_active(data["cookies"], data["token"], conf["USER"],
+                                  build_proxies(conf.get("PROXY")), quiet=True):
+            return False
+        self._install(data["cookies"], data["token"])
+        return True
+
+    def _needs_refresh(self) -> bool:
+        return self._creds is None or self._expired_gen >= self._creds.generation
+
+    def _next_wakeup(self, last_check: float, retry_at: float) -> float:
+        if self._needs_refresh():
+            return retry_at
+        return max(last_check + CHECK_INTERVAL, retry_at)
+
+    def _run(self) -> None:
+        last_check = time.time()
+        retry_at = 0.0
+        while True:
+            with self._cond:
+                while not self._stopped:
+                    left = self._next_wakeup(last_check, retry_at) - time.time()
+                    if left <= 0:
+                        break
+                    self._cond.wait(left)
+                if self._stopped:
+                    return
+                creds = self._creds
+                expired = self._needs_refresh()
+
+            try:
+                # xk.conf 可能在运行中被改坏，异常不能让刷新线程退出
+                conf = self.conf or load_xk_config()
+                if expired:
+                    reason = "首次获取凭证" if creds is None else "会话已失效"
+                    print(f">>> {self._tag()}{reason}，后台刷新登录态...")
+                    adopted = self._adopt_newer_cache(conf)
+                    ok = adopted or self._load(force=creds is not None or adopted is False)
+                else:
+                    last_check = time.time()
+                    if self._adopt_newer_cache(conf):
+                        continue
+                    if _is_session_active(creds.cookies, creds.token, conf["USER"],
+                                          build_proxies(conf.get("PROXY")), quiet=True):
+                        continue
+                    print(f">>> {self._tag()}后台校验未通过，重新登录...")
+                    ok = self._load(force=True)
+            except Exception as e:
+                print(f">>> ⚠️ {self._tag()}后台刷新异常: {e}")
+                ok = False
 
+            retry_at = 0.0 if ok else time.time() + RETRY_DELAY
+            if not ok:
+                print(f">>> ❌ {self._tag()}刷新登录态失败，{RETRY_DELAY}s 后重试")
 
 if __name__ == "__main__":
     print(">>> 开始测试 session_manager.py ...")
@@ -0,0 +1,240 @@
+"""抢课事件日志分析：汇总 logs/*.jsonl（lib/event_log.py 写出）中的延迟分布与成功率。
+
+报告内容：
+  - 概览：时间跨度、各类事件条数
+  - 提交延迟 latency_ms 的 p50 / p90 / p99 / max，总体与按 outcome 分组
+  - 轮询结果：各 code 条数，从登记到出结果的 elapsed_ms 分位数
+  - 成功率随时间：按 --bucket 秒分桶的提交数、入队率、QoS、抢到门数（累计）
+  - 按课程：提交次数、入队 / QoS 次数、首次抢到的时刻
+  - 登录态更新与退避：换凭证次数、报告失效次数、退避总时长、自适应限速的减速次数
+  - 非入队返回中最常见的服务器消息
+
+用法：
+  python tools/analyze_run.py                       # 分析 logs/ 下最新的一份
+  python tools/analyze_run.py logs/xk_quick-20260220-122955-1234.jsonl
+  python tools/analyze_run.py logs/ --bucket 5      # 合并目录下全部日志
+"""
+
+import argparse
+import glob
+import json
+import math
+import os
+import sys
+from collections import Counter, defaultdict
+from typing import Any, Dict, List
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from lib.event_log import DEFAULT_LOG_DIR
+
+Event = Dict[str, Any]
+
+
+def _resolve_paths(paths: List[str]) -> List[str]:
+    """文件原样返回，目录展开为其中的 *.jsonl；未指定时取默认日志目录中最新的一份。"""
+    if not paths:
+        files = glob.glob(os.path.join(PROJECT_ROOT, DEFAULT_LOG_DIR, "*.jsonl"))
+        return [max(files, key=os.path.getmtime)] if files else []
+    out = []
+    for p in paths:
+        if os.path.isdir(p):
+            out.extend(sorted(glob.glob(os.path.join(p, "*.jsonl"))))
+        else:
+            out.append(p)
+    return out
+
+
+def load_events(files: List[str]) -> List[Event]:
+    """读取并按时间排序；损坏的行（进程被杀时可能写了一半）跳过。"""
+    events, bad = [], 0
+    for path in files:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    bad += 1
+                    continue
+                if isinstance(rec, dict) and "ts" in rec and "event" in rec:
+                    events.append(rec)
+    if bad:
+        print(f"⚠️ 跳过 {bad} 行无法解析的记录")
+    events.sort(key=lambda e: e["ts"])
+    return events
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    """线性插值分位数（与 numpy.percentile 默认方法一致），q 取 0~100。"""
+    pos = (len(sorted_values) - 1) * q / 100
+    lo, hi = math.floor(pos), math.ceil(pos)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+def _dist(values: List[float]) -> str:
+    if not values:
+        return "—"
+    v = sorted(values)
+    return (f"n={len(v):<5d} p50 {_percentile(v, 50):8.1f}ms  p90 {_percentile(v, 90):8.1f}ms  "
+            f"p99 {_percentile(v, 99):8.1f}ms  max {v[-1]:8.1f}ms")
+
+
+def report_overview(events: List[Event], files: List[str]) -> None:
+    span = events[-1]["ts"] - events[0]["ts"]
+    counts = Counter(e["event"] for e in events)
+    users = sorted({str(e["user"]) for e in events if e.get("user")})
+    print(f">>> {len(files)} 份日志, {len(events)} 条事件, 时间跨度 {span:.1f}s")
+    if users:
+        print(f"    账号: {', '.join(users)}")
+    print("    " + ", ".join(f"{k}×{v}" for k, v in counts.most_common()))
+
+
+def report_latency(submits: List[Event]) -> None:
+    print("\n>>> 提交延迟 (volunteer.do 发出 → 收到响应)")
+    print(f"  {'全部':<10s} {_dist([e['latency_ms'] for e in submits])}")
+    by_outcome: Dict[str, List[float]] = defaultdict(list)
+    for e in submits:
+        by_outcome[e.get("outcome", "?")].append(e["latency_ms"])
+    for outcome, values in sorted(by_outcome.items(), key=lambda kv: -len(kv[1])):
+        share = len(values) / len(submits) * 100
+        print(f"  {outcome:<10s} {_dist(values)}  ({share:.1f}%)")
+    fire = [e["latency_ms"] for e in submits if e.get("wave") == "fire"]
+    if fire:
+        print(f"  {'定时首波':<8s} {_dist(fire)}")
+
+
+def report_polls(polls: List[Event]) -> None:
+    print("\n>>> 轮询结果 (登记票据 → 拿到结果)")
+    by_code: Dict[str, List[Event]] = defaultdict(list)
+    for e in polls:
+        by_code[str(e.get("code"))].append(e)
+    labels = {"1": "成功", "-1": "失败", "timeout": "超时", "error": "异常"}
+    for code, items in sorted(by_code.items(), key=lambda kv: -len(kv[1])):
+        attempts = sum(e.get("attempts", 0) for e in items) / len(items)
+        label = f"{code}({labels.get(code, '其他')})"
+        print(f"  {label:<12s} {_dist([e['elapsed_ms'] for e in items])}  平均查询 {attempts:.1f} 次")
+
+
+def report_timeline(events: List[Event], bucket: float) -> None:
+    print(f"\n>>> 成功率随时间 (每 {bucket:g}s 一桶，时间相对第一条事件)")
+    t0 = events[0]["ts"]
+    rows: Dict[int, Counter] = defaultdict(Counter)
+    for e in events:
+        k = int((e["ts"] - t0) // bucket)
+        if e["event"] == "submit":
+            rows[k]["submit"] += 1
+            rows[k][e.get("outcome", "?")] += 1
+        elif e["event"] == "poll" and str(e.get("code")) == "1":
+            rows[k]["success"] += 1
+    if not rows:
+        print("  —")
+        return
+
+    print(f"  {'时间':>13s} {'提交':>5s} {'入队率':>7s} {'QoS':>5s} {'错误':>5s} {'过期':>5s} {'抢到':>5s} {'累计':>5s}")
+    total = 0
+    digits = 0 if float(bucket).is_integer() else 1
+    for k in range(max(rows) + 1):
+        c = rows.get(k)
+        if not c:
+            continue
+        total += c["success"]
+        rate = f"{c['queued'] / c['submit'] * 100:.0f}%" if c["submit"] else "—"
+        errors = c["error"] + c["nonjson"]
+        print(f"  {k * bucket:6.{digits}f}-{(k + 1) * bucket:<6.{digits}f} {c['submit']:5d} {rate:>7s} {c['qos']:5d} "
+              f"{errors:5d} {c['expired']:5d} {c['success']:5d} {total:5d}")
+
+
+def report_courses(events: List[Event]) -> None:
+    print("\n>>> 按课程")
+    t0 = events[0]["ts"]
+    stats: Dict[tuple, Counter] = defaultdict(Counter)
+    first_success: Dict[tuple, float] = {}
+    for e in events:
+        if "course" not in e:
+            continue
+        key = (e.get("user") or "", e["course"])
+        if e["event"] == "submit":
+            stats[key]["submit"] += 1
+            stats[key][e.get("outcome", "?")] += 1
+        elif e["event"] == "poll":
+            stats[key]["poll_" + str(e.get("code"))] += 1
+            if str(e.get("code")) == "1":
+                first_success.setdefault(key, e["ts"] - t0)
+
+    multi_user = len({u for u, _ in stats}) > 1
+    for key in sorted(stats, key=lambda k: (k not in first_success, first_success.get(k, 0), k)):
+        c = stats[key]
+        name = f"{key[0]}/{key[1]}" if multi_user else key[1]
+        got = f"抢到 @ +{first_success[key]:.1f}s" if key in first_success else "未抢到"
+        print(f"  {name:<24s} 提交 {c['submit']:4d}  入队 {c['queued']:4d}  QoS {c['qos']:4d}  "
+              f"选课失败 {c['poll_-1']:3d}  {got}")
+
+
+def report_session_and_backoff(events: List[Event]) -> None:
+    sessions = Counter(e.get("action") for e in events if e["event"] == "session")
+    backoffs: Dict[str, List[float]] = defaultdict(list)
+    for e in events:
+        if e["event"] == "backoff":
+            backoffs[e.get("reason", "?")].append(float(e.get("delay", 0)))
+    print("\n>>> 登录态与退避")
+    checks_failed = sum(1 for e in events if e["event"] == "session" and e.get("action") == "check"
+                        and not e.get("ok"))
+    print(f"  凭证就绪 {sessions['install']} 次, 报告失效 {sessions['expired']} 次, "
+          f"后台校验 {sessions['check']} 次（未通过 {checks_failed} 次）")
+    for reason, delays in sorted(backoffs.items()):
+        label = {"qos": "QoS 退避", "round": "轮间等待"}.get(reason, reason)
+        print(f"  {label}: {len(delays)} 次, 共 {sum(delays):.1f}s, 最长 {max(delays):.1f}s")
+    rates = [e for e in events if e["event"] == "rate"]
+    if rates:
+        reasons = Counter(e.get("reason", "?") for e in rates)
+        worst = max(float(e.get("interval", 0)) for e in rates)
+        print(f"  限速减速: {len(rates)} 次 ({', '.join(f'{k}×{v}' for k, v in reasons.most_common())}), "
+              f"最大间隔 {worst:.2f}s, 最终并发 {rates[-1].get('concurrency')}")
+
+
+def report_messages(submits: List[Event], top: int) -> None:
+    msgs = Counter(str(e.get("msg") or "")[:60] for e in submits if e.get("outcome") != "queued")
+    msgs.pop("", None)
+    if not msgs:
+        return
+    print(f"\n>>> 非入队返回中最常见的消息 (前 {top})")
+    for msg, n in msgs.most_common(top):
+        print(f"  {n:5d}  {msg}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="抢课事件日志分析")
+    parser.add_argument("paths", nargs="*", help="日志文件或目录；不填则取 logs/ 下最新的一份")
+    parser.add_argument("--bucket", type=float, default=10.0, help="成功率时间线的分桶宽度(秒)")
+    parser.add_argument("--top", type=int, default=5, help="列出最常见的服务器消息条数")
+    args = parser.parse_args()
+
+    files = _resolve_paths(args.paths)
+    if not files:
+        print(f"❌ 没有找到事件日志（默认目录 {DEFAULT_LOG_DIR}/）")
+        sys.exit(1)
+    events = load_events(files)
+    if not events:
+        print("❌ 日志中没有事件")
+        sys.exit(1)
+
+    submits = [e for e in events if e["event"] == "submit" and "latency_ms" in e]
+    polls = [e for e in events if e["event"] == "poll" and "elapsed_ms" in e]
+
+    report_overview(events, files)
+    if submits:
+        report_latency(submits)
+    if polls:
+        report_polls(polls)
+    report_timeline(events, args.bucket)
+    report_courses(events)
+    report_session_and_backoff(events)
+    report_messages(submits, args.top)
+
+
+if __name__ == "__main__":
+    main()
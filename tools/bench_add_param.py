@@ -0,0 +1,63 @@
+"""addParam 加密微基准：encrypt_add_param vs 预计算缓存 encrypt_select_param。
+
+先校验两者对相同时间戳输出逐字节一致，再各跑 N 次比较耗时。
+
+用法：
+  python tools/bench_add_param.py
+  python tools/bench_add_param.py -n 100000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from lib.common import build_select_payload, encrypt_add_param, encrypt_select_param
+
+STUDENT_CODE = "221220000"
+BATCH_CODE = "a1b2c3d4e5f60718293a4b5c6d7e8f90"
+COURSES = [
+    ("2025202621800143001", "1", "ZY", ""),
+    ("2025202622200010002", "12", "KZY", ""),
+    ("2025202620000820101", "6,7", "GG02", ""),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="addParam 加密微基准")
+    parser.add_argument("-n", type=int, default=10000, help="每种实现的调用次数")
+    args = parser.parse_args()
+
+    for course in COURSES:
+        for ts in (0, 1700000000000, int(time.time() * 1000)):
+            old = encrypt_add_param(build_select_payload(STUDENT_CODE, BATCH_CODE, course), timestamp=ts)
+            new = encrypt_select_param(STUDENT_CODE, BATCH_CODE, course, timestamp=ts)
+            if old != new:
+                print(f"❌ 输出不一致: course={course}, ts={ts}")
+                sys.exit(1)
+    print(">>> 输出一致性校验通过")
+
+    def _old(course):
+        return encrypt_add_param(build_select_payload(STUDENT_CODE, BATCH_CODE, course))
+
+    def _new(course):
+        return encrypt_select_param(STUDENT_CODE, BATCH_CODE, course)
+
+    results = {}
+    for name, fn in (("encrypt_add_param", _old), ("encrypt_select_param", _new)):
+        t0 = time.perf_counter()
+        for i in range(args.n):
+            fn(COURSES[i % len(COURSES)])
+        results[name] = time.perf_counter() - t0
+        print(f"  {name:<22s} {args.n} 次: {results[name] * 1000:8.1f}ms  "
+              f"({results[name] / args.n * 1e6:.2f}µs/次)")
+
+    speedup = results["encrypt_add_param"] / results["encrypt_select_param"]
+    print(f">>> 加速比: {speedup:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
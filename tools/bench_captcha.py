@@ -0,0 +1,486 @@
+"""验证码求解基准：对录制的验证码语料回放，不触碰线上登录接口。
+
+语料目录中可放：
+  *.gif / *.png / *.jpg     验证码图片
+  *.json                    vcode.do 原始响应（data.vode / data.vcode 为 data URI 或 base64）
+
+可选的标注文件（--truth）为 JSON：{"样本名(不含扩展名)": [[x, y], [x, y], [x, y], [x, y]], ...}，
+按标题字顺序给出正确点击位置；预测点与标注点距离都不超过 --tol 像素才算正确。
+
+报告内容：
+  - 各阶段耗时 segment / crop / infer / match / total 的 p50 / p95 / p99
+  - 峰值内存（Python 分配 tracemalloc + 进程最大常驻内存）
+  - 求解率（返回 4 个点的比例）、准确率（有标注的样本）
+  - 置信度阈值标定（有标注时）：按候选阈值估算每次成功登录所需的服务器往返，
+    给出 xk.conf 中 CAPTCHA.MIN_CONFIDENCE 的推荐值
+  - --workers N：用 N 个进程并行求解，测吞吐
+  - --segment：只比对上半区分割与原洪水填充实现的一致性与耗时
+  - --crop：只比对裁剪+缩放得到的模型输入张量与原逐字 PIL 实现是否逐像素一致及耗时
+
+用法：
+  python tools/bench_captcha.py captcha_corpus/
+  python tools/bench_captcha.py captcha_corpus/ --truth truth.json --repeat 3
+  python tools/bench_captcha.py captcha_corpus/ --truth truth.json --login-cost 3
+  python tools/bench_captcha.py captcha_corpus/ --workers 4
+  python tools/bench_captcha.py captcha_corpus/ --segment
+  python tools/bench_captcha.py captcha_corpus/ --crop
+"""
+
+import argparse
+import base64
+import io
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from lib import captcha
+
+IMAGE_EXTS = (".gif", ".png", ".jpg", ".jpeg")
+STAGES = ("segment", "crop", "infer", "match", "total")
+
+
+def load_corpus(corpus_dir: str) -> List[Tuple[str, Image.Image]]:
+    """读取语料目录，返回 [(样本名, RGB 图片), ...]（按文件名排序，样本名不含扩展名）。"""
+    samples = []
+    for name in sorted(os.listdir(corpus_dir)):
+        path = os.path.join(corpus_dir, name)
+        stem, ext = os.path.splitext(name)
+        ext = ext.lower()
+        try:
+            if ext in IMAGE_EXTS:
+                with open(path, "rb") as f:
+                    raw = f.read()
+            elif ext == ".json":
+                with open(path, "r", encoding="utf-8") as f:
+                    data = (json.load(f).get("data") or {})
+                b64 = data.get("vode") or data.get("vcode")
+                if not b64:
+                    continue
+                raw = base64.b64decode(b64.split(",")[1] if "," in b64 else b64)
+            else:
+                continue
+            samples.append((stem, Image.open(io.BytesIO(raw)).convert("RGB")))
+        except Exception as e:
+            print(f"⚠️ 跳过 {name}: {e}")
+    return samples
+
+
+def _percentiles(values: List[float]) -> str:
+    if not values:
+        return "—"
+    p50, p95, p99 = np.percentile(np.asarray(values) * 1000, [50, 95, 99])
+    return f"p50 {p50:7.2f}ms  p95 {p95:7.2f}ms  p99 {p99:7.2f}ms"
+
+
+def _is_correct(points, truth, tol: float) -> bool:
+    if not points or len(points) != len(truth):
+        return False
+    return all((px - tx) ** 2 + (py - ty) ** 2 <= tol * tol
+               for (px, py), (tx, ty) in zip(points, truth))
+
+
+# ---------------------------------------------------------------------------
+# 单进程：分阶段耗时 + 内存 + 准确率
+# ---------------------------------------------------------------------------
+
+def bench_solve(solver, samples, truth: Dict[str, list], tol: float, repeat: int,
+                login_cost: float) -> None:
+    stage_times: Dict[str, List[float]] = {s: [] for s in STAGES}
+    answers: Dict[str, Optional[list]] = {}
+    confidences: Dict[str, float] = {}
+
+    for _ in range(repeat):
+        for name, img in samples:
+            timings: Dict[str, float] = {}
+            t0 = time.perf_counter()
+            points, confidence = solver.solve_scored(img, timings=timings)
+            timings["total"] = time.perf_counter() - t0
+            for stage, sec in timings.items():
+                stage_times[stage].append(sec)
+            answers[name] = points
+            confidences[name] = confidence
+
+    # tracemalloc 会拖慢分配，单独再跑一轮测内存
+    tracemalloc.start()
+    for _, img in samples:
+        solver.solve(img)
+    _, py_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"\n>>> 分阶段耗时 ({len(samples)} 张 × {repeat} 轮)")
+    for stage in STAGES:
+        print(f"  {stage:<8s} {_percentiles(stage_times[stage])}")
+
+    print("\n>>> 内存")
+    print(f"  Python 分配峰值 (tracemalloc): {py_peak / 1024 / 1024:.1f} MiB")
+    if resource is not None:
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        rss_mib = rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+        print(f"  进程最大常驻内存 (含 ONNX Runtime): {rss_mib:.1f} MiB")
+
+    solved = sum(1 for p in answers.values() if p and len(p) == 4)
+    print("\n>>> 结果")
+    print(f"  求解率: {solved}/{len(answers)} ({solved / len(answers):.1%})")
+    labeled = [name for name in answers if name in truth]
+    if labeled:
+        correct = sum(1 for name in labeled if _is_correct(answers[name], truth[name], tol))
+        print(f"  准确率: {correct}/{len(labeled)} ({correct / len(labeled):.1%})，容差 {tol:.0f}px")
+        calibrate_threshold(
+            [(confidences[name], _is_correct(answers[name], truth[name], tol)) for name in labeled],
+            login_cost)
+
+
+# ---------------------------------------------------------------------------
+# 置信度阈值标定
+# ---------------------------------------------------------------------------
+
+def _round_trips_per_success(scored: List[Tuple[float, bool]], threshold: float,
+                             login_cost: float) -> Tuple[float, float, float]:
+    """阈值 threshold 下每次成功登录的期望往返：每张图 1 次 vcode.do，
+    通过阈值的再加 1 次 login.do（按 login_cost 计权，失败的 login.do 还会吃限流）。
+
+    返回 (通过率, 通过样本准确率, 期望往返)，无法成功时往返为 inf。
+    """
+    accepted = [ok for conf, ok in scored if conf >= threshold]
+    if not accepted:
+        return 0.0, 0.0, float("inf")
+    accept_rate = len(accepted) / len(scored)
+    precision = sum(accepted) / len(accepted)
+    if precision == 0:
+        return accept_rate, 0.0, float("inf")
+    return accept_rate, precision, (1 + login_cost * accept_rate) / (accept_rate * precision)
+
+
+def calibrate_threshold(scored: List[Tuple[float, bool]], login_cost: float) -> float:
+    """在样本置信度上枚举候选阈值，打印对比并返回期望往返最少的阈值。"""
+    candidates = sorted({0.0} | {conf for conf, _ in scored})
+    results = [(t, *_round_trips_per_success(scored, t, login_cost)) for t in candidates]
+    best = min(results, key=lambda r: (r[3], r[0]))
+
+    right = [conf for conf, ok in scored if ok]
+    wrong = [conf for conf, ok in scored if not ok]
+    print(f"\n>>> 置信度 (login.do 计 {login_cost:g} 次往返)")
+    if right:
+        print(f"  正确样本: 中位数 {statistics.median(right):.3g}，最小 {min(right):.3g}")
+    if wrong:
+        print(f"  错误样本: 中位数 {statistics.median(wrong):.3g}，最大 {max(wrong):.3g}")
+    # 只列出若干分位上的阈值和推荐值
+    rows = {0, results.index(best)} | {int(q * (len(results) - 1)) for q in (0.25, 0.5, 0.75, 0.9)}
+    for i in sorted(rows):
+        t, accept, precision, trips = results[i]
+        mark = "  ← 推荐" if results[i] is best else ""
+        print(f"  阈值 {t:<9.3g}: 通过 {accept:6.1%}  通过后准确 {precision:6.1%}  "
+              f"往返/成功 {trips:6.2f}{mark}")
+    print(f'  推荐配置: "CAPTCHA": {{"MIN_CONFIDENCE": {best[0]:.3g}}}')
+    return best[0]
+
+
+# ---------------------------------------------------------------------------
+# 多进程：吞吐
+# ---------------------------------------------------------------------------
+
+_WORKER_SOLVER = None
+
+
+def _init_worker(upper_path: str, title_path: Optional[str]) -> None:
+    global _WORKER_SOLVER
+    _WORKER_SOLVER = captcha._OnnxCaptchaSolver(upper_path, title_path)
+
+
+def _worker_solve(img: Image.Image):
+    return _WORKER_SOLVER.solve(img)
+
+
+def bench_throughput(upper_path: str, title_path: Optional[str], samples, workers: int, repeat: int) -> None:
+    images = [img for _, img in samples] * repeat
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(upper_path, title_path)) as pool:
+        # 每个进程先各跑一张，把模型加载/预热排除在计时之外
+        list(pool.map(_worker_solve, images[:workers]))
+        t0 = time.perf_counter()
+        list(pool.map(_worker_solve, images, chunksize=max(1, len(images) // (workers * 4))))
+        elapsed = time.perf_counter() - t0
+    print(f"\n>>> 吞吐 ({workers} 进程): {len(images)} 次求解 {elapsed:.2f}s，"
+          f"{len(images) / elapsed:.1f} 次/s")
+
+
+# ---------------------------------------------------------------------------
+# --segment：分割与原洪水填充实现比对
+# ---------------------------------------------------------------------------
+
+def _reference_connected_components(mask: np.ndarray, min_area: int = 25) -> List[dict]:
+    """原逐像素洪水填充，仅用于比对。"""
+    h, w = mask.shape
+    visited = np.zeros((h, w), dtype=np.uint8)
+    regions = []
+
+    for y in range(h):
+        for x in range(w):
+            if not mask[y, x] or visited[y, x]:
+                continue
+            stack = [(x, y)]
+            visited[y, x] = 1
+            pixels = []
+
+            while stack:
+                cx, cy = stack.pop()
+                pixels.append((cx, cy))
+                for ny in range(max(0, cy - 1), min(h, cy + 2)):
+                    for nx in range(max(0, cx - 1), min(w, cx + 2)):
+                        if not visited[ny, nx] and mask[ny, nx]:
+                            visited[ny, nx] = 1
+                            stack.append((nx, ny))
+
+            if len(pixels) < min_area:
+                continue
+
+            xs = [p[0] for p in pixels]
+            ys = [p[1] for p in pixels]
+            bw = max(xs) - min(xs) + 1
+            bh = max(ys) - min(ys) + 1
+            if bw < 6 or bh < 6:
+                continue
+            if bw / max(bh, 1) > 5 or bh / max(bw, 1) > 5:
+                continue
+
+            regions.append({
+                "center": (int(np.mean(xs)), int(np.mean(ys))),
+                "bbox": (min(xs), min(ys), max(xs) + 1, max(ys) + 1),
+                "area": len(pixels),
+            })
+
+    regions.sort(key=lambda r: -r["area"])
+    return regions
+
+
+def _segment_with(img: Image.Image, cc) -> List[dict]:
+    original = captcha._connected_components
+    captcha._connected_components = cc
+    try:
+        return captcha._segment_upper(img)
+    finally:
+        captcha._connected_components = original
+
+
+def bench_segment(samples, repeat: int) -> bool:
+    mismatches = 0
+    for name, img in samples:
+        if _segment_with(img, _reference_connected_components) != captcha._segment_upper(img):
+            print(f"❌ 分割结果不一致: {name}")
+            mismatches += 1
+    if mismatches:
+        return False
+    print(f">>> 分割结果一致 ({len(samples)} 张)")
+
+    timings = {"洪水填充(参考)": [], "行程+并查集": []}
+    for _ in range(repeat):
+        for _, img in samples:
+            t0 = time.perf_counter()
+            _segment_with(img, _reference_connected_components)
+            timings["洪水填充(参考)"].append(time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            captcha._segment_upper(img)
+            timings["行程+并查集"].append(time.perf_counter() - t0)
+
+    for label, values in timings.items():
+        print(f"  _segment_upper [{label}]: {_percentiles(values)}")
+    speedup = statistics.mean(timings["洪水填充(参考)"]) / statistics.mean(timings["行程+并查集"])
+    print(f">>> 加速比: {speedup:.1f}x")
+    return True
+
+
+# ---------------------------------------------------------------------------
+# --crop：裁剪+缩放与原逐字 PIL 实现比对
+# ---------------------------------------------------------------------------
+
+def _reference_crop_upper_char(arr: np.ndarray, cx: int, cy: int, search_half: int = 40,
+                               color_thresh: float = 80.0, pad: int = 4) -> Image.Image:
+    """原逐字裁剪（每次重算整幅前景掩码、整幅转 float32），仅用于比对。"""
+    H, W = min(captcha.UPPER_HEIGHT, arr.shape[0]), arr.shape[1]
+    arr_f = arr[:H].astype(np.float32)
+    fg = captcha._fg_mask(arr[:H])
+
+    sr = 4
+    sy1, sy2 = max(0, cy - sr), min(H, cy + sr)
+    sx1, sx2 = max(0, cx - sr), min(W, cx + sr)
+    center_fg = fg[sy1:sy2, sx1:sx2]
+    if center_fg.sum() < 3:
+        fg = captcha._fg_mask(arr[:H], sat_thr=0.08)
+        center_fg = fg[sy1:sy2, sx1:sx2]
+    if center_fg.sum() >= 3:
+        center_color = arr_f[sy1:sy2, sx1:sx2][center_fg].mean(axis=0)
+    else:
+        center_color = arr_f[cy, cx]
+
+    ax1, ay1 = max(0, cx - search_half), max(0, cy - search_half)
+    ax2, ay2 = min(W, cx + search_half), min(H, cy + search_half)
+    local = arr_f[ay1:ay2, ax1:ax2]
+    local_fg = fg[ay1:ay2, ax1:ax2]
+    color_dist = np.sqrt(((local - center_color) ** 2).sum(axis=-1))
+    char_mask = local_fg & (color_dist < color_thresh)
+
+    if char_mask.sum() < 10:
+        h2 = 25
+        by1, bx1 = max(0, cy - h2 - ay1), max(0, cx - h2 - ax1)
+        by2, bx2 = min(local.shape[0], cy + h2 - ay1), min(local.shape[1], cx + h2 - ax1)
+        char_mask = np.zeros_like(char_mask)
+        char_mask[by1:by2, bx1:bx2] = local_fg[by1:by2, bx1:bx2]
+
+    isolated = np.full_like(local, 220.0)
+    isolated[char_mask] = local[char_mask]
+
+    ys, xs = np.where(char_mask)
+    if len(xs) < 5:
+        half = 25
+        crop = arr[max(0, cy-half):min(H, cy+half), max(0, cx-half):min(W, cx+half)]
+        h, w = crop.shape[:2]
+        side = max(h, w)
+        canvas = np.full((side, side, 3), 220, dtype=np.uint8)
+        canvas[(side-h)//2:(side-h)//2+h, (side-w)//2:(side-w)//2+w] = crop
+        return Image.fromarray(canvas)
+
+    tx1, ty1 = max(0, int(xs.min()) - pad), max(0, int(ys.min()) - pad)
+    tx2 = min(isolated.shape[1], int(xs.max()) + 1 + pad)
+    ty2 = min(isolated.shape[0], int(ys.max()) + 1 + pad)
+    tight = isolated[ty1:ty2, tx1:tx2]
+    h, w = tight.shape[:2]
+    side = max(h, w)
+    canvas = np.full((side, side, 3), 220.0, dtype=np.float32)
+    canvas[(side-h)//2:(side-h)//2+h, (side-w)//2:(side-w)//2+w] = tight
+    return Image.fromarray(canvas.astype(np.uint8))
+
+
+def _reference_crop_title_chars(img: Image.Image) -> List[Image.Image]:
+    crops = []
+    for tx in captcha.TITLE_X_CENTERS:
+        x1, x2 = tx - captcha.TITLE_HALF_X, tx + captcha.TITLE_HALF_X
+        crop = img.crop((x1, captcha.TITLE_Y_TOP, x2, captcha.TITLE_Y_BOTTOM))
+        w, h = crop.size
+        side = max(w, h)
+        canvas = Image.new("RGB", (side, side), (0, 0, 0))
+        canvas.paste(crop, ((side - w) // 2, (side - h) // 2))
+        crops.append(canvas)
+    return crops
+
+
+def _reference_preprocess(imgs: List[Image.Image], size: int, norm: str) -> np.ndarray:
+    arr = np.stack([np.asarray(im.resize((size, size), Image.LANCZOS).convert("RGB"))
+                    for im in imgs]).astype(np.float32) / 255.0
+    preset = captcha._NORM_PRESETS.get(norm, captcha._NORM_PRESETS["imagenet"])
+    arr = (arr - preset["mean"]) / preset["std"]
+    return np.ascontiguousarray(arr.transpose(0, 3, 1, 2), dtype=np.float32)
+
+
+def _crop_stage_reference(img: Image.Image, centers, size: int, norm: str):
+    arr = np.array(img, dtype=np.uint8)
+    upper = [_reference_crop_upper_char(arr, cx, cy) for cx, cy in centers]
+    return (_reference_preprocess(upper, size, norm) if upper else None,
+            _reference_preprocess(_reference_crop_title_chars(img), size, norm))
+
+
+def _crop_stage(img: Image.Image, centers, size: int, norm: str):
+    arr = np.array(img, dtype=np.uint8)
+    upper = captcha._crop_upper_chars_color_isolated(arr, centers)
+    return (captcha._preprocess_batch(upper, size, norm) if upper else None,
+            captcha._preprocess_batch(captcha._crop_title_chars(arr), size, norm))
+
+
+def bench_crop(samples, repeat: int, size: int, norm: str = "imagenet") -> bool:
+    cases = [(name, img, [r["center"] for r in captcha._segment_upper(img)[:8]])
+             for name, img in samples]
+    mismatches = 0
+    for name, img, centers in cases:
+        ref, got = _crop_stage_reference(img, centers, size, norm), _crop_stage(img, centers, size, norm)
+        if any((a is None) != (b is None) or (a is not None and not np.array_equal(a, b))
+               for a, b in zip(ref, got)):
+            print(f"❌ 模型输入不一致: {name}")
+            mismatches += 1
+    if mismatches:
+        return False
+    print(f">>> 模型输入张量逐像素一致 ({len(cases)} 张, {size}x{size})")
+
+    timings = {"逐字 PIL(参考)": [], "批量 numpy": []}
+    for _ in range(repeat):
+        for _, img, centers in cases:
+            t0 = time.perf_counter()
+            _crop_stage_reference(img, centers, size, norm)
+            timings["逐字 PIL(参考)"].append(time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            _crop_stage(img, centers, size, norm)
+            timings["批量 numpy"].append(time.perf_counter() - t0)
+
+    for label, values in timings.items():
+        print(f"  裁剪+缩放 [{label}]: {_percentiles(values)}")
+    speedup = statistics.mean(timings["逐字 PIL(参考)"]) / statistics.mean(timings["批量 numpy"])
+    print(f">>> 加速比: {speedup:.1f}x")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="验证码求解基准（录制语料回放）")
+    parser.add_argument("corpus", help="语料目录（验证码图片或 vcode.do 响应 JSON）")
+    parser.add_argument("--truth", help="标注文件（JSON），用于计算准确率")
+    parser.add_argument("--tol", type=float, default=15.0, help="点击位置容差(像素)")
+    parser.add_argument("--repeat", type=int, default=3, help="计时重复轮数")
+    parser.add_argument("--workers", type=int, default=0, help="额外用 N 个进程测吞吐")
+    parser.add_argument("--upper-model", default=captcha.UPPER_ONNX_PATH, help="上方字符模型路径")
+    parser.add_argument("--title-model", default=captcha.TITLE_ONNX_PATH, help="标题字符模型路径")
+    parser.add_argument("--segment", action="store_true", help="只比对上半区分割")
+    parser.add_argument("--crop", action="store_true", help="只比对裁剪+缩放得到的模型输入")
+    parser.add_argument("--input-size", type=int, default=32, help="--crop 时的模型输入边长")
+    parser.add_argument("--login-cost", type=float, default=2.0,
+                        help="标定阈值时一次 login.do 折合的往返数（含失败后的限流代价）")
+    args = parser.parse_args()
+
+    samples = load_corpus(args.corpus)
+    if not samples:
+        print(f"❌ 语料目录为空: {args.corpus}")
+        sys.exit(1)
+    print(f">>> 载入 {len(samples)} 张验证码")
+
+    if args.segment:
+        if not bench_segment(samples, args.repeat):
+            sys.exit(1)
+        return
+    if args.crop:
+        if not bench_crop(samples, args.repeat, args.input_size):
+            sys.exit(1)
+        return
+
+    if not os.path.exists(args.upper_model):
+        print(f"❌ 模型不存在: {args.upper_model}")
+        sys.exit(1)
+    title_path = args.title_model if os.path.exists(args.title_model) else None
+
+    truth = {}
+    if args.truth:
+        with open(args.truth, "r", encoding="utf-8") as f:
+            truth = json.load(f)
+
+    t0 = time.perf_counter()
+    solver = captcha._OnnxCaptchaSolver(args.upper_model, title_path)
+    print(f">>> 模型加载 + 预热: {(time.perf_counter() - t0) * 1000:.1f}ms")
+
+    bench_solve(solver, samples, truth, args.tol, args.repeat, args.login_cost)
+    if args.workers > 0:
+        bench_throughput(args.upper_model, title_path, samples, args.workers, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""DES 密码加密校验与微基准。
+
+先用 golden 向量（由原 JS 逐位移植版本生成）校验 str_enc / encrypt_password 输出逐字节一致，
+再测量 encrypt_password 的冷启动（首次调用，含子密钥生成）与稳态耗时。
+
+用法：
+  python tools/bench_des.py
+  python tools/bench_des.py -n 10000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from lib.des_encrypt import _key_schedules, encrypt_password, str_enc
+
+# encrypt_password(明文) 的期望输出
+PASSWORD_VECTORS = [
+    ("", ""),
+    ("a", "OUFDQTRDNDJGMjRDQkUwOA=="),
+    ("ab", "RjhFRTA0NzMxRjFFREMzOA=="),
+    ("abc", "N0QyMEFBM0M2ODQ0MTdGRg=="),
+    ("abcd", "MkVCNURGQUY0NUI4MzdFNA=="),
+    ("abcde", "MkVCNURGQUY0NUI4MzdFNDA5RjlGQkY1QzI3NUE5MUY="),
+    ("Passw0rd!", "MkRENkU5MjU3QTA0NjUzQjkxNkQzRUVFMzAwMERFNTg4MDlCQzU2QjU3Q0Y5QzMx"),
+    ("nju@2025#Xk", "QTJGNTBFQzNBQUNENzMxNDVDMzVGODI3NkE1QjdERDBBOUIwMzRGRkRDN0E2NkZF"),
+    ("密码测试123", "MTkxRDJEMkQ1NDVEQjhDMkQ1MDU0RkZBMkQyQzBBOEE="),
+    ("😀emoji", "ODkxQTM4OUMxREFENzRFOUI5MUQzOURBRUQxOEUzNkQ="),
+    ("x" * 17, "Q0QzMTkwMzU3QzYzNDhDRUNEMzE5MDM1N0M2MzQ4Q0VDRDMxOTAzNTdDNjM0OENFQ0QzMTkwMzU3QzYzNDhDRTBBMUQ2NTM1NTQxRkFDN0Q="),
+    ("\x00\x01￿", "OUQwRjAwODIwMkIyOTVCQQ=="),
+]
+
+# str_enc(data, key1, key2, key3) 的期望输出
+STR_ENC_VECTORS = [
+    (("hello world", "k", "", "third"), "42EC1F29463F5DC1DD3DFA55E85152E95F4B64721D6BA241"),
+    (("1234", "abcde", "", ""), "78A989086D5DA5B9"),
+    (("NJU", "", "", ""), "004E004A00550000"),
+    (("abc", "this", "password", "is"), "7D20AA3C684417FF"),
+]
+
+
+def check_vectors() -> bool:
+    ok = True
+    for plain, expected in PASSWORD_VECTORS:
+        got = encrypt_password(plain)
+        if got != expected:
+            print(f"❌ encrypt_password({plain!r}) = {got!r}, 期望 {expected!r}")
+            ok = False
+    for args, expected in STR_ENC_VECTORS:
+        got = str_enc(*args)
+        if got != expected:
+            print(f"❌ str_enc{args!r} = {got!r}, 期望 {expected!r}")
+            ok = False
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DES 密码加密校验与微基准")
+    parser.add_argument("-n", type=int, default=2000, help="稳态计时的调用次数")
+    parser.add_argument("--password", default="nju@2025#Xk", help="计时用的明文密码")
+    args = parser.parse_args()
+
+    _key_schedules.cache_clear()
+    t0 = time.perf_counter()
+    encrypt_password(args.password)
+    cold = time.perf_counter() - t0
+
+    if not check_vectors():
+        sys.exit(1)
+    print(f">>> golden 向量校验通过 ({len(PASSWORD_VECTORS) + len(STR_ENC_VECTORS)} 组)")
+
+    t0 = time.perf_counter()
+    for _ in range(args.n):
+        encrypt_password(args.password)
+    warm = (time.perf_counter() - t0) / args.n
+
+    print(f"  首次调用(含子密钥生成): {cold * 1e6:8.1f}µs")
+    print(f"  稳态 {args.n} 次平均:       {warm * 1e6:8.1f}µs/次  (密码长度 {len(args.password)})")
+
+
+if __name__ == "__main__":
+    main()
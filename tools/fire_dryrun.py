@@ -0,0 +1,105 @@
+"""定时开抢演练：对本地模拟服务器跑一遍对时 + 定时发出，报告到达时刻误差。
+
+模拟服务器的时钟相对本机偏移 --skew 秒，单程网络时延 --latency 毫秒（请求、响应各一次），
+记录每个 volunteer.do 请求"到达"服务器的时刻（服务器时钟）。
+
+用法：
+  python tools/fire_dryrun.py
+  python tools/fire_dryrun.py --skew -2.37 --latency 25 --trials 5
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from lib.common import HttpPool
+from lib.fire_scheduler import estimate_clock_offset, fire_wave
+
+
+def _make_handler(skew: float, latency: float, arrivals: list):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _reply(self, body: bytes):
+            time.sleep(latency)                      # 请求在路上
+            self._server_now = server_now = time.time() + skew
+            if self.command == "POST":
+                arrivals.append(server_now)
+            length = int(self.headers.get("Content-Length") or 0)
+            if length:
+                self.rfile.read(length)
+            time.sleep(latency)                      # 响应在路上
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if self.command != "HEAD":
+                self.wfile.write(body)
+
+        def date_time_string(self, timestamp=None):
+            # send_response() 用它生成 Date 头：按到达时刻的服务器时钟盖戳
+            return formatdate(self._server_now, usegmt=True)
+
+        def do_HEAD(self):
+            self._reply(b"")
+
+        def do_POST(self):
+            self._reply(b'{"code":"0","msg":"dry-run"}')
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="定时开抢演练（本地模拟服务器）")
+    parser.add_argument("--skew", type=float, default=1.234, help="服务器时钟比本机快多少秒")
+    parser.add_argument("--latency", type=float, default=20.0, help="单程网络时延(毫秒)")
+    parser.add_argument("--wave", type=int, default=3, help="第一波并发请求数")
+    parser.add_argument("--lead", type=float, default=2.0, help="对时完成后多久开抢(秒)")
+    parser.add_argument("--trials", type=int, default=3)
+    args = parser.parse_args()
+
+    arrivals: list = []
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", 0), _make_handler(args.skew, args.latency / 1000, arrivals))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    print(f">>> 模拟服务器 {base}: 时钟偏移 {args.skew:+.3f}s, 单程时延 {args.latency:.0f}ms")
+
+    http = HttpPool(args.wave + 1)
+    errors = []
+    for trial in range(1, args.trials + 1):
+        http.warm_up(url=f"{base}/index.do")
+        clock = estimate_clock_offset(http, url=f"{base}/index.do")
+        # 开放时刻取服务器时钟下的某个整秒
+        fire_at = int(time.time() + clock["offset"] + args.lead) + 1
+        send_at = fire_at - clock["offset"] - clock["rtt"] / 2
+
+        arrivals.clear()
+        fire_wave(http, f"{base}/volunteer.do", [{"n": i} for i in range(args.wave)], send_at,
+                  cookies={}, headers={})
+        trial_err = [(a - fire_at) * 1000 for a in arrivals]
+        errors.extend(trial_err)
+        print(f"  [{trial}] 估计偏移 {clock['offset']:+.4f}s (真实 {args.skew:+.4f}s, "
+              f"±{clock['error'] * 1000:.1f}ms), RTT {clock['rtt'] * 1000:.1f}ms, "
+              f"到达误差 " + ", ".join(f"{e:+.1f}ms" for e in trial_err))
+
+    server.shutdown()
+    if errors:
+        abs_err = [abs(e) for e in errors]
+        print(f"\n>>> 到达误差: 平均 {statistics.mean(errors):+.1f}ms, "
+              f"|误差| 中位数 {statistics.median(abs_err):.1f}ms, 最大 {max(abs_err):.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
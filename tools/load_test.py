@@ -0,0 +1,242 @@
+"""抢课引擎压测：对本地模拟服务器（tools/mock_server.py）跑各个引擎，比较吞吐与延迟。
+
+每个引擎单独一个子进程，使用临时配置目录（xk.conf / course.conf / 预先签发的 session_cache.json），
+子进程启动后把代码中的 https://xk.nju.edu.cn 与 config/ 路径改指向模拟服务器与临时目录，
+再调用原脚本的 main()。结束后读取子进程的事件日志（lib/event_log.py）与服务器计数，报告：
+  - volunteer.do 实际请求速率（次/秒）与各类响应占比
+  - 首次抢到用时（time-to-first-success）、抢到门数
+  - 提交延迟 p50 / p95 / p99 / max
+  - 引擎观察到的 QoS、会话过期次数与自适应限速的减速次数
+
+引擎：thread（xk_quick.py 线程池）、async（xk_quick.py --engine async，需 httpx）、
+      watch（xk_quick.py --watch）、xk（xk.py 循环模式）
+
+用法：
+  python tools/load_test.py
+  python tools/load_test.py --engines thread,async --courses 40 --full 10 --duration 30
+  python tools/load_test.py --npe 0.05 --qos-rps 15 --session-ttl 20 --captcha-dir captcha_corpus/
+"""
+
+import argparse
+import importlib
+import json
+import os
+import pkgutil
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import types
+from collections import Counter
+from typing import Any, Dict, List
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from tools.analyze_run import load_events
+from tools.mock_server import APP_PREFIX, add_server_args, build_server
+
+ENGINES = ("thread", "async", "watch", "xk")
+LIVE_ORIGIN = "https://xk.nju.edu.cn"
+TEST_USER = "20260001"
+
+
+# ---------- 子进程：把引擎指向模拟服务器 ----------
+
+def _retarget(value: Any, origin: str, conf_dir: str, live_conf_dir: str) -> Any:
+    if isinstance(value, str):
+        if value.startswith(LIVE_ORIGIN):
+            return origin + value[len(LIVE_ORIGIN):]
+        if value.startswith(live_conf_dir):
+            return conf_dir + value[len(live_conf_dir):]
+    return value
+
+
+def _redirect(origin: str, conf_dir: str) -> int:
+    """改写已加载模块中的 URL / 配置路径常量，以及以它们为默认值的函数参数。返回改写处数。"""
+    from lib import common
+
+    live_conf_dir = common.CONF_DIR
+    fix = lambda v: _retarget(v, origin, conf_dir, live_conf_dir)
+    changed = 0
+
+    def fix_defaults(func) -> None:
+        nonlocal changed
+        if func.__defaults__:
+            new = tuple(fix(v) for v in func.__defaults__)
+            if new != func.__defaults__:
+                func.__defaults__, changed = new, changed + 1
+        if func.__kwdefaults__:
+            new_kw = {k: fix(v) for k, v in func.__kwdefaults__.items()}
+            if new_kw != func.__kwdefaults__:
+                func.__kwdefaults__, changed = new_kw, changed + 1
+
+    for name, module in list(sys.modules.items()):
+        if not (name.startswith("lib.") or name in ("xk", "xk_quick", "xk_daemon")):
+            continue
+        for attr, value in list(vars(module).items()):
+            new = fix(value)
+            if new is not value:
+                setattr(module, attr, new)
+                changed += 1
+            elif isinstance(value, types.FunctionType) and value.__module__ == name:
+                fix_defaults(value)
+            elif isinstance(value, type) and value.__module__ == name:
+                for member in vars(value).values():
+                    if isinstance(member, types.FunctionType):
+                        fix_defaults(member)
+    return changed
+
+
+def _run_child(engine: str, origin: str, conf_dir: str) -> None:
+    if engine == "xk":
+        import xk as entry
+        argv = ["xk.py"]
+    else:
+        import xk_quick as entry
+        argv = ["xk_quick.py"] + (["--engine", "async"] if engine == "async" else [])
+        argv += ["--watch"] if engine == "watch" else []
+    # 认证器、async 引擎等是用到时才导入的，先全部加载，它们的常量同样需要改写
+    for info in pkgutil.iter_modules([os.path.join(PROJECT_ROOT, "lib")]):
+        try:
+            importlib.import_module(f"lib.{info.name}")
+        except ImportError:
+            pass
+    print(f">>> [load_test] 改写 {_redirect(origin, conf_dir)} 处常量 → {origin}")
+    sys.argv = argv
+    entry.main()
+
+
+# ---------- 父进程：准备、运行、汇总 ----------
+
+def _prepare_conf(server, conf_dir: str, args) -> None:
+    cookies, token = server.issue_session(TEST_USER)
+    xk_conf = {"USER": TEST_USER, "PWD": "mock", "PROXY": "", "EVENT_LOG": os.path.join(conf_dir, "logs")}
+    if args.xk_conf:
+        with open(args.xk_conf, "r", encoding="utf-8") as f:
+            xk_conf.update(json.load(f))
+    course_conf = {"electiveBatchCode": server.batch_code,
+                   "courses": [[c.cid, c.kind, c.ctype, c.name] for c in server.courses.values()]}
+    cache = {"cookies": cookies, "token": token, "timestamp": time.time()}
+    for name, data in (("xk.conf", xk_conf), ("course.conf", course_conf), ("session_cache.json", cache)):
+        with open(os.path.join(conf_dir, name), "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def _quantiles(values: List[float]) -> str:
+    if len(values) < 2:
+        return "—"
+    q = statistics.quantiles(values, n=100, method="inclusive")
+    return f"p50 {q[49]:.1f}ms  p95 {q[94]:.1f}ms  p99 {q[98]:.1f}ms  max {max(values):.1f}ms"
+
+
+def run_engine(engine: str, args) -> Dict[str, Any]:
+    server = build_server(args)
+    origin = server.start()
+    conf_dir = tempfile.mkdtemp(prefix=f"xk-load-{engine}-")
+    _prepare_conf(server, conf_dir, args)
+    log_path = os.path.join(conf_dir, "engine.log")
+
+    print(f"\n===== {engine}: {len(server.courses)} 门课, 模拟服务器 {origin}{APP_PREFIX} =====")
+    started = time.time()
+    with open(log_path, "w", encoding="utf-8") as log:
+        proc = subprocess.Popen(
+            [sys.executable, "-u", os.path.abspath(__file__), "--child", engine,
+             "--origin", origin, "--conf-dir", conf_dir],
+            stdout=log, stderr=subprocess.STDOUT, cwd=PROJECT_ROOT,
+        )
+        try:
+            proc.wait(timeout=args.duration)
+            finished = proc.returncode == 0
+        except subprocess.TimeoutExpired:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+            finished = False
+    wall = time.time() - started
+    server.stop()
+
+    log_dir = os.path.join(conf_dir, "logs")
+    files = [os.path.join(log_dir, f) for f in sorted(os.listdir(log_dir))] if os.path.isdir(log_dir) else []
+    events = load_events(files) if files else []
+    submits = [e for e in events if e["event"] == "submit"]
+    run_start = next((e["ts"] for e in events if e["event"] == "run_start"), started)
+    first_ok = next((e["ts"] for e in events if e["event"] == "poll" and str(e.get("code")) == "1"), None)
+    outcomes = Counter(e.get("outcome", "?") for e in submits)
+    courses_left = len(json.load(open(os.path.join(conf_dir, "course.conf"), encoding="utf-8"))["courses"])
+
+    result = {
+        "engine": engine,
+        "finished": finished,
+        "wall": wall,
+        "rps": server.stats["volunteer"] / wall if wall > 0 else 0.0,
+        "ttfs": first_ok - run_start if first_ok is not None else None,
+        "success": server.stats["success"],
+        "courses": len(server.courses),
+        "latencies": [float(e["latency_ms"]) for e in submits if e.get("latency_ms") is not None],
+        "outcomes": outcomes,
+        "rate_decreases": sum(1 for e in events if e["event"] == "rate" and e.get("action") == "decrease"),
+        "server": server.report(),
+        "left_in_conf": courses_left,
+        "conf_dir": conf_dir,
+    }
+    _print_result(result)
+    if args.keep or not finished:
+        print(f"  日志与配置: {conf_dir}")
+    else:
+        shutil.rmtree(conf_dir, ignore_errors=True)
+    return result
+
+
+def _print_result(r: Dict[str, Any]) -> None:
+    ttfs = f"{r['ttfs']:.2f}s" if r["ttfs"] is not None else "—"
+    status = "全部完成" if r["finished"] else "到时终止"
+    print(f"  {status}，用时 {r['wall']:.1f}s；抢到 {r['success']}/{r['courses']} 门，"
+          f"course.conf 剩 {r['left_in_conf']} 门；首次抢到 {ttfs}")
+    print(f"  volunteer.do {r['rps']:.1f} 次/秒；提交延迟 {_quantiles(r['latencies'])}")
+    print("  提交结果: " + (", ".join(f"{k}×{v}" for k, v in r["outcomes"].most_common()) or "—")
+          + f"；限速减速 {r['rate_decreases']} 次")
+    print(f"  服务器: {r['server']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="抢课引擎压测（本地模拟服务器）")
+    parser.add_argument("--engines", default="thread,async",
+                        help=f"逗号分隔，可选 {', '.join(ENGINES)}")
+    parser.add_argument("--duration", type=float, default=60.0, help="每个引擎最长运行时间(秒)")
+    parser.add_argument("--xk-conf", help="合并进临时 xk.conf 的 JSON 文件（如 RATE_CONTROL、WATCH 设置）")
+    parser.add_argument("--keep", action="store_true", help="保留临时目录（日志、事件日志、course.conf）")
+    parser.add_argument("--child", choices=ENGINES, help=argparse.SUPPRESS)
+    parser.add_argument("--origin", help=argparse.SUPPRESS)
+    parser.add_argument("--conf-dir", help=argparse.SUPPRESS)
+    add_server_args(parser)
+    args = parser.parse_args()
+
+    if args.child:
+        _run_child(args.child, args.origin, args.conf_dir)
+        return
+
+    engines = [e.strip() for e in args.engines.split(",") if e.strip()]
+    unknown = [e for e in engines if e not in ENGINES]
+    if unknown:
+        parser.error(f"未知引擎: {', '.join(unknown)}")
+
+    results = [run_engine(e, args) for e in engines]
+
+    print("\n===== 汇总 =====")
+    print(f"  {'引擎':<8s} {'req/s':>7s} {'首次抢到':>8s} {'抢到':>7s} {'p50':>8s} {'p95':>8s} {'p99':>8s}  QoS")
+    for r in results:
+        lat = r["latencies"]
+        q = statistics.quantiles(lat, n=100, method="inclusive") if len(lat) >= 2 else None
+        cols = [f"{q[i]:7.1f}ms" if q else f"{'—':>9s}" for i in (49, 94, 98)]
+        ttfs = f"{r['ttfs']:7.2f}s" if r["ttfs"] is not None else f"{'—':>8s}"
+        print(f"  {r['engine']:<10s} {r['rps']:7.1f} {ttfs} {r['success']:>3d}/{r['courses']:<3d} "
+              + " ".join(cols) + f"  {r['outcomes'].get('qos', 0)}")
+
+
+if __name__ == "__main__":
+    main()
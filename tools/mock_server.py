@@ -0,0 +1,468 @@
+"""本地模拟选课服务器：在不触碰 xk.nju.edu.cn 的前提下测试抢课脚本的吞吐与 QoS 行为。
+
+实现的接口（路径与线上一致，只是换成 http://127.0.0.1:端口）：
+  *default/index.do            首页，下发会话 Cookie
+  student/4/vcode.do           验证码：轮流返回 --captcha-dir 中录制的验证码（格式同 tools/bench_captcha.py 语料）
+  student/check/login.do       登录：verifyCode 为 4 个坐标即通过，返回 token
+  student/{学号}.do             学生信息 / 选课批次（SessionManager 校验登录态、import_favorites 取 courseKind）
+  elective/volunteer.do        选课：AES 解密 addParam（同 tools/course_decrypt.py），入队后返回 code=1
+  elective/studentstatus.do    结果轮询：入队 --process-ms 毫秒后按余量判定成功 / 已满
+  elective/queryCourse.do      课程搜索：按关键字匹配课程名 / 教师 / 教学班号，带已选人数与容量
+  elective/queryfavorite.do    收藏列表：返回全部模拟课程
+
+可调的服务器行为：
+  --latency / --jitter   每个请求的处理时延(毫秒)
+  --capacity / --open    每个教学班的容量与空位数；--full 门课一开始就满
+  --churn                每隔多少秒随机一门已满的课有人退课（空出一个名额）
+  --npe                  volunteer.do 以该概率返回 NullPointerException（QoS）
+  --qos-rps              volunteer.do 最近 1s 超过该请求数时一律返回 NPE（模拟限流）
+  --session-ttl          token 有效期(秒)，过期后返回 loginURL / code=302；0 为不过期
+
+没有 --captcha-dir 时验证码是一张空白图，识别必然失败：会话过期后的重新登录走不通，
+压测时由 tools/load_test.py 预先写入有效的 session_cache.json。
+
+用法：
+  python tools/mock_server.py --port 8000 --courses 8 --full 2 --churn 5
+  python tools/mock_server.py --npe 0.05 --qos-rps 20 --session-ttl 120 --captcha-dir captcha_corpus/
+"""
+
+import argparse
+import base64
+import collections
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.parse
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Tuple
+
+from Crypto.Cipher import AES
+from Crypto.Util.Padding import unpad
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from lib.common import AES_KEY
+
+APP_PREFIX = "/xsxkapp/sys/xsxkapp/"
+LOGIN_URL = APP_PREFIX + "*default/index.do"
+NPE_MSG = "java.lang.NullPointerException"
+
+IMAGE_MIME = {".gif": "image/gif", ".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg"}
+# 1x1 空白 GIF，没有录制验证码时使用
+BLANK_GIF = base64.b64encode(
+    b"GIF89a\x01\x00\x01\x00\x80\x00\x00\xff\xff\xff\x00\x00\x00!\xf9\x04\x01\x00\x00\x00\x00"
+    b",\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;"
+).decode("ascii")
+
+
+def decrypt_add_param(add_param: str) -> Dict[str, Any] | None:
+    """volunteer.do 的 addParam → 明文 JSON（去掉 ?timestrap=），无法解密时返回 None。"""
+    try:
+        cipher = AES.new(AES_KEY.encode("utf-8"), AES.MODE_ECB)
+        text = unpad(cipher.decrypt(base64.b64decode(add_param)), AES.block_size).decode("utf-8")
+        return json.loads(text.split("?timestrap=")[0])
+    except Exception:
+        return None
+
+
+def load_captchas(captcha_dir: str) -> List[str]:
+    """读取录制的验证码，返回 vcode.do 中 data.vode 字段的取值（data URI）列表。"""
+    out = []
+    for name in sorted(os.listdir(captcha_dir)):
+        path = os.path.join(captcha_dir, name)
+        ext = os.path.splitext(name)[1].lower()
+        if ext in IMAGE_MIME:
+            with open(path, "rb") as f:
+                out.append(f"data:{IMAGE_MIME[ext]};base64,{base64.b64encode(f.read()).decode('ascii')}")
+        elif ext == ".json":
+            with open(path, "r", encoding="utf-8") as f:
+                data = (json.load(f).get("data") or {})
+            raw = data.get("vode") or data.get("vcode")
+            if raw:
+                out.append(raw)
+    return out
+
+
+class MockCourse:
+    """一个教学班的余量状态。"""
+
+    def __init__(self, cid: str, name: str, teacher: str, capacity: int, selected: int,
+                 kind: str = "1", ctype: str = "ZY"):
+        self.cid = cid
+        self.name = name
+        self.teacher = teacher
+        self.capacity = capacity
+        self.selected = selected
+        self.kind = kind
+        self.ctype = ctype
+
+    def as_item(self) -> Dict[str, Any]:
+        return {
+            "teachingClassID": self.cid,
+            "courseName": self.name,
+            "teacherName": self.teacher,
+            "teachingClassType": self.ctype,
+            "jxblx": self.kind,
+            "courseKind": self.kind,
+            "numberOfSelected": self.selected,
+            "classCapacity": self.capacity,
+            "campusName": "仙林校区",
+            "teachingPlace": "模拟教学楼 101",
+            "credit": 2,
+        }
+
+
+class MockXkServer:
+    """模拟服务器本体：状态在内存中，ThreadingHTTPServer 每个请求一个线程。"""
+
+    def __init__(self, *, latency_ms: float = 30.0, jitter_ms: float = 10.0, npe_rate: float = 0.0,
+                 qos_rps: float = 0.0, session_ttl: float = 0.0, process_ms: float = 300.0,
+                 churn: float = 0.0, captcha_dir: str | None = None, batch_code: str = "mock-batch",
+                 seed: int | None = None):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.npe_rate = npe_rate
+        self.qos_rps = qos_rps
+        self.session_ttl = session_ttl
+        self.process_delay = process_ms / 1000
+        self.churn = churn
+        self.batch_code = batch_code
+        self.captchas = load_captchas(captcha_dir) if captcha_dir else []
+        self._rng = random.Random(seed)
+
+        self._lock = threading.Lock()
+        self.courses: Dict[str, MockCourse] = {}
+        self._sessions: Dict[str, Tuple[str, float]] = {}       # token → (学号, 到期时刻)
+        self._captcha_uuids: set = set()
+        self._pending: Dict[Tuple[str, str], float] = {}        # (学号, 教学班) → 出结果时刻
+        self._results: Dict[Tuple[str, str], Dict[str, str]] = {}
+        self._chosen: set = set()                               # 已选上的 (学号, 教学班)
+        self._recent_submits: collections.deque = collections.deque()
+        self._captcha_idx = 0
+
+        self.stats: collections.Counter = collections.Counter()
+        self.started_at = 0.0
+        self.first_success: float | None = None
+        self._server: ThreadingHTTPServer | None = None
+        self._stop = threading.Event()
+
+    # ---------- 状态 ----------
+
+    def add_course(self, cid: str, *, capacity: int = 60, selected: int = 0, name: str | None = None,
+                   teacher: str | None = None, kind: str = "1", ctype: str = "ZY") -> MockCourse:
+        course = MockCourse(cid, name or f"模拟课程{len(self.courses) + 1}",
+                            teacher or f"教师{len(self.courses) + 1}", capacity, selected, kind, ctype)
+        self.courses[cid] = course
+        return course
+
+    def issue_session(self, user: str) -> Tuple[Dict[str, str], str]:
+        """直接签发一个有效会话（跳过验证码登录），返回 (cookies, token)。"""
+        token = uuid.uuid4().hex
+        expires = time.monotonic() + self.session_ttl if self.session_ttl > 0 else float("inf")
+        with self._lock:
+            self._sessions[token] = (str(user), expires)
+        return {"_WEU": uuid.uuid4().hex}, token
+
+    def _session_user(self, token: str | None) -> str | None:
+        with self._lock:
+            entry = self._sessions.get(token or "")
+        if entry is None or time.monotonic() >= entry[1]:
+            return None
+        return entry[0]
+
+    def _churn_loop(self) -> None:
+        while not self._stop.wait(self.churn):
+            with self._lock:
+                full = [c for c in self.courses.values() if c.selected >= c.capacity]
+                if full:
+                    c = self._rng.choice(full)
+                    c.selected -= 1
+                    self.stats["churn"] += 1
+
+    # ---------- 生命周期 ----------
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """后台启动，返回 http://host:port（替换线上的 https://xk.nju.edu.cn）。"""
+        self._server = ThreadingHTTPServer((host, port), _make_handler(self))
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        if self.churn > 0:
+            threading.Thread(target=self._churn_loop, daemon=True).start()
+        self.started_at = time.time()
+        return f"http://{host}:{self._server.server_port}"
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    # ---------- 接口 ----------
+
+    def handle(self, path: str, form: Dict[str, str], headers) -> Tuple[Any, Dict[str, str]]:
+        """按路径分发，返回 (响应体, 额外响应头)。响应体为 dict 时按 JSON 返回。"""
+        route = path[len(APP_PREFIX):] if path.startswith(APP_PREFIX) else path.lstrip("/")
+        if route == "*default/index.do":
+            self.stats["index"] += 1
+            return "<html><body>mock</body></html>", {"Set-Cookie": f"_WEU={uuid.uuid4().hex}; Path=/"}
+        if route == "student/4/vcode.do":
+            return self._vcode(), {}
+        if route == "student/check/login.do":
+            return self._login(form), {}
+
+        user = self._session_user(headers.get("token"))
+        if user is None and route.startswith(("student/", "elective/")):
+            self.stats["expired"] += 1
+            return {"code": "302", "msg": "登录已失效，请重新登录", "loginURL": LOGIN_URL}, {}
+        if route.startswith("student/") and route.endswith(".do"):
+            return self._student_info(user), {}
+        if route == "elective/volunteer.do":
+            return self._volunteer(user, form), {}
+        if route == "elective/studentstatus.do":
+            return self._status(user, form), {}
+        if route == "elective/queryCourse.do":
+            return self._query(form, favorites=False), {}
+        if route == "elective/queryfavorite.do":
+            return self._query(form, favorites=True), {}
+        self.stats["unknown"] += 1
+        return {"code": "0", "msg": "非法请求"}, {}
+
+    def _vcode(self) -> Dict[str, Any]:
+        self.stats["vcode"] += 1
+        with self._lock:
+            if self.captchas:
+                image = self.captchas[self._captcha_idx % len(self.captchas)]
+                self._captcha_idx += 1
+            else:
+                image = f"data:image/gif;base64,{BLANK_GIF}"
+            server_uuid = uuid.uuid4().hex
+            self._captcha_uuids.add(server_uuid)
+        return {"code": "1", "msg": "", "data": {"uuid": server_uuid, "vode": image}}
+
+    def _login(self, form: Dict[str, str]) -> Dict[str, Any]:
+        self.stats["login"] += 1
+        with self._lock:
+            known = form.get("uuid") in self._captcha_uuids
+            self._captcha_uuids.discard(form.get("uuid"))
+        points = [p for p in form.get("verifyCode", "").split(",") if p]
+        if not known or len(points) != 4:
+            self.stats["login_fail"] += 1
+            return {"code": "0", "msg": "验证码错误"}
+        user = form.get("loginName", "")
+        _, token = self.issue_session(user)
+        self.stats["login_ok"] += 1
+        return {"code": "1", "msg": "登录成功", "data": {"number": user, "token": token}}
+
+    def _student_info(self, user: str) -> Dict[str, Any]:
+        self.stats["student"] += 1
+        menus = sorted({(c.kind, c.ctype) for c in self.courses.values()})
+        return {
+            "code": "1",
+            "msg": "查询学生基础信息成功",
+            "data": {
+                "number": user,
+                "electiveBatchList": [{
+                    "code": self.batch_code,
+                    "name": "模拟选课批次",
+                    "limitMenuList": [
+                        {"courseKind": kind, "menuCode": ctype, "menuName": f"模拟{ctype}"}
+                        for kind, ctype in menus
+                    ],
+                }],
+            },
+        }
+
+    def _volunteer(self, user: str, form: Dict[str, str]) -> Dict[str, Any]:
+        now = time.monotonic()
+        self.stats["volunteer"] += 1
+        with self._lock:
+            self._recent_submits.append(now)
+            while self._recent_submits and self._recent_submits[0] < now - 1.0:
+                self._recent_submits.popleft()
+            over_limit = 0 < self.qos_rps < len(self._recent_submits)
+        if over_limit or self._rng.random() < self.npe_rate:
+            self.stats["volunteer_npe"] += 1
+            return {"code": "0", "msg": NPE_MSG}
+
+        payload = decrypt_add_param(form.get("addParam", ""))
+        data = (payload or {}).get("data") or {}
+        cid = str(data.get("teachingClassId", ""))
+        if payload is None or data.get("studentCode") != user or cid not in self.courses:
+            self.stats["volunteer_bad"] += 1
+            return {"code": "0", "msg": "非法请求"}
+
+        key = (user, cid)
+        with self._lock:
+            if key in self._chosen:
+                self.stats["volunteer_rejected"] += 1
+                return {"code": "0", "msg": "该课程已选，不能重复选择"}
+            course = self.courses[cid]
+            if course.selected >= course.capacity:
+                self.stats["volunteer_rejected"] += 1
+                return {"code": "0", "msg": "该教学班已满"}
+            self._pending[key] = now + self.process_delay
+            self._results.pop(key, None)
+        self.stats["volunteer_queued"] += 1
+        return {"code": "1", "msg": "请求已提交"}
+
+    def _status(self, user: str, form: Dict[str, str]) -> Dict[str, str]:
+        self.stats["studentstatus"] += 1
+        key = (user, str(form.get("teachingClassId", "")))
+        with self._lock:
+            if key in self._results:
+                return self._results[key]
+            ready_at = self._pending.get(key)
+            if ready_at is None:
+                return {"code": "-1", "msg": "没有正在处理的选课请求"}
+            if time.monotonic() < ready_at:
+                return {"code": "0", "msg": "处理中"}
+            del self._pending[key]
+            course = self.courses[key[1]]
+            if course.selected < course.capacity:
+                course.selected += 1
+                self._chosen.add(key)
+                result = {"code": "1", "msg": "选课成功"}
+                self.stats["success"] += 1
+                if self.first_success is None:
+                    self.first_success = time.time()
+            else:
+                result = {"code": "-1", "msg": "该教学班已满"}
+                self.stats["status_full"] += 1
+            self._results[key] = result
+        return result
+
+    def _query(self, form: Dict[str, str], *, favorites: bool) -> Dict[str, Any]:
+        self.stats["favorites" if favorites else "query"] += 1
+        try:
+            setting = json.loads(form.get("querySetting", "{}"))
+            page_size = int(setting.get("pageSize", 10))
+            page_number = int(setting.get("pageNumber", 0))
+        except (TypeError, ValueError):
+            return {"code": "0", "msg": "非法请求"}
+        keyword = str((setting.get("data") or {}).get("queryContent", "") or "")
+        with self._lock:
+            items = [c.as_item() for c in self.courses.values()
+                     if favorites or not keyword
+                     or any(keyword in s for s in (c.name, c.teacher, c.cid))]
+        page = items[page_number * page_size:(page_number + 1) * page_size]
+        return {"code": "1", "msg": "", "totalCount": len(items), "dataList": page}
+
+    def report(self) -> str:
+        s = self.stats
+        return (f"volunteer.do {s['volunteer']} 次 (入队 {s['volunteer_queued']}, 拒绝 {s['volunteer_rejected']}, "
+                f"NPE {s['volunteer_npe']}, 非法 {s['volunteer_bad']}), studentstatus.do {s['studentstatus']} 次, "
+                f"queryCourse.do {s['query']} 次, 成功 {s['success']} 门, 会话过期响应 {s['expired']} 次, "
+                f"登录 {s['login_ok']}/{s['login']}, 退课 {s['churn']} 次")
+
+
+def _make_handler(server: MockXkServer):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _reply(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length).decode("utf-8", "replace") if length else ""
+            form = {k: v[0] for k, v in urllib.parse.parse_qs(raw).items()}
+            path = urllib.parse.urlsplit(self.path).path
+            delay = server.latency + server._rng.uniform(-server.jitter, server.jitter)
+            if delay > 0:
+                time.sleep(delay)
+
+            body, extra = server.handle(path, form, self.headers)
+            if isinstance(body, dict):
+                data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                ctype = "application/json;charset=UTF-8"
+            else:
+                data = str(body).encode("utf-8")
+                ctype = "text/html;charset=UTF-8"
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(data)))
+            for k, v in extra.items():
+                self.send_header(k, v)
+            self.end_headers()
+            if self.command != "HEAD":
+                self.wfile.write(data)
+
+        do_GET = do_POST = do_HEAD = _reply
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def populate(server: MockXkServer, courses: int, capacity: int, open_seats: int, full: int) -> List[str]:
+    """生成 courses 个教学班：前 full 个已满，其余各有 open_seats 个空位。返回教学班号。"""
+    ids = []
+    for i in range(courses):
+        cid = f"MOCK{i + 1:04d}"
+        selected = capacity if i < full else max(0, capacity - open_seats)
+        server.add_course(cid, capacity=capacity, selected=selected)
+        ids.append(cid)
+    return ids
+
+
+def add_server_args(parser: argparse.ArgumentParser) -> None:
+    """模拟服务器的命令行参数（tools/load_test.py 共用）。"""
+    parser.add_argument("--courses", type=int, default=8, help="模拟教学班数")
+    parser.add_argument("--capacity", type=int, default=60, help="每个教学班的容量")
+    parser.add_argument("--open", type=int, default=3, dest="open_seats", help="未满教学班的空位数")
+    parser.add_argument("--full", type=int, default=2, help="一开始就满的教学班数")
+    parser.add_argument("--churn", type=float, default=5.0, help="每隔多少秒有人退一门已满的课(0 关闭)")
+    parser.add_argument("--latency", type=float, default=30.0, help="处理时延(毫秒)")
+    parser.add_argument("--jitter", type=float, default=10.0, help="时延抖动(毫秒)")
+    parser.add_argument("--process-ms", type=float, default=300.0, help="选课请求入队到出结果的时长(毫秒)")
+    parser.add_argument("--npe", type=float, default=0.0, help="volunteer.do 随机返回 NPE 的概率")
+    parser.add_argument("--qos-rps", type=float, default=0.0, help="volunteer.do 限流阈值(次/秒, 0 关闭)")
+    parser.add_argument("--session-ttl", type=float, default=0.0, help="token 有效期(秒, 0 不过期)")
+    parser.add_argument("--captcha-dir", help="录制的验证码目录（vcode.do 轮流返回）")
+    parser.add_argument("--seed", type=int, help="随机数种子")
+
+
+def build_server(args) -> MockXkServer:
+    server = MockXkServer(
+        latency_ms=args.latency, jitter_ms=args.jitter, npe_rate=args.npe, qos_rps=args.qos_rps,
+        session_ttl=args.session_ttl, process_ms=args.process_ms, churn=args.churn,
+        captcha_dir=args.captcha_dir, seed=args.seed,
+    )
+    populate(server, args.courses, args.capacity, args.open_seats, args.full)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟选课服务器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--user", default="20260001", help="预先签发会话的学号")
+    add_server_args(parser)
+    args = parser.parse_args()
+
+    server = build_server(args)
+    base = server.start(args.host, args.port)
+    cookies, token = server.issue_session(args.user)
+    print(f">>> 模拟服务器已启动: {base}{APP_PREFIX}")
+    print(f">>> {len(server.courses)} 个教学班（{args.full} 个已满），批次 {server.batch_code}")
+    print(f">>> 学号 {args.user} 的会话: token={token} cookies={json.dumps(cookies)}")
+    print(">>> course.conf 示例:")
+    print(json.dumps({"electiveBatchCode": server.batch_code,
+                      "courses": [[c.cid, c.kind, c.ctype, c.name] for c in server.courses.values()]},
+                     ensure_ascii=False, indent=2))
+    try:
+        while True:
+            time.sleep(10)
+            print(f">>> {server.report()}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        print(f"\n>>> {server.report()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,11 +4,22 @@
 与 query_course.py 的区别：
   - courseKind / teachingClassType 映射从学生信息接口动态获取
   - 不再使用 JXBLX_MAP 硬编码对照表
+
+翻页：
+  - 每次向 queryCourse.do 取 FETCH_PAGE_SIZE 条（一个"抓取页"），本地再按 PAGE_SIZE 条分屏显示
+  - 搜索时并发抓取前 PREFETCH_PAGES + 1 个抓取页，翻到哪页就在后台预取其后的 PREFETCH_PAGES 页
+  - 抓取结果按 (选课批次, 关键字, 抓取页) 存入 config/query_cache.json：LRU，最多 CACHE_MAX_ENTRIES 条，
+    CACHE_TTL 秒内重复搜索、来回翻页都不再联网
 """
 
+import atexit
 import json
 import os
 import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 
 import requests
 import urllib3
@@ -20,12 +31,15 @@ PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, PROJECT_ROOT)
 
 from lib.common import (
+    CONF_DIR,
     XK_CONF_FILE,
     COURSE_CONF_FILE,
     load_json,
+    save_json_atomic,
     build_headers,
     build_proxies,
     clear_env_proxies,
+    is_session_expired,
 )
 from lib.session_manager import acquire_session
 
@@ -34,7 +48,14 @@ QUERY_URL = f"{BASE_URL}/elective/queryCourse.do"
 STUDENT_URL = f"{BASE_URL}/student"
 
 DAY_MAP = {"1": "周一", "2": "周二", "3": "周三", "4": "周四", "5": "周五", "6": "周六", "7": "周日"}
-PAGE_SIZE = 10
+PAGE_SIZE = 10           # 每屏显示条数
+FETCH_PAGE_SIZE = 50     # 每次请求条数，须为 PAGE_SIZE 的整数倍
+PREFETCH_PAGES = 2       # 在后台预取当前抓取页之后的几页
+FETCH_WORKERS = 3        # 并发请求数
+
+QUERY_CACHE_FILE = os.path.join(CONF_DIR, "query_cache.json")
+CACHE_TTL = 600          # 缓存有效期(秒)
+CACHE_MAX_ENTRIES = 200
 
 
 # ===================== 动态参数映射 =====================
@@ -132,7 +153,10 @@ def _format_time(course):
 
 # ===================== 查询 =====================
 
-def query_courses(keyword, page_number, student_code, batch_code, cookies, token, proxies):
+def query_courses(keyword, page_number, student_code, batch_code, cookies, token, proxies,
+                  page_size=PAGE_SIZE, errors=None):
+    """errors 为列表时错误信息追加到其中而不打印（后台预取不能打断交互提示）。"""
+    report = print if errors is None else errors.append
     query_setting = {
         "data": {
             "studentCode": student_code,
@@ -140,7 +164,7 @@ def query_courses(keyword, page_number, student_code, batch_code, cookies, token
             "teachingClassType": "QB",
             "queryContent": keyword,
         },
-        "pageSize": str(PAGE_SIZE),
+        "pageSize": str(page_size),
         "pageNumber": str(page_number),
         "order": "",
     }
@@ -158,7 +182,7 @@ def query_courses(keyword, page_number, student_code, batch_code, cookies, token
         )
         r.encoding = "utf-8"
     except Exception as e:
-        print(f"❌ 网络请求失败: {e}")
+        report(f"❌ 网络请求失败: {e}")
         return None
 
     text = r.text.strip()
@@ -170,25 +194,173 @@ def query_courses(keyword, page_number, student_code, batch_code, cookies, token
     except Exception:
         if "非法请求" in text or "<html" in text.lower():
             return None
-        print(f"❌ 响应解析失败: {text[:200]}")
+        report(f"❌ 响应解析失败: {text[:200]}")
         return None
 
-    if isinstance(data, dict) and "非法请求" in str(data.get("msg", "")):
+    if isinstance(data, dict) and ("非法请求" in str(data.get("msg", "")) or is_session_expired(data)):
         return None
 
     data_list = data.get("dataList") if isinstance(data, dict) else None
     if data_list is None or not data_list:
         return ([], True)
 
-    return (data_list, len(data_list) < PAGE_SIZE)
+    return (data_list, len(data_list) < page_size)
+
+
+# ===================== 缓存与预取 =====================
+
+class _QueryCache:
+    """抓取页的磁盘 LRU 缓存：{"批次\t关键字\t条数\t页号": {"ts", "courses", "is_last"}}。"""
+
+    def __init__(self, path=QUERY_CACHE_FILE, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._dirty = False
+        try:
+            raw = load_json(path)
+        except Exception:
+            raw = {}
+        now = time.time()
+        if isinstance(raw, dict):
+            for key, entry in raw.items():
+                if isinstance(entry, dict) and now - entry.get("ts", 0) < ttl:
+                    self._entries[key] = entry
+
+    @staticmethod
+    def key(batch_code, keyword, page):
+        return f"{batch_code}\t{keyword}\t{FETCH_PAGE_SIZE}\t{page}"
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry["ts"] >= self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry["courses"], entry["is_last"]
+
+    def put(self, key, courses, is_last):
+        with self._lock:
+            self._entries[key] = {"ts": time.time(), "courses": courses, "is_last": is_last}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._dirty = True
+
+    def save(self):
+        """有新内容时写盘（在两次翻页之间、退出时调用，不占抓取线程）。"""
+        with self._lock:
+            if not self._dirty:
+                return
+            try:
+                save_json_atomic(self.path, self._entries)
+                self._dirty = False
+            except OSError as e:
+                print(f"⚠️ 写入查询缓存失败: {e}")
+
+
+class _PageFetcher:
+    """按关键字并发抓取、预取抓取页；结果写入缓存。会话失效时 page() 返回 None。
+
+    抓取在后台线程中进行，不直接打印；出错信息留到 page() 显示该页时再输出。
+    """
+
+    def __init__(self, student_code, batch_code, proxies, cache):
+        self.student_code = student_code
+        self.batch_code = batch_code
+        self.proxies = proxies
+        self.cache = cache
+        self.cookies = self.token = None
+        self._executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS)
+        self._inflight = {}     # 缓存键 → Future
+        self._errors = {}       # 缓存键 → 最近一次抓取的出错信息
+
+    def set_session(self, cookies, token):
+        self.cookies, self.token = cookies, token
+        self._inflight.clear()
+
+    def _fetch(self, keyword, page):
+        key = self.cache.key(self.batch_code, keyword, page)
+        errors = []
+        result = query_courses(keyword, page, self.student_code, self.batch_code,
+                               self.cookies, self.token, self.proxies, page_size=FETCH_PAGE_SIZE,
+                               errors=errors)
+        if result is not None:
+            self.cache.put(key, *result)
+            self._errors.pop(key, None)
+        elif errors:
+            self._errors[key] = errors[-1]
+        return result
+
+    def _submit(self, keyword, page) -> Future | None:
+        """缓存中没有且尚未在抓取时提交后台抓取。"""
+        key = self.cache.key(self.batch_code, keyword, page)
+        if key in self._inflight or self.cache.get(key) is not None:
+            return self._inflight.get(key)
+        future = self._inflight[key] = self._executor.submit(self._fetch, keyword, page)
+        future.add_done_callback(lambda f: self._inflight.get(key) is f and self._inflight.pop(key, None))
+        return future
+
+    def search(self, keyword):
+        """新搜索：第一页与其后的 PREFETCH_PAGES 页一起并发发出。"""
+        for p in range(PREFETCH_PAGES + 1):
+            self._submit(keyword, p)
+
+    def prefetch(self, keyword, page):
+        """后台抓取 page 之后的 PREFETCH_PAGES 页（已知 page 是最后一页时不抓）。"""
+        cached = self.cache.get(self.cache.key(self.batch_code, keyword, page))
+        if cached is not None and cached[1]:
+            return
+        for p in range(page + 1, page + 1 + PREFETCH_PAGES):
+            self._submit(keyword, p)
+
+    def page(self, keyword, page):
+        """返回 (courses, is_last, 是否来自缓存)。"""
+        key = self.cache.key(self.batch_code, keyword, page)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return (*cached, True)
+        future = self._submit(keyword, page)
+        result = future.result() if future is not None else self.cache.get(key)
+        if result is None:
+            error = self._errors.pop(key, None)
+            if error:
+                print(error)
+            return None
+        return (*result, False)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def fetch_display_page(fetcher, keyword, page_number):
+    """取第 page_number 屏（PAGE_SIZE 条）：返回 (courses, is_last, 是否来自缓存)，会话失效返回 None。"""
+    per_fetch = FETCH_PAGE_SIZE // PAGE_SIZE
+    fetch_page, offset = divmod(page_number, per_fetch)
+    result = fetcher.page(keyword, fetch_page)
+    if result is None:
+        return None
+    items, fetch_is_last, from_cache = result
+    fetcher.prefetch(keyword, fetch_page)
+
+    start = offset * PAGE_SIZE
+    courses = items[start:start + PAGE_SIZE]
+    is_last = fetch_is_last and start + PAGE_SIZE >= len(items)
+    return courses, is_last, from_cache
 
 
 # ===================== 展示 =====================
 
-def display_page(courses, page_number, is_last, keyword, jxblx_map):
+def display_page(courses, page_number, is_last, keyword, jxblx_map, from_cache=False):
     total_hint = "最后一页" if is_last else "下一页: d"
+    cache_hint = "  |  缓存" if from_cache else ""
     print(f"\n{'='*70}")
-    print(f"  搜索: \"{keyword}\"  |  第 {page_number + 1} 页  |  {total_hint}")
+    print(f"  搜索: \"{keyword}\"  |  第 {page_number + 1} 页  |  {total_hint}{cache_hint}")
     print(f"{'='*70}")
 
     if not courses:
@@ -318,9 +490,14 @@ def main():
         print(f"    jxblx={k:>2s} → courseKind={ck:<5s}  type={mc:<6s}  {mn}")
     print()
 
+    cache = _QueryCache()
+    atexit.register(cache.save)
+    fetcher = _PageFetcher(student_code, batch_code, proxies, cache)
+    fetcher.set_session(cookies, token)
+    atexit.register(fetcher.close)
+
     keyword = ""
     page_number = 0
-    cached_pages = {}
 
     while True:
         if not keyword:
@@ -329,34 +506,32 @@ def main():
             if not keyword:
                 continue
             page_number = 0
-            cached_pages.clear()
-
-        if page_number in cached_pages:
-            courses, is_last = cached_pages[page_number]
-        else:
-            print(f"\n>>> 正在查询第 {page_number + 1} 页...")
-            result = query_courses(keyword, page_number, student_code, batch_code, cookies, token, proxies)
-
+            fetcher.search(keyword)
+
+        print(f"\n>>> 正在查询第 {page_number + 1} 页...")
+        result = fetch_display_page(fetcher, keyword, page_number)
+
+        if result is None:
+            print(">>> Session 失效，正在重新登录...")
+            cookies, token = acquire_session(force_refresh=True)
+            if not (cookies and token):
+                print("❌ 重新登录失败")
+                sys.exit(1)
+            fetcher.set_session(cookies, token)
+            # 重新登录后也刷新映射
+            new_map = fetch_jxblx_map(student_code, cookies, token, proxies)
+            if new_map:
+                jxblx_map = new_map
+            result = fetch_display_page(fetcher, keyword, page_number)
             if result is None:
-                print(">>> Session 失效，正在重新登录...")
-                cookies, token = acquire_session(force_refresh=True)
-                if not (cookies and token):
-                    print("❌ 重新登录失败")
-                    sys.exit(1)
-                # 重新登录后也刷新映射
-                new_map = fetch_jxblx_map(student_code, cookies, token, proxies)
-                if new_map:
-                    jxblx_map = new_map
-                result = query_courses(keyword, page_number, student_code, batch_code, cookies, token, proxies)
-                if result is None:
-                    print("❌ 查询仍然失败")
-                    sys.exit(1)
-
-            courses, is_last = result
-            cached_pages[page_number] = (courses, is_last)
+                print("❌ 查询仍然失败")
+                sys.exit(1)
+
+        courses, is_last, from_cache = result
+        cache.save()
 
         clear_screen()
-        display_page(courses, page_number, is_last, keyword, jxblx_map)
+        display_page(courses, page_number, is_last, keyword, jxblx_map, from_cache)
 
         cmd = input("\n>>> ").strip().lower()
 
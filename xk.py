@@ -1,6 +1,11 @@
 """南京大学选课助手 —— 循环抢课模式
 
 自动登录 → 循环请求选课接口 → 抢到后推送通知并移除 → 直到全部完成。
+每轮的提交次数为待提交门数，按 course.conf 第 5 列优先级分配（lib/course_scheduler.py）。
+每次提交与轮询结果另记入 JSON Lines 事件日志（lib/event_log.py），用 tools/analyze_run.py 汇总；
+xk.conf 设置 METRICS_PORT 后同时在本地提供 Prometheus 指标端点（lib/metrics.py）。
+course.conf 只在启动时完整读取一次，之后由 lib/course_store.py 维护内存副本：
+手动编辑会在下一轮自动重新加载，抢到的课延迟合并写回。
 """
 
 import json
@@ -10,7 +15,6 @@ import sys
 import time
 from typing import Any, Dict, Tuple
 
-import requests
 import urllib3
 
 # 将项目根目录加入 sys.path
@@ -18,47 +22,28 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from lib.common import (
     load_xk_config,
-    load_course_conf,
-    remove_course_from_conf,
-    encrypt_add_param,
-    build_headers,
+    encrypt_select_param,
+    prepare_select_params,
+    is_session_expired,
     build_proxies,
     clear_env_proxies,
-    poll_process_result,
+    init_http_pool,
+    get_http_pool,
 )
-from lib.session_manager import acquire_session
+from lib.course_scheduler import StrideScheduler
+from lib.course_store import CourseStore
+from lib.event_log import emit, init_event_log
+from lib.metrics import start_metrics_server
+from lib.result_poller import ResultPoller
+from lib.session_manager import SessionManager
 from lib.serverchan import send_serverchan_notification
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 TARGET_URL = "https://xk.nju.edu.cn/xsxkapp/sys/xsxkapp/elective/volunteer.do"
 
-
-def _is_session_expired(res_json: Dict[str, Any] | None) -> bool:
-    """与前端 bh_utils.js / grablessons.min.js 保持一致的登录失效检测。
-
-    前端两种判定方式:
-    1. resp.loginURL 存在且非空  (bh_utils.js doAjax)
-    2. resp.code == "302"         (grablessons.min.js)
-    """
-    if not isinstance(res_json, dict):
-        return False
-    # 主要判定：loginURL
-    login_url = res_json.get("loginURL")
-    if login_url:  # not None / not ""
-        return True
-    # 次要判定：code == "302"
-    if str(res_json.get("code", "")) == "302":
-        return True
-    return False
-
-
-def _try_int(val):
-    """纯数字字符串转 int，与浏览器前端 JSON 类型保持一致。"""
-    try:
-        return int(val)
-    except (ValueError, TypeError):
-        return val
+# 连接池大小：顺序提交 + 结果轮询
+HTTP_POOL_SIZE = 2
 
 
 def _do_select_one(
@@ -69,36 +54,77 @@ def _do_select_one(
     session_cookies: Dict[str, str],
     headers: Dict[str, str],
     proxies: Dict[str, str] | None,
-) -> Tuple[Dict[str, Any] | None, str]:
-    """对单门课发起一次选课请求。返回 (json_or_none, raw_text)。"""
-    payload = {
-        "data": {
-            "operationType": "1",
-            "studentCode": student_code,
-            "electiveBatchCode": elective_batch_code,
-            "teachingClassId": course[0],
-            "courseKind": _try_int(course[1]),
-            "teachingClassType": course[2],
-        }
-    }
-
-    r = requests.post(
+) -> Tuple[Dict[str, Any] | None, str, int]:
+    """对单门课发起一次选课请求。返回 (json_or_none, raw_text, http_status)。"""
+    r = get_http_pool().post(
         TARGET_URL,
         cookies=session_cookies,
         headers=headers,
         data={
-            "addParam": encrypt_add_param(payload),
+            "addParam": encrypt_select_param(student_code, elective_batch_code, course),
             "studentCode": student_code,
         },
         proxies=proxies,
-        verify=False,
         timeout=10,
     )
     r.encoding = "utf-8"
+    timing = getattr(r, "conn_timing", None)
+    if timing and timing["new"]:
+        print(f"    (新建连接: TCP {timing['connect_ms']:.0f}ms, TLS {timing['tls_ms']:.0f}ms)")
     try:
-        return r.json(), r.text
+        return r.json(), r.text, r.status_code
     except Exception:
-        return None, r.text
+        return None, r.text, r.status_code
+
+
+def _emit_submit(student_code: str, course: Tuple[str, str, str, str], sent: float,
+                 status: int | None, outcome: str, generation: int,
+                 res_json: Dict[str, Any] | None = None, msg: str | None = None) -> None:
+    """记一条 submit 事件；recv 取调用时刻，需在拿到响应后立即调用。"""
+    recv = time.time()
+    code = None
+    if isinstance(res_json, dict):
+        code, msg = str(res_json.get("code", "")), str(res_json.get("msg", ""))
+    emit("submit", user=student_code, course=course[0], sent=sent, recv=recv,
+         latency_ms=round((recv - sent) * 1000, 1), status=status, code=code, msg=msg,
+         outcome=outcome, generation=generation)
+
+
+def _handle_poll_results(poller: ResultPoller, scheduler: StrideScheduler, store: CourseStore,
+                         timeout: float = 0.0) -> bool:
+    """处理后台轮询器产出的结果。全部课程已完成时返回 True。"""
+    finished = False
+    for course, poll in poller.drain(timeout):
+        class_id, kind, ctype, remark = course
+        poll_code = str(poll.get("code", ""))
+        poll_msg = poll.get("msg", "")
+        scheduler.on_poll(class_id, poll_code, poll_msg)
+
+        if poll_code == "1":
+            now_str = time.strftime("%Y-%m-%d %H:%M:%S")
+            print(f"    ✅ 选课成功: {class_id} ({ctype}) @ {now_str}")
+            if poll_msg:
+                print(f"       服务器消息: {poll_msg}")
+
+            desp = (f"teachingClassId: {class_id}\ncourseKind: {kind}\n"
+                    f"teachingClassType: {ctype}\ntime: {now_str}")
+            if remark:
+                desp += f"\n备注: {remark}"
+            send_serverchan_notification("✅ 选课成功", desp)
+
+            if store.remove(course):
+                print("    >>> 已从 course.conf 删除该课程")
+            if not store:
+                finished = True
+
+        elif poll_code == "-1":
+            print(f"    ❌ 选课失败 {class_id}: {poll_msg}")
+        elif poll_code == "timeout":
+            print(f"    ⚠️ 轮询超时 {class_id}，未能确认结果: {poll_msg}")
+        else:
+            print(f"    ⚠️ 轮询返回未知状态 {class_id}: code={poll_code}, msg={poll_msg}")
+
+    return finished
 
 
 def main() -> None:
@@ -120,32 +146,47 @@ def main() -> None:
     if proxies:
         print(f">>> 启用代理: {proxy_url}")
 
-    # 1.5 预检查 course.conf
+    # 1.5 预检查 course.conf，顺便预计算各课程的加密 addParam 前缀
     try:
-        load_course_conf()
+        store = CourseStore()
+        prepare_select_params(student_code, store.elective_batch_code, store.courses)
     except Exception as e:
         print(f"❌ 读取 course.conf 失败: {e}")
         return
 
+    init_event_log(config, "xk")
+    start_metrics_server(config)
+    emit("run_start", script="xk", engine="loop", user=student_code,
+         courses=len(store))
+
     # 2. 获取 Session
     print(">>> 正在获取登录凭证...")
-    session_cookies, token = acquire_session()
-    if not (session_cookies and token):
+    sessions = SessionManager()
+    if not sessions.start():
         print(">>> 登录失败或 Session 无效，无法继续。")
         return
+    print(f">>> 凭证获取成功，Token: {str(sessions.get().token)[:10]}...")
+
+    http = init_http_pool(HTTP_POOL_SIZE)
+    warmed = http.warm_up(proxies)
+    print(f">>> 连接池预热: {warmed}/{http.pool_size} 条连接")
 
-    headers = build_headers(token)
-    print(f">>> 凭证获取成功，Token: {str(token)[:10]}...")
+    poller = ResultPoller(student_code, proxies, sessions=sessions).start()
+    scheduler = StrideScheduler()
 
     # 3. 循环抢课
     round_no = 0
     while True:
-        try:
-            elective_batch_code, courses = load_course_conf()
-        except Exception as e:
-            print(f"❌ 读取 course.conf 失败: {e}")
+        if _handle_poll_results(poller, scheduler, store):
+            print(">>> 所有课程已完成，退出。")
             return
 
+        # 只 stat 一次，文件被手动修改过才重新读取
+        if store.refresh():
+            prepare_select_params(student_code, store.elective_batch_code, store.courses)
+        elective_batch_code, courses = store.elective_batch_code, store.courses
+        scheduler.set_priorities(store.priorities)
+
         if not courses:
             print(">>> course.conf 已无课程（可能都抢到了），退出。")
             return
@@ -153,47 +194,66 @@ def main() -> None:
         round_no += 1
         print(f"\n========== 第 {round_no} 轮，共 {len(courses)} 门课程 ==========")
 
-        for idx, course in enumerate(list(courses), 1):
+        # 轮询中的课不占名额，其余按优先级分配本轮的提交次数
+        targets = [c for c in courses if not poller.is_pending(c[0])]
+        plan = scheduler.plan(targets, len(targets))
+        for idx, course in enumerate(plan, 1):
+            if _handle_poll_results(poller, scheduler, store):
+                print(">>> 所有课程已完成，退出。")
+                return
+
             class_id, kind, ctype, remark = course
             remark_str = f", 备注={remark}" if remark else ""
-            print(f"\n[{idx}/{len(courses)}] 班级ID={class_id}, courseKind={kind}, "
+            print(f"\n[{idx}/{len(plan)}] 班级ID={class_id}, courseKind={kind}, "
                   f"teachingClassType={ctype}{remark_str}")
 
-            # 发起请求
+            if poller.is_pending(class_id):
+                print("    ⏳ 上次提交仍在等待结果，本轮跳过")
+                continue
+
+            # 发起请求（凭证只读内存，由后台线程保持有效）
+            creds = sessions.get()
+            sent = time.time()
             try:
-                res_json, raw = _do_select_one(
+                res_json, raw, status = _do_select_one(
                     student_code=student_code,
                     elective_batch_code=elective_batch_code,
                     course=course,
-                    session_cookies=session_cookies,
-                    headers=headers,
+                    session_cookies=creds.cookies,
+                    headers=creds.headers,
                     proxies=proxies,
                 )
             except Exception as e:
+                _emit_submit(student_code, course, sent, None, "error", creds.generation, msg=str(e))
                 print(f"    ❌ 请求发生网络错误: {e}")
                 time.sleep(random.uniform(1, 3))
                 continue
 
             # 登录失效检测与重试（与前端 loginURL / code=302 逻辑一致）
-            if _is_session_expired(res_json):
-                print("    ⚠️ 检测到登录失效（loginURL/302），重新获取登录凭证...")
-                session_cookies, token = acquire_session()
-                if not (session_cookies and token):
+            if is_session_expired(res_json):
+                _emit_submit(student_code, course, sent, status, "expired", creds.generation, res_json)
+                print("    ⚠️ 检测到登录失效（loginURL/302），等待后台刷新登录态...")
+                sessions.report_expired(creds.generation)
+                if not sessions.wait_newer(creds.generation):
                     print("    ❌ 重新获取登录凭证失败，跳过本次")
                     time.sleep(random.uniform(1, 3))
                     continue
-                headers = build_headers(token)
+                creds = sessions.get()
+                http.reset()
+                http.warm_up(proxies)
 
+                sent = time.time()
                 try:
-                    res_json, raw = _do_select_one(
+                    res_json, raw, status = _do_select_one(
                         student_code=student_code,
                         elective_batch_code=elective_batch_code,
                         course=course,
-                        session_cookies=session_cookies,
-                        headers=headers,
+                        session_cookies=creds.cookies,
+                        headers=creds.headers,
                         proxies=proxies,
                     )
                 except Exception as e:
+                    _emit_submit(student_code, course, sent, None, "error", creds.generation, msg=str(e))
                     print(f"    ❌ 重试请求发生网络错误: {e}")
                     time.sleep(random.uniform(1, 3))
                     continue
@@ -203,51 +263,21 @@ def main() -> None:
             code = res_json.get("code") if isinstance(res_json, dict) else None
 
             if str(code) == "1":
+                outcome = "queued"
+            elif res_json is None:
+                outcome = "nonjson"
+            elif is_session_expired(res_json):
+                outcome = "expired"
+            else:
+                outcome = "qos" if "NullPointer" in str(msg) else "rejected"
+            _emit_submit(student_code, course, sent, status, outcome, creds.generation, res_json)
+            scheduler.on_submit(class_id, outcome, msg)
+
+            if outcome == "queued":
                 # volunteer.do 返回 code="1" 只表示请求已入队
-                # 需要轮询 studentstatus.do 获取真正结果
-                print(f"    ⏳ 请求已提交，轮询处理结果...")
-                poll = poll_process_result(
-                    student_code=student_code,
-                    teaching_class_id=class_id,
-                    session_cookies=session_cookies,
-                    headers=headers,
-                    proxies=proxies,
-                )
-                poll_code = str(poll.get("code", ""))
-                poll_msg = poll.get("msg", "")
-
-                if poll_code == "1":
-                    now_str = time.strftime("%Y-%m-%d %H:%M:%S")
-                    print(f"    ✅ 选课成功: {class_id} ({ctype}) @ {now_str}")
-                    if poll_msg:
-                        print(f"       服务器消息: {poll_msg}")
-
-                    desp = (f"teachingClassId: {class_id}\ncourseKind: {kind}\n"
-                            f"teachingClassType: {ctype}\ntime: {now_str}")
-                    if remark:
-                        desp += f"\n备注: {remark}"
-                    send_serverchan_notification("✅ 选课成功", desp)
-
-                    if remove_course_from_conf(course):
-                        print("    >>> 已从 course.conf 删除该课程")
-                    else:
-                        print("    !!! 选课成功但未能从 course.conf 删除")
-
-                    # 检查是否全部完成
-                    try:
-                        _, left = load_course_conf()
-                        if not left:
-                            print(">>> 所有课程已完成，退出。")
-                            return
-                    except Exception:
-                        return
-
-                elif poll_code == "-1":
-                    print(f"    ❌ 选课失败: {poll_msg}")
-                elif poll_code == "timeout":
-                    print(f"    ⚠️ 轮询超时，未能确认结果: {poll_msg}")
-                else:
-                    print(f"    ⚠️ 轮询返回未知状态: code={poll_code}, msg={poll_msg}")
+                # 真正结果交给后台轮询器，提交循环继续
+                print(f"    ⏳ 请求已提交，后台轮询处理结果...")
+                poller.submit(course)
 
             else:
                 if res_json is not None:
@@ -258,17 +288,20 @@ def main() -> None:
             time.sleep(random.uniform(0.5, 1.2))
 
         # 每轮结束检查
-        try:
-            _, left = load_course_conf()
-            if not left:
-                print(">>> 所有课程已完成，退出。")
-                return
-        except Exception:
+        if not store:
+            print(">>> 所有课程已完成，退出。")
             return
 
+        print(f"\n>>> {http.stats_line()}")
         sleep_s = random.uniform(3, 8)
-        print(f"\n>>> 本轮结束，休息 {sleep_s:.1f}s 后进入下一轮...")
-        time.sleep(sleep_s)
+        print(f">>> 本轮结束，休息 {sleep_s:.1f}s 后进入下一轮...")
+        emit("backoff", user=student_code, reason="round", delay=round(sleep_s, 3), hits=0)
+        # 休息期间结果一到就处理
+        deadline = time.monotonic() + sleep_s
+        while (left_s := deadline - time.monotonic()) > 0:
+            if _handle_poll_results(poller, scheduler, store, timeout=left_s):
+                print(">>> 所有课程已完成，退出。")
+                return
 
 
 if __name__ == "__main__":
@@ -0,0 +1,356 @@
+"""南京大学选课助手 —— 多账号守护模式
+
+一个进程同时为 config/accounts.conf 中的多个账号抢课（配置格式见 lib/accounts.py）：
+  - 共享一份验证码模型、一个长连接池、一个全局 AIMD 限速闸门（lib/rate_control.py）
+  - 每个账号有自己的课程文件、登录缓存和结果轮询器；课程文件由 CourseStore（lib/course_store.py）
+    常驻内存，运行中手动编辑会在下一轮生效，抢到的课延迟合并写回
+  - 每轮按账号轮转分配提交名额（ROUND_BUDGET），课程多的账号不会挤占课程少的账号；
+    账号内部按课程文件第 5 列优先级做 stride 调度（lib/course_scheduler.py）
+  - 某个账号会话过期时只有它在后台重新登录，其余账号照常提交
+  - 各账号的提交、轮询结果、登录态事件记入同一份事件日志（带 user 字段，见 lib/event_log.py）
+
+用法：
+  python xk_daemon.py
+  python xk_daemon.py --accounts config/accounts.conf
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Tuple
+
+import urllib3
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from lib.accounts import Account, load_accounts
+from lib.captcha import preload_solver
+from lib.common import (
+    is_qos_response,
+    clear_env_proxies,
+    encrypt_select_param,
+    get_http_pool,
+    init_http_pool,
+    is_session_expired,
+    prepare_select_params,
+)
+from lib.course_scheduler import StrideScheduler
+from lib.course_store import CourseStore
+from lib.event_log import emit, init_event_log
+from lib.metrics import set_rate_limiter, start_metrics_server
+from lib.rate_control import AdaptiveRateLimiter, build_controller
+from lib.result_poller import ResultPoller
+from lib.serverchan import send_serverchan_notification
+from lib.session_manager import Credentials, SessionManager
+
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+TARGET_URL = "https://xk.nju.edu.cn/xsxkapp/sys/xsxkapp/elective/volunteer.do"
+
+Course = Tuple[str, str, str, str]
+
+# ===== 速率控制（所有账号共享）=====
+MAX_WORKERS = 3            # 起步并发数（自适应时最高到 RATE_CONTROL.MAX_WORKERS）
+MIN_INTERVAL = 0.35        # 起步请求间隔(秒)（自适应时最低到 RATE_CONTROL.MIN_INTERVAL）
+ROUND_BUDGET = 12          # 每轮最多提交次数，按账号轮转分配
+BASE_ROUND_DELAY = (2, 4)  # 轮间随机延迟(秒)
+QOS_BACKOFF_BASE = 3.0     # QoS 退避基础(秒)，仅关闭自适应时使用
+QOS_BACKOFF_MAX = 15.0     # QoS 退避上限(秒)
+POLL_WAIT_IDLE = 1.0       # 没有可提交课程时，单次等待轮询结果的时长(秒)
+
+
+class _AccountRunner:
+    """单个账号的抢课状态：剩余课程、结果轮询器、该账号的 SessionManager。"""
+
+    def __init__(self, account: Account):
+        self.account = account
+        self.user = account.user
+        self.store = CourseStore(account.course_conf)
+        prepare_select_params(self.user, self.store.elective_batch_code, self.store.courses)
+        self.scheduler = StrideScheduler(self.store.priorities)
+        self.sessions = SessionManager(conf=account.conf, cache_file=account.session_cache,
+                                       lock_file=account.lock_file, name=self.user)
+        self.sessions.add_listener(self._on_credentials)
+        self.poller = ResultPoller(self.user, account.proxies, sessions=self.sessions).start()
+        self._expired_gen = 0           # 已被服务端判定失效的凭证代数
+
+    def _on_credentials(self, creds: Credentials) -> None:
+        print(f"    [{self.user}] 凭证就绪，Token: {str(creds.token)[:10]}...")
+
+    @property
+    def creds(self) -> Credentials | None:
+        """当前可用的凭证；尚未登录或已报告失效、新凭证未到时为 None。"""
+        creds = self.sessions.get()
+        if creds is None or creds.generation <= self._expired_gen:
+            return None
+        return creds
+
+    @property
+    def elective_batch_code(self) -> str:
+        return self.store.elective_batch_code
+
+    @property
+    def done(self) -> bool:
+        return not self.store
+
+    def report_expired(self, creds: Credentials) -> None:
+        """该代凭证已失效：登录成功前不再提交，由 SessionManager 后台重新登录。"""
+        self._expired_gen = max(self._expired_gen, creds.generation)
+        self.sessions.report_expired(creds.generation)
+
+    def targets(self) -> List[Course]:
+        """本轮可提交的课程（结果仍在轮询中的不重复提交）。课程文件被手动修改过时先重新加载。"""
+        if self.store.refresh():
+            prepare_select_params(self.user, self.store.elective_batch_code, self.store.courses)
+            self.scheduler.set_priorities(self.store.priorities)
+        return [c for c in self.store.courses if not self.poller.is_pending(c[0])]
+
+    def handle_poll_results(self, timeout: float = 0.0) -> int:
+        """处理轮询结果，抢到的课程从内存和该账号的课程文件中移除。返回抢到门数。"""
+        got = 0
+        for course, poll in self.poller.drain(timeout):
+            cid = course[0]
+            poll_code = str(poll.get("code", ""))
+            poll_msg = poll.get("msg", "")
+            self.scheduler.on_poll(cid, poll_code, poll_msg)
+
+            if poll_code == "1":
+                now_str = time.strftime("%H:%M:%S")
+                print(f"    🎉 [{self.user}] [抢到了!] {cid} @ {now_str}")
+                if poll_msg:
+                    print(f"       服务器消息: {poll_msg}")
+                self.store.remove(course)
+                class_id, kind, ctype, remark = course
+                desp = (f"学号: {self.user}\nteachingClassId: {class_id}\ncourseKind: {kind}\n"
+                        f"teachingClassType: {ctype}\ntime: {now_str}")
+                if remark:
+                    desp += f"\n备注: {remark}"
+                send_serverchan_notification(f"选课成功: {cid} ({self.user})", desp,
+                                             conf=self.account.conf)
+                got += 1
+            elif poll_code == "-1":
+                print(f"    ❌ [{self.user}] [选课失败] {cid}: {poll_msg}")
+            elif poll_code == "timeout":
+                print(f"    ⚠️ [{self.user}] [轮询超时] {cid}: {poll_msg}")
+            else:
+                print(f"    ⚠️ [{self.user}] [轮询未知状态] {cid}: code={poll_code}, msg={poll_msg}")
+        return got
+
+
+def _fair_schedule(runners: List[_AccountRunner], budget: int, round_no: int) -> List[Tuple[_AccountRunner, Course]]:
+    """按账号轮转分配本轮提交名额：每个账号轮流分一个，直到名额用完或各账号都分到其待提交门数。
+
+    起始账号每轮后移一位；账号内部由其 StrideScheduler 按课程优先级挑课，各账号的提交交错发出。
+    """
+    queues = [(r, r.targets()) for r in runners]
+    queues = [(r, q) for r, q in queues if q]
+    if not queues:
+        return []
+    start = round_no % len(queues)
+    queues = queues[start:] + queues[:start]
+
+    shares = [0] * len(queues)
+    left = budget
+    while left > 0:
+        took = False
+        for i, (_, q) in enumerate(queues):
+            if shares[i] < len(q) and left > 0:
+                shares[i] += 1
+                left -= 1
+                took = True
+        if not took:
+            break
+
+    picks = [r.scheduler.plan(q, n) for (r, q), n in zip(queues, shares)]
+    plan: List[Tuple[_AccountRunner, Course]] = []
+    for depth in range(max(shares)):
+        for (r, _), p in zip(queues, picks):
+            if depth < len(p):
+                plan.append((r, p[depth]))
+    return plan
+
+
+def _submit(limiter: AdaptiveRateLimiter, runner: _AccountRunner, course: Course,
+            creds: Credentials) -> Dict[str, Any]:
+    token = limiter.acquire()
+    sent = time.time()
+    try:
+        r = get_http_pool().post(
+            TARGET_URL,
+            cookies=creds.cookies,
+            headers=creds.headers,
+            data={
+                "addParam": encrypt_select_param(runner.user, runner.elective_batch_code, course),
+                "studentCode": runner.user,
+            },
+            proxies=runner.account.proxies,
+            timeout=15,
+        )
+        recv = time.time()
+        r.encoding = "utf-8"
+        res = {"success": True, "status": r.status_code, "sent": sent, "recv": recv}
+        try:
+            res["json"] = r.json()
+        except Exception:
+            res["json"] = None
+            res["raw"] = r.text
+    except Exception as e:
+        res = {"success": False, "error": str(e), "json": None, "sent": sent, "recv": time.time()}
+    limiter.release(token, res["success"] and not is_qos_response(res["json"]), res["recv"] - sent)
+    return res
+
+
+def _handle_submit_result(runner: _AccountRunner, course: Course, res: Dict[str, Any],
+                          creds: Credentials) -> str | None:
+    """处理一次提交的返回并记 submit 事件。返回 "qos" / "expired" / None。"""
+    cid = course[0]
+    tag = f"[{runner.user}] {cid}"
+    res_json = res.get("json")
+    code = msg = None
+
+    if not res["success"]:
+        print(f"    [网络错误] {tag}: {res.get('error')}")
+        outcome, msg = "error", res.get("error")
+    elif res_json is None:
+        print(f"    [非JSON响应] {tag}: {str(res.get('raw', ''))[:200]}...")
+        outcome = "nonjson"
+    else:
+        code = str(res_json.get("code", ""))
+        msg = str(res_json.get("msg", ""))
+        if is_session_expired(res_json):
+            print(f"    [会话过期] {tag}: 检测到 loginURL/302")
+            outcome = "expired"
+        elif code == "1":
+            print(f"    ⏳ {tag} 请求已提交，后台轮询处理结果...")
+            runner.poller.submit(course)
+            outcome = "queued"
+        elif "NullPointer" in msg:
+            print(f"    [服务器繁忙/QoS] {tag} (NPE)")
+            outcome = "qos"
+        else:
+            print(f"    >>> {tag} 返回: {res_json}")
+            outcome = "rejected"
+
+    emit("submit", user=runner.user, course=cid, sent=res["sent"], recv=res["recv"],
+         latency_ms=round((res["recv"] - res["sent"]) * 1000, 1), status=res.get("status"),
+         code=code, msg=msg, outcome=outcome, generation=creds.generation)
+    runner.scheduler.on_submit(cid, outcome, msg)
+    if outcome in ("error", "nonjson", "qos"):
+        return "qos"
+    return "expired" if outcome == "expired" else None
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="南京大学选课助手 —— 多账号守护模式")
+    parser.add_argument("--accounts", help="账号列表文件，默认 config/accounts.conf")
+    return parser.parse_args()
+
+
+def main():
+    args = _parse_args()
+    try:
+        accounts = load_accounts(args.accounts)
+        clear_env_proxies()
+        runners = [_AccountRunner(acc) for acc in accounts]
+    except Exception as e:
+        print(f"❌ 初始化失败: {e}")
+        return
+
+    # EVENT_LOG / METRICS_PORT 是 xk.conf 的共享字段，已合并进每个账号的配置
+    init_event_log(accounts[0].conf, "xk_daemon")
+    start_metrics_server(accounts[0].conf)
+    total = sum(len(r.store) for r in runners)
+    emit("run_start", script="xk_daemon", users=[r.user for r in runners], courses=total)
+    print(f">>> 启动成功：{len(runners)} 个账号，共 {total} 门课程")
+    rate = build_controller(accounts[0].conf, MIN_INTERVAL, MAX_WORKERS)
+    print(f">>> 速率控制: {'AIMD 自适应，' if rate.adaptive else ''}{MAX_WORKERS} 并发起步 (上限 {rate.max_workers}), "
+          f"最小间隔 {MIN_INTERVAL}s, 每轮最多 {ROUND_BUDGET} 次提交")
+
+    # 所有账号共用一份验证码模型，先在后台加载
+    preload_solver()
+    http = init_http_pool(rate.max_workers + 1)
+    limiter = AdaptiveRateLimiter(rate)
+    set_rate_limiter(limiter)
+
+    for r in runners:
+        if not r.done:
+            r.sessions.start(wait=False)
+
+    round_no = 0
+    qos_hit_count = 0
+
+    with ThreadPoolExecutor(max_workers=rate.max_workers) as executor:
+        while True:
+            for r in runners:
+                r.handle_poll_results()
+            active = [r for r in runners if not r.done]
+            if not active:
+                break
+
+            creds = {r: c for r in active if (c := r.creds) is not None}
+            plan = _fair_schedule(list(creds), ROUND_BUDGET, round_no)
+            if not plan:
+                # 账号都在登录或结果都在轮询：等一会儿再看
+                time.sleep(POLL_WAIT_IDLE)
+                continue
+
+            round_no += 1
+            per_user: Dict[str, int] = {}
+            for r, _ in plan:
+                per_user[r.user] = per_user.get(r.user, 0) + 1
+            print(f"\n===== 第 {round_no} 轮 ({len(plan)} 次提交: "
+                  + ", ".join(f"{u}×{n}" for u, n in per_user.items()) + ") =====")
+
+            futures = {
+                executor.submit(_submit, limiter, r, course, creds[r]): (r, course)
+                for r, course in plan
+            }
+            round_qos = False
+            expired = set()
+            for future in as_completed(futures):
+                r, course = futures[future]
+                outcome = _handle_submit_result(r, course, future.result(), creds[r])
+                if outcome == "qos":
+                    round_qos = True
+                elif outcome == "expired":
+                    expired.add(r)
+
+            for r in expired:
+                print(f"    ⚠️ [{r.user}] 会话过期，后台重新登录...")
+                r.report_expired(creds[r])
+            print(f"    >>> {http.stats_line()}")
+
+            # 自适应模式下 QoS 已在请求级别减速，只在固定限速时整轮退避
+            round_backoff = round_qos and not rate.adaptive
+            if round_backoff:
+                qos_hit_count += 1
+                backoff = min(QOS_BACKOFF_BASE * (2 ** (qos_hit_count - 1)), QOS_BACKOFF_MAX)
+                delay = backoff + random.uniform(0, backoff * 0.3)
+                print(f"    ⚠️ 检测到 QoS/繁忙，退避 {delay:.1f}s (第 {qos_hit_count} 次)")
+            else:
+                qos_hit_count = max(0, qos_hit_count - 1)
+                delay = random.uniform(*BASE_ROUND_DELAY)
+            emit("backoff", reason="qos" if round_backoff else "round", delay=round(delay, 3), hits=qos_hit_count)
+
+            # 退避期间结果一到就处理
+            deadline = time.monotonic() + delay
+            while (left_s := deadline - time.monotonic()) > 0:
+                if not any(r.poller.pending_count for r in runners):
+                    time.sleep(left_s)
+                    break
+                for r in runners:
+                    r.handle_poll_results()
+                time.sleep(min(left_s, 0.2))
+
+    for r in runners:
+        r.poller.stop()
+        r.sessions.stop()
+        r.store.close()
+    print(">>> ✅ 全部账号完成，退出。")
+
+
+if __name__ == "__main__":
+    main()
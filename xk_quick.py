@@ -1,108 +1,93 @@
 """南京大学选课助手 —— 并发抢课模式
 
 多线程并发提交选课请求，适合开放选课瞬间抢课。
-需要先通过 xk.py 或 tools/input_cookie.py 生成 session_cache.json。
+登录态由 SessionManager 在内存中维护：启动时复用 session_cache.json（无效则自动登录），
+之后后台定时校验、失效才重登，提交循环只读内存中的凭证。
 
-速率控制策略：
-  - 全局令牌桶限制约 2~3 req/s（单次请求间隔 ≥0.35s）
-  - 并发数限制为 3，利用 I/O 重叠加速而非暴力并发
-  - 检测到 QoS（NPE/网络错误）时指数退避，最长 15s
-  - 轮间间隔 2~4s，触发 QoS 后自动拉长
+速率控制策略（lib/rate_control.py）：
+  - 从 3 并发、请求间隔 0.35s 起步，AIMD 自适应：每个正常响应后加性提速、增加并发，
+    直到 xk.conf RATE_CONTROL 的上限；NPE / 非 JSON / 网络错误 / 延迟飙升时立即减半
+  - 轮间间隔 2~4s；关闭自适应（RATE_CONTROL.ADAPTIVE=false）时恢复固定间隔 + 轮间 QoS 指数退避（最长 15s）
+
+名额分配（lib/course_scheduler.py）：每轮提交次数仍为待提交门数，按 course.conf 第 5 列优先级
+做 stride 调度，重要的课一轮可提交多次；提交入队或排队失败的课临时加权。
+
+引擎选择：
+  python xk_quick.py                 # 线程池引擎（默认）
+  python xk_quick.py --engine async  # asyncio 引擎（需 httpx），轮询不阻塞提交
+
+定时开抢：
+  python xk_quick.py --fire-at "2026-02-20 12:30:00"
+  提前 60s 用 HTTP Date 头估算与服务器的时钟偏差，预热连接、预加密首批请求，
+  让第一波 volunteer.do 恰好在开放时刻到达，随后转入常规轮询。
+
+余量监视：
+  python xk_quick.py --watch
+  用 queryCourse.do 批量读取已选人数 / 容量，只在课程出现空位时提交（lib/seat_watcher.py）。
+
+每次提交、轮询结果、登录态更新、退避都记入 logs/ 下的 JSON Lines 事件日志（xk.conf 的 EVENT_LOG），
+用 tools/analyze_run.py 统计延迟分位数与成功率随时间的变化；设置 METRICS_PORT 后另有本地 Prometheus 指标端点。
+
+course.conf 由 CourseStore（lib/course_store.py）在内存中维护：运行中手动编辑会在下一轮生效，
+抢到的课从 course.conf 删除（合并后延迟写回）。
 """
 
+import argparse
+import asyncio
 import json
 import os
 import random
 import sys
 import time
-import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
 from typing import Any, Dict, List, Tuple
 
-import requests
 import urllib3
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from lib.common import (
-    SESSION_CACHE_FILE,
     load_xk_config,
-    load_course_conf,
-    load_json,
-    encrypt_add_param,
-    build_headers,
+    encrypt_select_param,
+    prepare_select_params,
+    is_session_expired,
     build_proxies,
     clear_env_proxies,
-    poll_process_result,
+    init_http_pool,
+    get_http_pool,
+    is_qos_response,
 )
+from lib.course_scheduler import StrideScheduler
+from lib.course_store import CourseStore
+from lib.event_log import emit, init_event_log
+from lib.metrics import set_rate_limiter, start_metrics_server
+from lib.rate_control import AdaptiveRateLimiter, build_controller
+from lib.fire_scheduler import estimate_clock_offset, fire_wave, parse_fire_at, wait_until
+from lib.result_poller import ResultPoller
+from lib.seat_watcher import SeatWatcher, SessionExpired
 from lib.serverchan import send_serverchan_notification
+from lib.session_manager import SessionManager
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 TARGET_URL = "https://xk.nju.edu.cn/xsxkapp/sys/xsxkapp/elective/volunteer.do"
 
 # ===== 速率控制 =====
-MAX_WORKERS = 3            # 并发线程数（利用I/O重叠，不暴力并发）
-MIN_INTERVAL = 0.35        # 全局最小请求间隔(秒)，约 2.8 req/s
+MAX_WORKERS = 3            # 起步并发数（自适应时最高到 RATE_CONTROL.MAX_WORKERS）
+MIN_INTERVAL = 0.35        # 起步请求间隔(秒)，约 2.8 req/s（自适应时最低到 RATE_CONTROL.MIN_INTERVAL）
 BASE_ROUND_DELAY = (2, 4)  # 轮间随机延迟(秒)
-QOS_BACKOFF_BASE = 3.0     # QoS 退避基础(秒)
+QOS_BACKOFF_BASE = 3.0     # QoS 退避基础(秒)，仅关闭自适应时使用
 QOS_BACKOFF_MAX = 15.0     # QoS 退避上限(秒)
+POLL_WAIT_IDLE = 1.0       # 所有课程都在等结果时，单次等待轮询器的时长(秒)
 
-
-class _RateLimiter:
-    """简易令牌桶：保证全局请求间隔 ≥ min_interval 秒。"""
-
-    def __init__(self, min_interval: float):
-        self._min_interval = min_interval
-        self._lock = threading.Lock()
-        self._last_time = 0.0
-
-    def acquire(self):
-        with self._lock:
-            now = time.monotonic()
-            wait = self._last_time + self._min_interval - now
-            if wait > 0:
-                time.sleep(wait)
-            self._last_time = time.monotonic()
-
-
-_rate_limiter = _RateLimiter(MIN_INTERVAL)
-
-
-def _is_session_expired(res_json: Dict[str, Any] | None) -> bool:
-    """与前端 bh_utils.js / grablessons.min.js 保持一致的登录失效检测。
-
-    前端两种判定方式:
-    1. resp.loginURL 存在且非空  (bh_utils.js doAjax)
-    2. resp.code == "302"         (grablessons.min.js)
-    """
-    if not isinstance(res_json, dict):
-        return False
-    login_url = res_json.get("loginURL")
-    if login_url:
-        return True
-    if str(res_json.get("code", "")) == "302":
-        return True
-    return False
-
-
-def _load_session_cache() -> Tuple[Dict[str, str], str]:
-    data = load_json(SESSION_CACHE_FILE)
-    token = data.get("token", "")
-    if not token:
-        raise ValueError("session_cache.json 中缺少 token")
-    return data.get("cookies", {}), token
-
-
-def _try_int(val):
-    """纯数字字符串转 int，与浏览器前端 JSON 类型保持一致。"""
-    try:
-        return int(val)
-    except (ValueError, TypeError):
-        return val
+# ===== 定时开抢 (--fire-at) =====
+FIRE_PREPARE_LEAD = 60.0   # 提前多久开始加载凭证、对时(秒)
+FIRE_REWARM_LEAD = 3.0     # 发出前多久再预热一次连接(秒)，避免空闲连接被服务端关闭
 
 
 def _do_select_one_task(
+    limiter: AdaptiveRateLimiter,
     student_code: str,
     elective_batch_code: str,
     course: Tuple[str, str, str, str],
@@ -111,43 +96,236 @@ def _do_select_one_task(
     proxies: Dict[str, str] | None,
 ) -> Dict[str, Any]:
     """单个线程执行的选课任务。"""
-    # 通过全局令牌桶控速
-    _rate_limiter.acquire()
-
-    payload = {
-        "data": {
-            "operationType": "1",
-            "studentCode": student_code,
-            "electiveBatchCode": elective_batch_code,
-            "teachingClassId": course[0],
-            "courseKind": _try_int(course[1]),
-            "teachingClassType": course[2],
-        }
-    }
+    # 全局闸门：并发与请求间隔由 AIMD 控制器决定，响应一到就反馈
+    token = limiter.acquire()
 
+    sent = time.time()
     try:
-        r = requests.post(
+        r = get_http_pool().post(
             TARGET_URL,
             cookies=session_cookies,
             headers=headers,
             data={
-                "addParam": encrypt_add_param(payload),
+                "addParam": encrypt_select_param(student_code, elective_batch_code, course),
                 "studentCode": student_code,
             },
             proxies=proxies,
-            verify=False,
             timeout=15,
         )
-        r.encoding = "utf-8"
-        try:
-            return {"success": True, "json": r.json(), "course": course}
-        except Exception:
-            return {"success": True, "json": None, "course": course, "raw": r.text}
+        res = _parse_select_response(r, course, sent, time.time())
     except Exception as e:
-        return {"success": False, "error": str(e), "course": course}
+        res = {"success": False, "error": str(e), "course": course, "sent": sent, "recv": time.time()}
+    limiter.release(token, res["success"] and not is_qos_response(res["json"]), res["recv"] - sent)
+    return res
+
+
+def _parse_select_response(r, course: Tuple[str, str, str, str],
+                           sent: float, recv: float) -> Dict[str, Any]:
+    r.encoding = "utf-8"
+    res = {"success": True, "course": course, "status": r.status_code, "sent": sent, "recv": recv}
+    try:
+        res["json"] = r.json()
+    except Exception:
+        res["json"] = None
+        res["raw"] = r.text
+    return res
+
+
+def _handle_submit_result(res: Dict[str, Any], poller: ResultPoller, scheduler: StrideScheduler,
+                          **event) -> str | None:
+    """处理一次提交的返回并记 submit 事件（event 为附加字段）。返回 "qos" / "expired" / None。"""
+    course = res["course"]
+    cid = course[0]
+    res_json = res.get("json")
+    code = msg = None
+
+    if not res["success"]:
+        print(f"    [网络错误] {cid}: {res.get('error')}")
+        outcome, msg = "error", res.get("error")
+    elif res_json is None:
+        # 非 JSON 响应
+        raw = res.get("raw", "")
+        print(f"    [非JSON响应] {cid}: {str(raw)[:200]}...")
+        outcome = "nonjson"
+    else:
+        code = str(res_json.get("code", ""))
+        msg = str(res_json.get("msg", ""))
+        if is_session_expired(res_json):
+            # 登录失效检测（与前端 loginURL / code=302 逻辑一致）
+            print(f"    [会话过期] {cid}: 检测到 loginURL/302")
+            outcome = "expired"
+        elif code == "1":
+            # volunteer.do 返回 code="1" 只表示请求已入队
+            # 真正结果交给后台轮询器，不阻塞本轮其余提交
+            print(f"    ⏳ [{cid}] 请求已提交，后台轮询处理结果...")
+            poller.submit(course)
+            outcome = "queued"
+        elif "NullPointer" in msg:
+            print(f"    [服务器繁忙/QoS] {cid} (NPE)")
+            outcome = "qos"
+        else:
+            # 非 code=1 的情况，打印完整返回方便调试
+            print(f"    >>> [{cid}] 返回: {res_json}")
+            outcome = "rejected"
+
+    emit("submit", user=poller.student_code, course=cid, sent=res["sent"], recv=res["recv"],
+         latency_ms=round((res["recv"] - res["sent"]) * 1000, 1), status=res.get("status"),
+         code=code, msg=msg, outcome=outcome, **event)
+    scheduler.on_submit(cid, outcome, msg)
+    if outcome in ("error", "nonjson", "qos"):
+        return "qos"
+    return "expired" if outcome == "expired" else None
+
+
+def _handle_poll_results(poller: ResultPoller, scheduler: StrideScheduler, store: CourseStore,
+                         timeout: float = 0.0,
+                         watcher: SeatWatcher | None = None) -> List[Tuple[str, str, str, str]]:
+    """处理后台轮询器产出的结果，抢到的课从 store 删除，返回抢到的课程。
+
+    余量监视模式下，没有得到服务器结论（轮询超时等）的课重新装填。
+    """
+    succeeded = []
+    for course, poll in poller.drain(timeout):
+        cid = course[0]
+        poll_code = str(poll.get("code", ""))
+        poll_msg = poll.get("msg", "")
+        scheduler.on_poll(cid, poll_code, poll_msg)
+
+        if poll_code == "1":
+            now_str = time.strftime("%H:%M:%S")
+            print(f"    🎉 [抢到了!] {cid} @ {now_str}")
+            if poll_msg:
+                print(f"       服务器消息: {poll_msg}")
+            class_id, kind, ctype, remark = course
+            desp = (f"teachingClassId: {class_id}\ncourseKind: {kind}\n"
+                    f"teachingClassType: {ctype}\ntime: {now_str}")
+            if remark:
+                desp += f"\n备注: {remark}"
+            send_serverchan_notification(f"选课成功: {cid}", desp)
+            if store.remove(course):
+                print("    >>> 已从 course.conf 删除该课程")
+            succeeded.append(course)
+        elif poll_code == "-1":
+            print(f"    ❌ [选课失败] {cid}: {poll_msg}")
+        elif poll_code == "timeout":
+            print(f"    ⚠️ [轮询超时] {cid}: {poll_msg}")
+        else:
+            print(f"    ⚠️ [轮询未知状态] {cid}: code={poll_code}, msg={poll_msg}")
+        if watcher is not None and poll_code not in ("1", "-1"):
+            watcher.rearm(course)
+    return succeeded
+
+
+def _wait_for_results(poller: ResultPoller, scheduler: StrideScheduler, store: CourseStore, delay: float,
+                      watcher: SeatWatcher | None = None) -> None:
+    """等待 delay 秒，期间结果一到就处理；课程全部抢到时提前返回。"""
+    deadline = time.monotonic() + delay
+    while store and (left_s := deadline - time.monotonic()) > 0:
+        _handle_poll_results(poller, scheduler, store, timeout=left_s, watcher=watcher)
+
+
+def _refresh_session(sessions: SessionManager, generation: int, http, proxies: Dict[str, str] | None) -> None:
+    """通知后台刷新登录态，拿到新凭证后重建连接。"""
+    print("    ⚠️ 本轮检测到会话过期，等待后台刷新登录态...")
+    sessions.report_expired(generation)
+    if sessions.wait_newer(generation):
+        http.reset()
+        http.warm_up(proxies)
+        print(f"    >>> 凭证已刷新，Token: {str(sessions.get().token)[:10]}...")
+    else:
+        print("    ❌ 等待新凭证超时")
+    time.sleep(random.uniform(0.5, 1.5))
+
+
+def _fire_first_wave(
+    fire_at: float,
+    student_code: str,
+    elective_batch_code: str,
+    courses: List[Tuple[str, str, str, str]],
+    proxies: Dict[str, str] | None,
+    http,
+    poller: ResultPoller,
+    scheduler: StrideScheduler,
+    sessions: SessionManager,
+) -> str | None:
+    """定时开抢：对时、预热、预加密，让第一波请求恰好在开放时刻到达服务器。
+
+    fire_at 为服务器时钟下的开放时刻（Unix 时间戳）。返回值同 _handle_submit_result：
+    有 "expired" 时先等后台刷新登录态再返回 "expired"，否则有 "qos" 时返回 "qos"。
+    """
+    if time.time() >= fire_at:
+        print(">>> ⚠️ 开抢时间已过，直接开始")
+        return None
+
+    # 长时间空闲的连接会被服务端关闭，临近开抢再准备
+    prepare_at = fire_at - FIRE_PREPARE_LEAD
+    if time.time() < prepare_at:
+        print(f">>> 距开抢 {fire_at - time.time():.0f}s，"
+              f"将于 {time.strftime('%H:%M:%S', time.localtime(prepare_at))} 开始准备")
+        wait_until(prepare_at)
+
+    http.warm_up(proxies)
+
+    clock = estimate_clock_offset(http, proxies=proxies)
+    offset_ms = clock["offset"] * 1000
+    print(f">>> 对时完成: 服务器时钟{'快' if offset_ms >= 0 else '慢'} {abs(offset_ms):.0f}ms "
+          f"(±{clock['error'] * 1000:.0f}ms, {clock['samples']} 个样本), RTT {clock['rtt'] * 1000:.0f}ms")
+
+    # 本机发出时刻 = 开放时刻换算到本机时钟 - 单程时延
+    send_at = fire_at - clock["offset"] - clock["rtt"] / 2
+    # 首波名额有限，优先级高的课先上（同优先级保持 course.conf 顺序）
+    wave = sorted(courses, key=lambda c: -scheduler.weight(c[0]))[:MAX_WORKERS]
+    ts = int(send_at * 1000)
+    bodies = [
+        {
+            "addParam": encrypt_select_param(student_code, elective_batch_code, c, timestamp=ts),
+            "studentCode": student_code,
+        }
+        for c in wave
+    ]
+    print(f">>> 已预加密 {len(bodies)} 个请求，将于本机 "
+          f"{datetime.fromtimestamp(send_at).strftime('%H:%M:%S.%f')[:-3]} 发出")
+
+    wait_until(send_at - FIRE_REWARM_LEAD)
+    http.warm_up(proxies, connections=len(wave))
+
+    # 凭证在发出前一刻再取：准备期间后台可能已经刷新过
+    creds = sessions.get()
+    results = fire_wave(http, TARGET_URL, bodies, send_at,
+                        cookies=creds.cookies, headers=creds.headers, proxies=proxies)
+
+    print(f"\n===== 第一波 ({len(wave)} 门) =====")
+    outcomes = set()
+    for course, item in zip(wave, results):
+        print(f"    [{course[0]}] 发出偏差 {(item['sent'] - send_at) * 1000:+.1f}ms")
+        if "error" in item:
+            res = {"success": False, "error": str(item["error"]), "course": course,
+                   "sent": item["sent"], "recv": item["recv"]}
+        else:
+            res = _parse_select_response(item["response"], course, item["sent"], item["recv"])
+        outcomes.add(_handle_submit_result(res, poller, scheduler, generation=creds.generation,
+                                           wave="fire"))
+    if "expired" in outcomes:
+        _refresh_session(sessions, creds.generation, http, proxies)
+        return "expired"
+    return "qos" if "qos" in outcomes else None
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="南京大学选课助手 —— 并发抢课模式")
+    parser.add_argument("--engine", choices=("thread", "async"), default="thread",
+                        help="thread: 线程池并发（默认）；async: 单事件循环协程并发")
+    parser.add_argument("--fire-at", metavar="TIME",
+                        help='开抢时刻（服务器时间），如 "2026-02-20 12:30:00"，不带时区按本机时区；'
+                             "仅线程引擎支持")
+    parser.add_argument("--watch", action="store_true",
+                        help="余量监视：只在 queryCourse.do 显示有空位时提交（间隔等见 xk.conf WATCH）；"
+                             "仅线程引擎支持")
+    return parser.parse_args()
 
 
 def main():
+    args = _parse_args()
     try:
         config = load_xk_config()
         student_code = str(config.get("USER") or "").strip()
@@ -158,123 +336,165 @@ def main():
         if proxies:
             print(f">>> 启用代理: {proxy_url}")
 
-        elective_batch_code, courses_to_run = load_course_conf()
+        store = CourseStore()
+        elective_batch_code, courses_to_run = store.elective_batch_code, store.courses
+        prepare_select_params(student_code, elective_batch_code, courses_to_run)
+        scheduler = StrideScheduler(store.priorities)
         print(f">>> 启动成功：内存加载 {len(courses_to_run)} 门课程")
-        print(f">>> 速率控制: {MAX_WORKERS} 并发, 最小间隔 {MIN_INTERVAL}s (~{1/MIN_INTERVAL:.1f} req/s)")
+        if scheduler.priorities:
+            print(">>> 优先级: " + ", ".join(f"{c[0]}×{scheduler.weight(c[0]):g}" for c in courses_to_run))
+        rate = build_controller(config, MIN_INTERVAL, MAX_WORKERS)
+        if rate.adaptive:
+            print(f">>> 速率控制: AIMD 自适应，从 {MAX_WORKERS} 并发 / 间隔 {MIN_INTERVAL}s 起步，"
+                  f"上限 {rate.max_workers} 并发 / 间隔 {rate.min_interval}s")
+        else:
+            print(f">>> 速率控制: {MAX_WORKERS} 并发, 最小间隔 {MIN_INTERVAL}s (~{1/MIN_INTERVAL:.1f} req/s)")
+        fire_at = parse_fire_at(args.fire_at) if args.fire_at else None
     except Exception as e:
         print(f"❌ 初始化失败: {e}")
         return
 
+    if fire_at is not None and args.engine != "thread":
+        print("❌ --fire-at 目前仅支持线程引擎")
+        return
+    if args.watch and args.engine != "thread":
+        print("❌ --watch 目前仅支持线程引擎")
+        return
+
+    init_event_log(config, "xk_quick")
+    start_metrics_server(config)
+    emit("run_start", script="xk_quick", engine=args.engine, user=student_code,
+         courses=len(courses_to_run))
+
+    print(">>> 正在获取登录凭证...")
+    sessions = SessionManager()
+    if not sessions.start():
+        print(">>> 登录失败或 Session 无效，无法继续。")
+        return
+
+    if args.engine == "async":
+        from lib.async_engine import AsyncGrabEngine
+
+        engine = AsyncGrabEngine(
+            student_code=student_code,
+            store=store,
+            proxies=proxies,
+            sessions=sessions,
+            rate=rate,
+            scheduler=scheduler,
+            round_delay=BASE_ROUND_DELAY,
+            qos_backoff_base=QOS_BACKOFF_BASE,
+            qos_backoff_max=QOS_BACKOFF_MAX,
+        )
+        try:
+            asyncio.run(engine.run())
+        except Exception as e:
+            print(f"❌ async 引擎异常退出: {e}")
+            return
+        finally:
+            sessions.stop()
+        store.close()
+        print(">>> ✅ 全部完成，退出。")
+        return
+
+    # 提交线程 + 1 条结果轮询连接
+    limiter = AdaptiveRateLimiter(rate)
+    set_rate_limiter(limiter)
+    http = init_http_pool(rate.max_workers + 1)
+    warmed = http.warm_up(proxies)
+    print(f">>> 连接池预热: {warmed}/{http.pool_size} 条连接")
+
     round_no = 0
     qos_hit_count = 0  # 连续 QoS 触发次数，用于指数退避
 
-    while courses_to_run:
-        session_cookies, token = _load_session_cache()
-        headers = build_headers(token)
+    poller = ResultPoller(student_code, proxies, sessions=sessions).start()
+    watcher = SeatWatcher(student_code, elective_batch_code, proxies, limiter, config) if args.watch else None
+    if watcher is not None:
+        print(f">>> 余量监视: 每 {watcher.interval:g}s 查询一次已选人数 / 容量，有空位才提交")
+
+    if fire_at is not None:
+        try:
+            if _fire_first_wave(fire_at, student_code, elective_batch_code, courses_to_run,
+                                proxies, http, poller, scheduler, sessions) == "qos":
+                qos_hit_count = 1
+                rate.on_result(time.monotonic(), False, 0.0)  # 首波就遇到 QoS：起步即减速
+        except Exception as e:
+            print(f"❌ 定时开抢失败: {e}，转入常规轮询")
+
+    while store:
+        # 只 stat 一次，文件被手动修改过才重新读取
+        if store.refresh():
+            prepare_select_params(student_code, store.elective_batch_code, store.courses)
+            scheduler.set_priorities(store.priorities)
+            if watcher is not None:
+                watcher.elective_batch_code = store.elective_batch_code
+        elective_batch_code, courses_to_run = store.elective_batch_code, store.courses
+        creds = sessions.get()
+
+        # 结果仍在轮询中的课程本轮不重复提交
+        targets = [c for c in courses_to_run if not poller.is_pending(c[0])]
+        if watcher is not None and targets:
+            # 余量监视：只提交快照中新出现空位的课，没有就等下一次快照
+            try:
+                targets = watcher.sweep(targets, creds)
+            except SessionExpired:
+                _refresh_session(sessions, creds.generation, http, proxies)
+                continue
+            if not targets:
+                _wait_for_results(poller, scheduler, store, watcher.interval, watcher)
+                continue
+
         round_no += 1
-        print(f"\n===== 第 {round_no} 轮 ({len(courses_to_run)} 门) =====")
+        if watcher is not None:
+            # 余量监视：装填的课各提交一次，按优先级先后；不经 plan，免得有课被挤掉后要等余量再变才重试
+            plan = sorted(targets, key=lambda c: -scheduler.weight(c[0]))
+        else:
+            # 名额数不变，按优先级分配
+            plan = scheduler.plan(targets, len(targets))
+        print(f"\n===== 第 {round_no} 轮 ({len(targets)} 门待提交, "
+              f"{poller.pending_count} 门轮询中) =====")
 
-        succeeded = []
         round_qos = False      # 本轮是否检测到 QoS
         session_expired = False # 本轮是否检测到登录失效
 
-        with ThreadPoolExecutor(max_workers=min(len(courses_to_run), MAX_WORKERS)) as executor:
+        if not targets:
+            # 全部在等结果：直接等轮询器产出
+            _handle_poll_results(poller, scheduler, store, timeout=POLL_WAIT_IDLE, watcher=watcher)
+            continue
+
+        with ThreadPoolExecutor(max_workers=min(len(plan), rate.max_workers)) as executor:
             futures = [
                 executor.submit(
                     _do_select_one_task,
-                    student_code, elective_batch_code, course,
-                    session_cookies, headers, proxies,
+                    limiter, student_code, elective_batch_code, course,
+                    creds.cookies, creds.headers, proxies,
                 )
-                for course in courses_to_run
+                for course in plan
             ]
 
             for future in as_completed(futures):
                 res = future.result()
-                course = res["course"]
-                cid = course[0]
-
-                if not res["success"]:
-                    print(f"    [网络错误] {cid}: {res.get('error')}")
-                    round_qos = True
-                    continue
-
-                res_json = res.get("json")
-
-                # 非 JSON 响应
-                if res_json is None:
-                    raw = res.get("raw", "")
-                    print(f"    [非JSON响应] {cid}: {str(raw)[:200]}...")
+                outcome = _handle_submit_result(res, poller, scheduler, generation=creds.generation)
+                if outcome and watcher is not None:
+                    watcher.rearm(res["course"])
+                if outcome == "qos":
                     round_qos = True
-                    continue
-
-                # 登录失效检测（与前端 loginURL / code=302 逻辑一致）
-                if _is_session_expired(res_json):
-                    print(f"    [会话过期] {cid}: 检测到 loginURL/302")
+                elif outcome == "expired":
                     session_expired = True
-                    continue
-
-                code = str(res_json.get("code", ""))
-                msg = str(res_json.get("msg", ""))
-
-                if code == "1":
-                    # volunteer.do 返回 code="1" 只表示请求已入队
-                    # 需要轮询 studentstatus.do 获取真正结果
-                    print(f"    ⏳ [{cid}] 请求已提交，轮询处理结果...")
-                    poll = poll_process_result(
-                        student_code=student_code,
-                        teaching_class_id=cid,
-                        session_cookies=session_cookies,
-                        headers=headers,
-                        proxies=proxies,
-                    )
-                    poll_code = str(poll.get("code", ""))
-                    poll_msg = poll.get("msg", "")
-
-                    if poll_code == "1":
-                        now_str = time.strftime("%H:%M:%S")
-                        print(f"    🎉 [抢到了!] {cid} @ {now_str}")
-                        if poll_msg:
-                            print(f"       服务器消息: {poll_msg}")
-                        class_id, kind, ctype, remark = course
-                        desp = (f"teachingClassId: {class_id}\ncourseKind: {kind}\n"
-                                f"teachingClassType: {ctype}\ntime: {now_str}")
-                        if remark:
-                            desp += f"\n备注: {remark}"
-                        send_serverchan_notification(f"选课成功: {cid}", desp)
-                        succeeded.append(course)
-                    elif poll_code == "-1":
-                        print(f"    ❌ [选课失败] {cid}: {poll_msg}")
-                    elif poll_code == "timeout":
-                        print(f"    ⚠️ [轮询超时] {cid}: {poll_msg}")
-                    else:
-                        print(f"    ⚠️ [轮询未知状态] {cid}: code={poll_code}, msg={poll_msg}")
-
-                else:
-                    # 非 code=1 的情况，打印完整返回方便调试
-                    if "NullPointer" in msg:
-                        print(f"    [服务器繁忙/QoS] {cid} (NPE)")
-                        round_qos = True
-                    else:
-                        print(f"    >>> [{cid}] 返回: {res_json}")
 
+        succeeded = _handle_poll_results(poller, scheduler, store, watcher=watcher)
         if succeeded:
-            courses_to_run = [c for c in courses_to_run if c not in succeeded]
             print(f"    >>> 本轮抢到 {len(succeeded)} 门")
+        print(f"    >>> {http.stats_line()}")
 
-        # 登录失效：重新加载 session_cache 后立即重试，不等待
+        # 登录失效：通知后台刷新，拿到新凭证后立即重试
         if session_expired:
-            print("    ⚠️ 本轮检测到会话过期，重新加载 session_cache.json...")
-            try:
-                session_cookies, token = _load_session_cache()
-                headers = build_headers(token)
-                print(f"    >>> 凭证已刷新，Token: {str(token)[:10]}...")
-            except Exception as e:
-                print(f"    ❌ 重新加载凭证失败: {e}")
-            time.sleep(random.uniform(0.5, 1.5))
+            _refresh_session(sessions, creds.generation, http, proxies)
             continue
 
-        # 自适应轮间延迟
-        if round_qos:
+        # 轮间延迟：自适应模式下 QoS 已在请求级别减速，这里只在固定限速时整轮退避
+        round_backoff = round_qos and not rate.adaptive
+        if round_backoff:
             qos_hit_count += 1
             backoff = min(QOS_BACKOFF_BASE * (2 ** (qos_hit_count - 1)), QOS_BACKOFF_MAX)
             jitter = random.uniform(0, backoff * 0.3)
@@ -282,10 +502,16 @@ def main():
             print(f"    ⚠️ 检测到 QoS/繁忙，退避 {delay:.1f}s (第 {qos_hit_count} 次)")
         else:
             qos_hit_count = max(0, qos_hit_count - 1)  # 成功一轮，逐步恢复
-            delay = random.uniform(*BASE_ROUND_DELAY)
+            delay = watcher.interval if watcher is not None else random.uniform(*BASE_ROUND_DELAY)
+        emit("backoff", user=student_code, reason="qos" if round_backoff else "round",
+             delay=round(delay, 3), hits=qos_hit_count)
 
-        time.sleep(delay)
+        # 退避期间结果一到就处理
+        _wait_for_results(poller, scheduler, store, delay, watcher)
 
+    poller.stop()
+    sessions.stop()
+    store.close()
     print(">>> ✅ 全部完成，退出。")
 
 